@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # Precompute gamemode settings schemas once instead of on every lobby page view
+        from core.registry import gamemode_registry
+        gamemode_registry.build()
+
+        # Timers for profiled requests; they only record while a profile runs
+        from core.profiling import install
+        install()
@@ -0,0 +1,140 @@
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib, os, time
+
+PROFILE_PIC_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif")
+
+#-------- Profile Picture Manifest --------
+
+def get_profile_pic_dir() -> str:
+    """
+    Returns the directory holding the selectable profile pictures.
+    """
+    return os.path.join(settings.STATICFILES_DIRS[0], "images", "profile_pics")
+
+@lru_cache(maxsize=4)
+def _scan_profile_pics(profile_pic_dir:str, mtime:float) -> tuple:
+    """
+    Lists the profile pictures in the directory. Cached per directory modification time.
+    """
+    return tuple(sorted(f for f in os.listdir(profile_pic_dir) if f.endswith(PROFILE_PIC_EXTENSIONS)))
+
+def get_profile_pic_manifest() -> tuple:
+    """
+    Returns the available profile pictures, rescanning the folder only when it changes.
+    """
+    profile_pic_dir = get_profile_pic_dir()
+    return _scan_profile_pics(profile_pic_dir, os.stat(profile_pic_dir).st_mtime)
+
+def get_profile_pic_version() -> str:
+    """
+    Returns a hash of the folder's modification time and picture list, for keying cached
+    fragments that render the pictures.
+    """
+    profile_pic_dir = get_profile_pic_dir()
+    mtime = os.stat(profile_pic_dir).st_mtime
+    return hashlib.md5(":".join((str(mtime),) + _scan_profile_pics(profile_pic_dir, mtime)).encode()).hexdigest()
+
+#-------- Conditional Responses --------
+
+def get_user_role(request:HttpRequest) -> str:
+    """
+    Returns the role used to key cached pages: 'user', 'guest' or 'anonymous'.
+    """
+    if request.user.is_authenticated:
+        return "user"
+    if getattr(request, "guest_user", None):
+        return "guest"
+    return "anonymous"
+
+def get_user_identity(request:HttpRequest) -> str:
+    """
+    Returns a string identifying the viewer for the purpose of per-user ETags.
+    """
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    guest_user = getattr(request, "guest_user", None)
+    return f"guest:{guest_user.guest_id if guest_user else ''}"
+
+def make_etag(*parts) -> str:
+    """
+    Builds a quoted ETag from the given parts. The CSRF secret is mixed in by callers
+    whose pages embed a CSRF token, so a 304 never resurrects a stale token.
+    """
+    digest = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+def get_csrf_secret(request:HttpRequest) -> str:
+    """
+    Returns the CSRF secret the rendered page's token will be derived from,
+    creating it first so the ETag stays stable from the very first visit.
+    """
+    get_token(request)
+    return request.META.get("CSRF_COOKIE", "")
+
+def conditional_response(request:HttpRequest, etag:str, last_modified:float=None):
+    """
+    Returns a 304 response if the client already holds the current version of the page, else None.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=int(last_modified) if last_modified else None)
+
+def set_validators(response:HttpResponse, etag:str, last_modified:float=None) -> HttpResponse:
+    """
+    Adds ETag/Last-Modified headers and forces clients to revalidate the private page.
+    """
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+def static_page_etag(request:HttpRequest, *args, **kwargs) -> str:
+    """
+    ETag for pages whose content only depends on the deployed release and the viewer's role.
+    """
+    return make_etag(settings.PAGE_CACHE_VERSION, get_user_role(request))
+
+#-------- In-Process Caches --------
+
+class TTLCache:
+    """
+    Small in-process LRU cache whose entries expire `ttl` seconds after they were set.
+    """
+
+    def __init__(self, maxsize:int, ttl:float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires at, value), least recently used first
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the cached value, or `default` if it is missing or expired.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return default
+        if entry[0] < time.monotonic():
+            del self.entries[key]
+            return default
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        """
+        Caches a value, evicting the least recently used entries beyond `maxsize`.
+        """
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
@@ -1,17 +1,19 @@
+from django.conf import settings
+from django.core import signing
 from django.http import HttpRequest
 from dataclasses import dataclass, field
 from typing import Dict, List  # For Python < 3.9
 from enum import Enum
-import json
+import json, uuid
 
 class Gamemodes(Enum):
     MEME_FORGE = "MemeForge"
 
-    def get_class(value):
+    def get_class(self):
         """
         Returns the Gamemode dataclass pertaining to the given Enum.
         """
-        if value == Gamemodes.MEME_FORGE:
+        if self == Gamemodes.MEME_FORGE:
             return MemeForge
         else:
             return None
@@ -23,10 +25,12 @@ class TemplateTags(Enum):
 @dataclass
 class GuestUser():
     """
-    Schema for GuestUser.
+    Schema for GuestUser. Guests are stateless: they are carried in a signed cookie
+    that is verified on every request without a session or Redis lookup.
     """
     username:str
     profile_picture:str
+    guest_id:str = field(default_factory=lambda: uuid.uuid4().hex)
 
     @staticmethod
     def is_valid_guest_user(request:HttpRequest=None, username:str=None, profile_picture:str=None) -> bool:
@@ -36,7 +40,7 @@ class GuestUser():
         if username and profile_picture and not request:
             return True
         else:
-            return "username" in request.session and "profile_picture" in request.session
+            return request is not None and getattr(request, "guest_user", None) is not None
 
     def is_valid(self) -> bool:
         """
@@ -44,22 +48,40 @@ class GuestUser():
         """
         return self.is_valid_guest_user(username=self.username, profile_picture=self.profile_picture)
 
-    def save_guest_user_to_session(self, request:HttpRequest):
+    def to_token(self) -> str:
         """
-        Saves self to the given requests' session.
+        Returns self as a signed, URL-safe token.
         """
-        request.session["username"] = self.username
-        request.session["profile_picture"] = self.profile_picture
+        return signing.dumps(
+            {"id": self.guest_id, "name": self.username, "pic": self.profile_picture},
+            salt=settings.GUEST_TOKEN_SALT,
+            compress=True,
+        )
 
     @staticmethod
-    def get_guest_user_from_session(request:HttpRequest):
+    def from_token(token:str):
         """
-        Gets the guest user from the given requests' session.
+        Returns the guest user stored in a signed token, or None if it is invalid or expired.
         """
-        return GuestUser(
-            username =  request.session["username"],
-            profile_picture = request.session["profile_picture"]
-        )
+        try:
+            data = signing.loads(token, salt=settings.GUEST_TOKEN_SALT, max_age=settings.GUEST_COOKIE_MAX_AGE)
+            return GuestUser(username=data["name"], profile_picture=data["pic"], guest_id=data["id"])
+        except (signing.BadSignature, KeyError, TypeError):
+            return None
+
+    def save_guest_user(self, request:HttpRequest):
+        """
+        Makes self the guest of the given request. GuestUserMiddleware writes the cookie on the response.
+        """
+        request.guest_user = self
+        request.guest_user_changed = True
+
+    @staticmethod
+    def get_guest_user(request:HttpRequest):
+        """
+        Gets the guest user of the given request, or None.
+        """
+        return getattr(request, "guest_user", None)
 
 @dataclass
 class Gamemode:
@@ -87,8 +109,16 @@ class Gamemode:
         """
         return Gamemode(**json.loads(data))
 
+    @staticmethod
+    def from_dict(data:Dict) -> "Gamemode":
+        """
+        Rebuilds the concrete gamemode instance from its serialized dictionary.
+        """
+        gamemode_class = Gamemodes[data["key"].upper()].get_class()
+        return gamemode_class(**{key: value for key, value in data.items() if key != "key"})
+
     @classmethod
-    def get_settings() -> Dict[str, str]:
+    def get_settings(cls) -> Dict[str, str]:
         """
         This function should return a datastructure defining all settings a host can set for the particular gamemode.
         Subclasses should override this to handle gamemode-specific fields.
@@ -98,7 +128,7 @@ class Gamemode:
     @classmethod
     def from_form_data(cls, data: Dict) -> "Gamemode":
         """
-        Converts form data into a valid Gamemode instance.
+        Converts validated form data (as cleaned by the gamemode registry) into a valid Gamemode instance.
         Subclasses should override this to handle gamemode-specific fields.
         """
         raise NotImplementedError("Subclasses must implement this method.")
@@ -106,9 +136,11 @@ class Gamemode:
     @classmethod
     def from_post_request(cls, request:HttpRequest) -> "Gamemode":
         """
-        Converts form data into a valid MemeForge instance.
+        Validates the posted form data and converts it into a gamemode instance.
+        Raises ValueError if the data is invalid.
         """
-        return cls.from_form_data(request.POST)
+        from core.registry import gamemode_registry
+        return gamemode_registry.get(Gamemodes(cls.__name__)).parse(request.POST)
 
 @dataclass
 class MemeForge(Gamemode):
@@ -166,13 +198,13 @@ class MemeForge(Gamemode):
     @classmethod
     def from_form_data(cls, data: Dict) -> "MemeForge":
         """
-        Converts form data into a valid MemeForge instance.
+        Converts validated form data into a valid MemeForge instance.
         """
         return cls(
             rounds=int(data.get("rounds", cls.DEFAULT_ROUNDS)),
             time_limit_rounds=int(data.get("time_limit", cls.DEFAULT_TIME_LIMIT)),
             rerolls_per_player=int(data.get("rerolls", cls.DEFAULT_REROLLS)),
-            template_constraints={"tags": data.getlist("template_tags", [])}
+            template_constraints={"tags": list(data.get("template_tags", []))}
         )
 
 @dataclass
@@ -186,6 +218,8 @@ class Lobby:
     game_started: bool = False
     gamemode: Gamemode = None
     settings: Dict = field(default_factory=dict)
+    version: int = 0  # Incremented on every save, used to key cached pages
+    updated_at: float = 0.0  # Unix timestamp of the last save
 
     def serialize(self):
         """
@@ -210,4 +244,7 @@ class Lobby:
         """
         Converts a JSON string back into a lobby instance.
         """
-        return Lobby(**json.loads(data))
+        lobby = Lobby(**json.loads(data))
+        if isinstance(lobby.gamemode, dict):
+            lobby.gamemode = Gamemode.from_dict(lobby.gamemode)
+        return lobby
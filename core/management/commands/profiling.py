@@ -0,0 +1,57 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from core.profiling import get_profile, get_profiled_lobbies, get_recent_profiles, set_lobby_profiling
+
+
+class Command(BaseCommand):
+    help = "Switches lobby profiling on or off, lists recent profiles and exports one as a timing breakdown or as collapsed stacks for flamegraph tools."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'action',
+            choices=['list', 'show', 'collapsed', 'enable', 'disable'],
+            help="list: recent profiles; show/collapsed: one profile by id; enable/disable: profiling of a lobby"
+        )
+        parser.add_argument(
+            'target',
+            nargs='?',
+            help="Profile id for show and collapsed, lobby code for enable and disable"
+        )
+        parser.add_argument(
+            '--duration',
+            type=int,
+            default=300,
+            help="Seconds a lobby stays profiled after enable"
+        )
+        parser.add_argument(
+            '--output',
+            help="Write collapsed stacks to this file instead of stdout"
+        )
+
+    def handle(self, *args, **kwargs):
+        action, target = kwargs['action'], kwargs['target']
+        if action != 'list' and not target:
+            raise CommandError(f"'{action}' needs a profile id or lobby code.")
+
+        if action == 'list':
+            for lobby_code in get_profiled_lobbies():
+                self.stdout.write(f"Profiling lobby {lobby_code}")
+            for profile in get_recent_profiles():
+                summary = profile.summary()
+                breakdown = ", ".join(f"{category} {ms}ms" for category, ms in summary['breakdown_ms'].items())
+                self.stdout.write(f"{summary['id']}  {summary['label']:<40} {summary['duration_ms']:>9.1f}ms  {breakdown}")
+        elif action in ('enable', 'disable'):
+            set_lobby_profiling(target.upper(), kwargs['duration'] if action == 'enable' else None)
+            self.stdout.write(self.style.SUCCESS(f"Profiling of lobby {target.upper()} {action}d."))
+        else:
+            profile = get_profile(target)
+            if profile is None:
+                raise CommandError(f"Profile '{target}' not found.")
+            if action == 'show':
+                self.stdout.write(json.dumps(profile.summary(), indent=2))
+            elif kwargs['output']:
+                with open(kwargs['output'], 'w') as file:
+                    file.write(profile.collapsed() + "\n")
+                self.stdout.write(self.style.SUCCESS(f"Wrote {sum(profile.stacks.values())} samples to {kwargs['output']}."))
+            else:
+                self.stdout.write(profile.collapsed())
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import subprocess
+import sys
+from django.core.management.base import BaseCommand
+from memeleague.proxy import LobbyRouter
+
+
+class Command(BaseCommand):
+    help = "Runs several Daphne workers behind a lobby-aware front proxy, so each lobby's sockets and requests share one worker and its group messages stay in process."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of Daphne worker processes"
+        )
+        parser.add_argument(
+            '--bind',
+            default='0.0.0.0',
+            help="Address the front proxy listens on"
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8000,
+            help="Port the front proxy listens on"
+        )
+        parser.add_argument(
+            '--worker-port',
+            type=int,
+            default=8100,
+            help="Port of the first worker; worker i listens on worker-port + i on localhost"
+        )
+
+    def handle(self, *args, **kwargs):
+        worker_count = max(kwargs['workers'], 1)
+        upstreams = [("127.0.0.1", kwargs['worker_port'] + index) for index in range(worker_count)]
+
+        workers = []
+        for index, (host, port) in enumerate(upstreams):
+            env = dict(os.environ, WORKER_INDEX=str(index), WORKER_COUNT=str(worker_count))
+            workers.append(subprocess.Popen(
+                [sys.executable, "-m", "daphne", "--proxy-headers", "-b", host, "-p", str(port), "memeleague.asgi:application"],
+                env=env,
+            ))
+            self.stdout.write(f"Worker {index} listening on {host}:{port}")
+
+        self.stdout.write(self.style.SUCCESS(f"Routing lobbies across {worker_count} worker(s) on {kwargs['bind']}:{kwargs['port']}"))
+        try:
+            asyncio.run(LobbyRouter(upstreams).serve(kwargs['bind'], kwargs['port']))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.wait()
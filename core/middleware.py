@@ -0,0 +1,118 @@
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.utils.deprecation import MiddlewareMixin
+from importlib import import_module
+from types import SimpleNamespace
+from core.caching import TTLCache
+from core.dataclasses import GuestUser
+import asyncio
+
+_MISSING = object()
+
+class GuestUserMiddleware(MiddlewareMixin):
+    """
+    Attaches the guest user from the signed guest cookie to each request as `request.guest_user`,
+    and writes the cookie back when a view changed the guest. Works in sync and async chains,
+    so async views are not pushed onto a thread.
+    """
+
+    def process_request(self, request:HttpRequest):
+        token = request.COOKIES.get(settings.GUEST_COOKIE_NAME)
+        request.guest_user = GuestUser.from_token(token) if token else None
+        request.guest_user_changed = False
+
+    def process_response(self, request:HttpRequest, response):
+        if getattr(request, "guest_user_changed", False):
+            if request.guest_user:
+                response.set_cookie(
+                    settings.GUEST_COOKIE_NAME,
+                    request.guest_user.to_token(),
+                    max_age=settings.GUEST_COOKIE_MAX_AGE,
+                    secure=settings.SESSION_COOKIE_SECURE,
+                    httponly=True,
+                    samesite="Lax",
+                )
+            else:
+                response.delete_cookie(settings.GUEST_COOKIE_NAME, samesite="Lax")
+        return response
+
+def load_session_user(session_key:str):
+    """
+    Returns the user logged in with the given session, or an AnonymousUser.
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return auth.get_user(SimpleNamespace(session=session))
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Resolves who opened a WebSocket, replacing channels' AuthMiddlewareStack. Sets scope["user"],
+    scope["guest_user"] and scope["identity"] ("user:<pk>", "guest:<id>" or None).
+
+    Resolved identities are kept in a short-lived in-process LRU cache keyed by session key or
+    guest token, and concurrent lookups of the same session share one query, so reconnect storms
+    do not reload sessions or hit the database. A logout can take up to the TTL to be noticed.
+    """
+
+    def __init__(self, inner):
+        super().__init__(inner)
+        self.identities = TTLCache(settings.WEBSOCKET_IDENTITY_CACHE_SIZE, settings.WEBSOCKET_IDENTITY_CACHE_TTL)
+        self.pending = {}  # session key -> in-flight lookup
+
+    async def __call__(self, scope, receive, send):
+        cookie_header = dict(scope.get("headers", [])).get(b"cookie", b"")
+        cookies = parse_cookie(cookie_header.decode("latin-1"))
+
+        user = AnonymousUser()
+        session_key = cookies.get(settings.SESSION_COOKIE_NAME)
+        if session_key:
+            user = await self.resolve_user(session_key)
+
+        guest_user = None
+        token = cookies.get(settings.GUEST_COOKIE_NAME)
+        if token and not user.is_authenticated:
+            guest_user = self.resolve_guest(token)
+
+        if user.is_authenticated:
+            identity = f"user:{user.pk}"
+        elif guest_user:
+            identity = f"guest:{guest_user.guest_id}"
+        else:
+            identity = None
+
+        scope = dict(scope, cookies=cookies, user=user, guest_user=guest_user, identity=identity)
+        return await super().__call__(scope, receive, send)
+
+    async def resolve_user(self, session_key:str):
+        """
+        Returns the session's user from the cache, loading it once if several sockets ask at the same time.
+        """
+        key = ("session", session_key)
+        user = self.identities.get(key)
+        if user is not None:
+            return user
+
+        lookup = self.pending.get(session_key)
+        if lookup is None:
+            lookup = asyncio.ensure_future(database_sync_to_async(load_session_user)(session_key))
+            self.pending[session_key] = lookup
+            lookup.add_done_callback(lambda _: self.pending.pop(session_key, None))
+
+        user = await asyncio.shield(lookup)
+        self.identities.set(key, user)
+        return user
+
+    def resolve_guest(self, token:str):
+        """
+        Returns the guest in a signed token, verifying each token only once per TTL.
+        """
+        key = ("guest", token)
+        guest_user = self.identities.get(key, _MISSING)
+        if guest_user is _MISSING:
+            guest_user = GuestUser.from_token(token)
+            self.identities.set(key, guest_user)
+        return guest_user
@@ -0,0 +1,345 @@
+"""
+Opt-in profiling of requests and WebSocket messages.
+
+A profile is taken when a staff member asks for one with ?profile=1, when the
+lobby in the path has been switched on for profiling, or for a random share of
+requests (PROFILING_SAMPLE_RATE). While a profile runs, a sampler thread
+records the profiled thread's stack every PROFILING_SAMPLE_INTERVAL seconds as
+collapsed stacks for flamegraph tools, and time spent rendering templates, in
+Redis, in the ORM and (de)serializing JSON is summed per category. Async code
+shares its thread with other tasks, so samples of an async profile can include
+them. Finished profiles are kept in the cache, newest IDs first in a capped
+Redis list, for the staff endpoint and the profiling command. Async callers use
+the a-prefixed functions and `async with profiling(...)`, which keep cache and
+Redis round trips and the sampler's join off the event loop.
+"""
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from memeleague.workers import lobby_code_from_path
+import asyncio, functools, random, sys, threading, time, uuid
+
+PROFILE_KEY = "profiling:profile:{}"
+RECENT_PROFILES_KEY = "profiling:recent"
+PROFILED_LOBBIES_KEY = "profiling:lobbies"
+PROFILED_LOBBIES_REFRESH = 5  # Seconds a process trusts its copy of the profiled lobbies
+
+current_profile = ContextVar("current_profile", default=None)
+
+#-------- Profiles --------
+
+class Profile:
+    """
+    Timing breakdown and sampled stacks of one request or message.
+    """
+
+    def __init__(self, label:str, lobby_code:str=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.label = label
+        self.lobby_code = lobby_code
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.sections = defaultdict(float)  # category -> seconds
+        self.stacks = Counter()  # collapsed stack -> samples
+
+    def add(self, category:str, seconds:float):
+        self.sections[category] += seconds
+
+    def collapsed(self) -> str:
+        """
+        Returns the samples in collapsed-stack format, one "frame;frame;frame count" per line.
+        """
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> dict:
+        breakdown = {category: round(seconds * 1000, 3) for category, seconds in sorted(self.sections.items())}
+        breakdown["other"] = round(max(self.duration - sum(self.sections.values()), 0) * 1000, 3)
+        return {
+            "id": self.id,
+            "label": self.label,
+            "lobby_code": self.lobby_code,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "breakdown_ms": breakdown,
+            "samples": sum(self.stacks.values()),
+        }
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of another thread at a fixed interval until stopped.
+    """
+
+    def __init__(self, thread_id:int, stacks:Counter, interval:float):
+        super().__init__(name="profiling-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.stacks = stacks
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse_stack(frame)] += 1
+
+    def stop(self):
+        """
+        Asks the sampler to stop; join it before reading the stacks.
+        """
+        self.stopped.set()
+
+def collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class profiling:
+    """
+    Profiles the enclosed code and stores the result; use `with` in sync code and `async with`
+    in async code.
+    """
+
+    def __init__(self, label:str, lobby_code:str=None):
+        self.profile = Profile(label, lobby_code)
+
+    def __enter__(self) -> Profile:
+        self.token = current_profile.set(self.profile)
+        self.sampler = StackSampler(threading.get_ident(), self.profile.stacks, settings.PROFILING_SAMPLE_INTERVAL)
+        self.started = time.perf_counter()
+        self.sampler.start()
+        return self.profile
+
+    def __exit__(self, *exc_info):
+        self.stop()
+        self.sampler.join()
+        save_profile(self.profile)
+
+    async def __aenter__(self) -> Profile:
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info):
+        self.stop()
+        await asyncio.to_thread(self.sampler.join)
+        await asave_profile(self.profile)
+
+    def stop(self):
+        self.profile.duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        current_profile.reset(self.token)
+
+def should_profile(lobby_code:str=None, requested:bool=False) -> bool:
+    """
+    Returns true if the current request or message should be profiled.
+    """
+    if requested or (lobby_code and lobby_code in get_profiled_lobbies()):
+        return True
+    return is_sampled()
+
+async def ashould_profile(lobby_code:str=None, requested:bool=False) -> bool:
+    if requested or (lobby_code and lobby_code in await aget_profiled_lobbies()):
+        return True
+    return is_sampled()
+
+def is_sampled() -> bool:
+    return settings.PROFILING_SAMPLE_RATE > 0 and random.random() < settings.PROFILING_SAMPLE_RATE
+
+@asynccontextmanager
+async def aprofile_if_selected(label:str, lobby_code:str=None):
+    """
+    Profiles the enclosed async code if ashould_profile selects it.
+    """
+    if not await ashould_profile(lobby_code):
+        yield None
+        return
+    async with profiling(label, lobby_code) as profile:
+        yield profile
+
+#-------- Storage --------
+
+# lobby.views imports core.views, which imports this module, so its Redis clients are imported
+# where they are used. LPUSH and LTRIM keep concurrent savers from overwriting each other's IDs.
+
+def save_profile(profile:Profile):
+    from lobby.views import redis_client
+
+    cache.set(PROFILE_KEY.format(profile.id), profile, settings.PROFILING_RETENTION)
+    pipeline = redis_client.pipeline()
+    pipeline.lpush(RECENT_PROFILES_KEY, profile.id)
+    pipeline.ltrim(RECENT_PROFILES_KEY, 0, settings.PROFILING_MAX_PROFILES - 1)
+    pipeline.expire(RECENT_PROFILES_KEY, settings.PROFILING_RETENTION)
+    pipeline.execute()
+
+async def asave_profile(profile:Profile):
+    from lobby.views import async_redis_client
+
+    await cache.aset(PROFILE_KEY.format(profile.id), profile, settings.PROFILING_RETENTION)
+    pipeline = async_redis_client.pipeline()
+    pipeline.lpush(RECENT_PROFILES_KEY, profile.id)
+    pipeline.ltrim(RECENT_PROFILES_KEY, 0, settings.PROFILING_MAX_PROFILES - 1)
+    pipeline.expire(RECENT_PROFILES_KEY, settings.PROFILING_RETENTION)
+    await pipeline.execute()
+
+def get_profile(profile_id:str):
+    return cache.get(PROFILE_KEY.format(profile_id))
+
+def get_recent_profiles() -> list:
+    from lobby.views import redis_client
+
+    profile_ids = redis_client.lrange(RECENT_PROFILES_KEY, 0, settings.PROFILING_MAX_PROFILES - 1)
+    profiles = cache.get_many([PROFILE_KEY.format(profile_id) for profile_id in profile_ids])
+    return sorted(profiles.values(), key=lambda profile: profile.started_at, reverse=True)
+
+_profiled_lobbies = ({}, 0.0)  # (lobby code -> expiry, fetched at)
+
+def get_profiled_lobbies() -> dict:
+    """
+    Returns the lobbies switched on for profiling with their expiry times, refreshed from the
+    cache every few seconds rather than on every request.
+    """
+    global _profiled_lobbies
+
+    lobbies, fetched_at = _profiled_lobbies
+    now = time.time()
+    if now - fetched_at > PROFILED_LOBBIES_REFRESH:
+        lobbies = cache.get(PROFILED_LOBBIES_KEY) or {}
+        _profiled_lobbies = (lobbies, now)
+    return {code: expires for code, expires in lobbies.items() if expires > now}
+
+async def aget_profiled_lobbies() -> dict:
+    global _profiled_lobbies
+
+    lobbies, fetched_at = _profiled_lobbies
+    now = time.time()
+    if now - fetched_at > PROFILED_LOBBIES_REFRESH:
+        lobbies = await cache.aget(PROFILED_LOBBIES_KEY) or {}
+        _profiled_lobbies = (lobbies, now)
+    return {code: expires for code, expires in lobbies.items() if expires > now}
+
+def set_lobby_profiling(lobby_code:str, duration:int=None):
+    """
+    Profiles every request and message of a lobby for `duration` seconds, or stops with None.
+    """
+    global _profiled_lobbies
+
+    lobbies = {code: expires for code, expires in (cache.get(PROFILED_LOBBIES_KEY) or {}).items() if expires > time.time()}
+    if duration:
+        lobbies[lobby_code] = time.time() + duration
+    else:
+        lobbies.pop(lobby_code, None)
+    cache.set(PROFILED_LOBBIES_KEY, lobbies, timeout=None)
+    _profiled_lobbies = ({}, 0.0)
+
+#-------- Instrumentation --------
+
+def timed(category:str, function):
+    """
+    Wraps a function to add its run time to the current profile, if any.
+    """
+    if iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            profile = current_profile.get()
+            if profile is None:
+                return await function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                profile.add(category, time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return function(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.add(category, time.perf_counter() - started)
+    return wrapper
+
+def time_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add("orm", time.perf_counter() - started)
+
+def add_query_timer(sender, connection, **kwargs):
+    connection.execute_wrappers.append(time_query)
+
+def install():
+    """
+    Hooks the timers into templates, Redis, the ORM and JSON (de)serialization. Called once
+    at startup; outside a profile each hook costs a context variable lookup.
+    """
+    from django.db.backends.signals import connection_created
+    from django.http import JsonResponse
+    from django.template.backends.django import Template
+    from core.dataclasses import Lobby
+    import redis.asyncio.client, redis.client
+
+    Template.render = timed("template", Template.render)
+    # Pipelines only queue commands until execute
+    for client in (redis.client.Redis, redis.asyncio.client.Redis):
+        client.execute_command = timed("redis", client.execute_command)
+    for pipeline in (redis.client.Pipeline, redis.asyncio.client.Pipeline):
+        pipeline.execute = timed("redis", pipeline.execute)
+    connection_created.connect(add_query_timer, dispatch_uid="core.profiling")
+    JsonResponse.__init__ = timed("serialization", JsonResponse.__init__)
+    Lobby.serialize = timed("serialization", Lobby.serialize)
+    Lobby.deserialize = staticmethod(timed("serialization", Lobby.deserialize))
+
+#-------- Middleware --------
+
+class ProfilingMiddleware:
+    """
+    Profiles requests chosen by should_profile, in sync and async chains. Staff can profile a
+    single request by adding ?profile=1.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def requested(self, request) -> bool:
+        return "profile" in request.GET and request.user.is_staff
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        lobby_code = lobby_code_from_path(request.path)
+        if not should_profile(lobby_code, self.requested(request)):
+            return self.get_response(request)
+
+        with profiling(request.path, lobby_code) as profile:
+            response = self.get_response(request)
+            profile.label = getattr(request.resolver_match, "view_name", None) or request.path
+        response["X-Profile-Id"] = profile.id
+        return response
+
+    async def __acall__(self, request):
+        lobby_code = lobby_code_from_path(request.path)
+        if not await ashould_profile(lobby_code, "profile" in request.GET and (await request.auser()).is_staff):
+            return await self.get_response(request)
+
+        async with profiling(request.path, lobby_code) as profile:
+            response = await self.get_response(request)
+            profile.label = getattr(request.resolver_match, "view_name", None) or request.path
+        response["X-Profile-Id"] = profile.id
+        return response
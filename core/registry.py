@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import json
+
+from core.dataclasses import Gamemode, Gamemodes
+
+@dataclass(frozen=True)
+class SettingField:
+    """
+    Precomputed parser for a single host setting of a gamemode.
+    """
+    key: str
+    type: str
+    default: Any
+    min: Optional[int] = None
+    max: Optional[int] = None
+    multiple: bool = False
+    options: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_schema(cls, schema:Dict) -> "SettingField":
+        """
+        Builds a field parser from one entry of a gamemode's settings schema.
+        """
+        default = schema.get("default")
+        if schema.get("multiple") and isinstance(default, dict):
+            # Multi-selects store their default as e.g. {"tags": []}
+            default = next(iter(default.values()), [])
+
+        return cls(
+            key=schema["key"],
+            type=schema["type"],
+            default=default,
+            min=schema.get("min"),
+            max=schema.get("max"),
+            multiple=schema.get("multiple", False),
+            options=frozenset(option["value"] for option in schema.get("options", [])),
+        )
+
+    def parse(self, data) -> Any:
+        """
+        Reads and validates this setting from form data. Raises ValueError on invalid input.
+        """
+        if self.type == "number":
+            raw = data.get(self.key)
+            if raw in (None, ""):
+                return self.default
+            try:
+                value = int(raw)
+            except (TypeError, ValueError):
+                raise ValueError(f"'{self.key}' must be a whole number.")
+            if (self.min is not None and value < self.min) or (self.max is not None and value > self.max):
+                raise ValueError(f"'{self.key}' must be between {self.min} and {self.max}.")
+            return value
+
+        if self.type == "select":
+            if self.multiple:
+                values = data.getlist(self.key) if hasattr(data, "getlist") else data.get(self.key, [])
+                values = list(values or [])
+            else:
+                value = data.get(self.key)
+                values = [] if value in (None, "") else [value]
+
+            invalid = [value for value in values if value not in self.options]
+            if invalid:
+                raise ValueError(f"Invalid option(s) for '{self.key}': {', '.join(invalid)}")
+
+            if self.multiple:
+                return values
+            return values[0] if values else self.default
+
+        raise ValueError(f"Unsupported setting type '{self.type}' for '{self.key}'.")
+
+@dataclass(frozen=True)
+class RegisteredGamemode:
+    """
+    A gamemode together with its precomputed settings schema and form parser.
+    """
+    gamemode: Gamemodes
+    cls: type
+    settings: Dict
+    settings_json: str
+    fields: Tuple[SettingField, ...]
+
+    @property
+    def key(self) -> str:
+        return self.settings["key"]
+
+    def clean(self, data) -> Dict[str, Any]:
+        """
+        Validates form data against the settings schema and returns the cleaned values.
+        """
+        return {setting.key: setting.parse(data) for setting in self.fields}
+
+    def parse(self, data) -> Gamemode:
+        """
+        Validates form data and converts it into an instance of the gamemode.
+        """
+        return self.cls.from_form_data(self.clean(data))
+
+@dataclass
+class GamemodeRegistry:
+    """
+    Holds every playable gamemode. Built once at startup by CoreConfig.ready().
+    """
+    _entries: Dict[str, RegisteredGamemode] = field(default_factory=dict)
+    _settings: List[Dict] = field(default_factory=list)
+    _settings_json: str = "[]"
+
+    def build(self):
+        """
+        Precomputes the settings schema, its JSON and the form parser for every gamemode.
+        """
+        entries = {}
+        for gamemode in Gamemodes:
+            gamemode_class = gamemode.get_class()
+            if gamemode_class is None:
+                continue
+
+            settings = gamemode_class.get_settings()
+            entries[settings["key"]] = RegisteredGamemode(
+                gamemode=gamemode,
+                cls=gamemode_class,
+                settings=settings,
+                settings_json=json.dumps(settings),
+                fields=tuple(SettingField.from_schema(schema) for schema in settings["settings"]),
+            )
+
+        self._entries = entries
+        self._settings = [entry.settings for entry in entries.values()]
+        self._settings_json = json.dumps(self._settings)
+
+    def get(self, key) -> RegisteredGamemode:
+        """
+        Returns the registered gamemode for the given key or Gamemodes member. Raises KeyError if unknown.
+        """
+        if isinstance(key, Gamemodes):
+            key = key.name.lower()
+        return self._entries[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+    @property
+    def settings(self) -> List[Dict]:
+        return self._settings
+
+    @property
+    def settings_json(self) -> str:
+        return self._settings_json
+
+gamemode_registry = GamemodeRegistry()
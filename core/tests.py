@@ -1,3 +1,227 @@
 from django.test import TestCase
+from django.http import QueryDict
+from core.dataclasses import Gamemodes, MemeForge
+from core.registry import gamemode_registry
+import json
 
-# Create your tests here.
+class GamemodeRegistryTestCase(TestCase):
+    def test_registry_is_built_at_startup(self):
+        entry = gamemode_registry.get(Gamemodes.MEME_FORGE)
+        self.assertIs(entry.cls, MemeForge)
+        self.assertEqual(json.loads(gamemode_registry.settings_json), gamemode_registry.settings)
+
+    def test_parse_form_data(self):
+        data = QueryDict("rounds=4&time_limit=120&rerolls=2&template_tags=NSFW")
+        memeforge = gamemode_registry.get("meme_forge").parse(data)
+        self.assertEqual(memeforge.rounds, 4)
+        self.assertEqual(memeforge.time_limit_rounds, 120)
+        self.assertEqual(memeforge.rerolls_per_player, 2)
+        self.assertEqual(memeforge.template_constraints, {"tags": ["NSFW"]})
+
+    def test_parse_uses_defaults(self):
+        memeforge = gamemode_registry.get("meme_forge").parse(QueryDict(""))
+        self.assertEqual(memeforge.rounds, MemeForge.DEFAULT_ROUNDS)
+        self.assertEqual(memeforge.template_constraints, {"tags": []})
+
+    def test_parse_rejects_invalid_input(self):
+        entry = gamemode_registry.get("meme_forge")
+        for query in ("rounds=99", "rounds=abc", "template_tags=unknown"):
+            with self.assertRaises(ValueError):
+                entry.parse(QueryDict(query))
+
+class IdentityMiddlewareTestCase(TestCase):
+    def setUp(self):
+        from core.middleware import IdentityMiddleware
+        self.scopes = []
+
+        async def inner(scope, receive, send):
+            self.scopes.append(scope)
+
+        self.middleware = IdentityMiddleware(inner)
+
+    def resolve(self, cookies):
+        from asgiref.sync import async_to_sync
+        cookie_header = "; ".join(f"{name}={value}" for name, value in cookies.items()).encode()
+        async_to_sync(self.middleware)({"type": "websocket", "headers": [(b"cookie", cookie_header)]}, None, None)
+        return self.scopes[-1]
+
+    def test_users_and_guests_are_resolved_once(self):
+        from django.conf import settings
+        from django.contrib.auth import get_user_model
+        from core.dataclasses import GuestUser
+
+        user = get_user_model().objects.create_user(username="alice", password="secret")
+        self.client.force_login(user)
+        session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        scope = self.resolve({settings.SESSION_COOKIE_NAME: session_key})
+        self.assertEqual((scope["user"], scope["identity"]), (user, f"user:{user.pk}"))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.resolve({settings.SESSION_COOKIE_NAME: session_key})["user"], user)
+
+        guest = GuestUser("Tapir", "tapir.png")
+        scope = self.resolve({settings.GUEST_COOKIE_NAME: guest.to_token()})
+        self.assertEqual((scope["guest_user"], scope["identity"]), (guest, f"guest:{guest.guest_id}"))
+        self.assertFalse(scope["user"].is_authenticated)
+
+class LobbyRoutingTestCase(TestCase):
+    def test_lobby_paths_and_groups_map_to_stable_workers(self):
+        from memeleague.workers import lobby_code_from_group, lobby_code_from_path, worker_for_lobby
+        self.assertEqual(lobby_code_from_path("/ws/meme_forge/AB12C/"), "AB12C")
+        self.assertEqual(lobby_code_from_path("/meme-forge/vote/AB12C/"), "AB12C")
+        self.assertEqual(lobby_code_from_path("/lobby/join/AB12C/"), "AB12C")
+        self.assertIsNone(lobby_code_from_path("/profile/"))
+        self.assertEqual(lobby_code_from_group("game_AB12C"), "AB12C")
+
+        codes = [f"L{index:04d}" for index in range(400)]
+        assignments = {code: worker_for_lobby(code, 4) for code in codes}
+        self.assertEqual(set(assignments.values()), {0, 1, 2, 3})
+
+        # Adding a worker only moves lobbies onto the new worker
+        moved = [code for code in codes if worker_for_lobby(code, 5) != assignments[code]]
+        self.assertTrue(all(worker_for_lobby(code, 5) == 4 for code in moved))
+
+    def test_proxy_forwards_to_the_owning_worker(self):
+        import asyncio
+        from memeleague.proxy import LobbyRouter
+        from memeleague.workers import worker_for_lobby
+
+        async def scenario():
+            async def worker(index, reader, writer):
+                await reader.readuntil(b"\r\n\r\n")
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: 1\r\n\r\n{index}".encode())
+                await writer.drain()
+                writer.close()
+
+            servers = [await asyncio.start_server(lambda r, w, i=index: worker(i, r, w), "127.0.0.1", 0) for index in range(3)]
+            router = LobbyRouter([server.sockets[0].getsockname()[:2] for server in servers])
+            proxy = await asyncio.start_server(router.handle, "127.0.0.1", 0)
+
+            reader, writer = await asyncio.open_connection(*proxy.sockets[0].getsockname()[:2])
+            writer.write(b"GET /lobby/AB12C/ HTTP/1.1\r\nHost: test\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            for server in servers + [proxy]:
+                server.close()
+            return response
+
+        response = asyncio.run(scenario())
+        self.assertTrue(response.endswith(str(worker_for_lobby("AB12C", 3)).encode()))
+
+    def test_proxy_sends_one_request_per_upstream_connection(self):
+        import asyncio
+        from memeleague.proxy import LobbyRouter
+
+        async def scenario():
+            received = []
+
+            async def worker(reader, writer):
+                request = await reader.readuntil(b"\r\n\r\n") + await reader.readexactly(2)
+                try:
+                    request += await asyncio.wait_for(reader.read(), 0.2)  # Nothing else may follow
+                except asyncio.TimeoutError:
+                    pass
+                received.append(request)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok")
+                await writer.drain()
+                writer.close()
+
+            upstream = await asyncio.start_server(worker, "127.0.0.1", 0)
+            router = LobbyRouter([upstream.sockets[0].getsockname()[:2]])
+            proxy = await asyncio.start_server(router.handle, "127.0.0.1", 0)
+
+            reader, writer = await asyncio.open_connection(*proxy.sockets[0].getsockname()[:2])
+            writer.write(
+                b"POST /lobby/AB12C/ HTTP/1.1\r\nHost: test\r\nX-Forwarded-For: 10.0.0.1\r\nConnection: keep-alive\r\nContent-Length: 2\r\n\r\nhi"
+                b"GET /metrics/ HTTP/1.1\r\nHost: test\r\nX-Forwarded-For: 127.0.0.1\r\n\r\n"
+            )
+            writer.write_eof()
+            response = await reader.read()
+            writer.close()
+            for server in (upstream, proxy):
+                server.close()
+            return received, response
+
+        received, response = asyncio.run(scenario())
+        self.assertTrue(response.endswith(b"ok"))
+        self.assertEqual(len(received), 1)
+        head, _, body = received[0].partition(b"\r\n\r\n")
+        self.assertEqual(body, b"hi")
+        self.assertNotIn(b"10.0.0.1", head)
+        self.assertNotIn(b"/metrics/", received[0])
+        self.assertIn(b"X-Forwarded-For: 127.0.0.1", head)
+        self.assertIn(b"Connection: close", head)
+
+class ProfilePicManifestTestCase(TestCase):
+    def test_version_changes_when_a_picture_is_renamed(self):
+        from unittest import mock
+        from core.caching import get_profile_pic_manifest, get_profile_pic_version
+        import os, tempfile
+
+        with tempfile.TemporaryDirectory() as profile_pic_dir, mock.patch("core.caching.get_profile_pic_dir", return_value=profile_pic_dir):
+            open(os.path.join(profile_pic_dir, "cat.png"), "wb").close()
+            version = get_profile_pic_version()
+            os.rename(os.path.join(profile_pic_dir, "cat.png"), os.path.join(profile_pic_dir, "dog.png"))
+            self.assertEqual(get_profile_pic_manifest(), ("dog.png",))
+            self.assertNotEqual(get_profile_pic_version(), version)
+
+class ProfilingTestCase(TestCase):
+    def test_profiled_request_records_breakdown_and_stacks(self):
+        from django.contrib.auth import get_user_model
+        from core.dataclasses import Lobby
+        from asgiref.sync import async_to_sync
+        from core.profiling import aprofile_if_selected, get_profile, get_recent_profiles, set_lobby_profiling, should_profile
+        from lobby.views import save_lobby_to_redis
+
+        self.assertEqual(self.client.get("/profiling/").status_code, 403)
+        staff = get_user_model().objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+
+        save_lobby_to_redis(Lobby(code="PROF1", creator="staff"))
+        session = self.client.session
+        session["host_lobby_code"] = "PROF1"
+        session.save()
+
+        response = self.client.get("/lobby/PROF1/?profile=1")
+        profile = get_profile(response["X-Profile-Id"])
+        self.assertEqual((profile.label, profile.lobby_code), ("lobby:lobby", "PROF1"))
+        self.assertTrue({"redis", "serialization", "template"} <= set(profile.summary()["breakdown_ms"]))
+        self.assertIn(profile.id, [entry["id"] for entry in self.client.get("/profiling/").json()["profiles"]])
+
+        set_lobby_profiling("PROF1", 60)
+        self.assertTrue(should_profile("PROF1"))
+
+        async def profile_messages():
+            async with aprofile_if_selected("first", "PROF1"):
+                async with aprofile_if_selected("second", "PROF1"):
+                    pass
+        async_to_sync(profile_messages)()
+        self.assertEqual([profile.label for profile in get_recent_profiles()[:3]], ["second", "first", "lobby:lobby"])
+        set_lobby_profiling("PROF1")
+        self.assertFalse(should_profile("PROF1"))
+
+class WebSocketMetricsTestCase(TestCase):
+    async def test_socket_traffic_shows_up_in_metrics(self):
+        from channels.testing import WebsocketCommunicator
+        from memeleague.asgi import application
+        from memeleague.metrics import metrics
+
+        communicator = WebsocketCommunicator(application, "/ws/lobby/MET1/")
+        self.assertTrue((await communicator.connect())[0])
+        await communicator.send_json_to({"action": "ping"})
+        self.assertEqual((await communicator.receive_json_from())["action"], "update_participants")
+        self.assertEqual((await communicator.receive_json_from())["action"], "pong")
+        self.assertEqual(metrics.lobby_sockets["MET1"], 1)
+        await communicator.disconnect()
+
+        response = await self.async_client.get("/metrics/")
+        text = response.content.decode()
+        self.assertIn('memeleague_websocket_messages_received_total{worker="0",action="ping"}', text)
+        self.assertIn('memeleague_websocket_messages_sent_total{worker="0",action="pong"}', text)
+        self.assertIn("memeleague_group_send_seconds_count", text)
+        self.assertNotIn('lobby="MET1"', text)
+
+        # Client-chosen actions cannot add labels or lines to the output
+        from memeleague.metrics import frame_action, label
+        self.assertEqual(frame_action('{"action":"x} 1\nmemeleague_fake{a=\"b\"} 1"}'), "other")
+        self.assertEqual(label("lobby", 'a"\nb'), 'lobby="a\\"\\nb"')
@@ -1,14 +1,23 @@
 from django.urls import path
 from django.views.generic import TemplateView
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+from core.caching import static_page_etag
 from . import views
 
+def static_page(template_name):
+    """
+    Renders a static page that answers repeat visits with a 304 via ETag.
+    """
+    return vary_on_cookie(condition(etag_func=static_page_etag)(TemplateView.as_view(template_name=template_name)))
+
 app_name = "core"
 
 urlpatterns = [
     path("", views.home, name="home"),
-    path('impressum/', TemplateView.as_view(template_name='core/impressum.html'), name='impressum'),
-    path('privacy-policy/', TemplateView.as_view(template_name='core/privacy_policy.html'), name='privacy_policy'),
-    path('terms-of-service/', TemplateView.as_view(template_name='core/terms_of_service.html'), name='terms_of_service'),
+    path('impressum/', static_page('core/impressum.html'), name='impressum'),
+    path('privacy-policy/', static_page('core/privacy_policy.html'), name='privacy_policy'),
+    path('terms-of-service/', static_page('core/terms_of_service.html'), name='terms_of_service'),
     path("register/", views.register, name="register"),
     path("login/", views.login, name="login"),
     path("logout/", views.logout, name="logout"),
@@ -16,4 +25,6 @@ urlpatterns = [
     path('delete-account/', views.delete_account, name='delete_account'),
     path("save-profile/", views.save_profile, name="save_profile"),
     path("generate-username/", views.generate_username_wrapper, name="generate_username"),
+    path("profiling/", views.profiles, name="profiles"),  # Staff only
+    path("metrics/", views.websocket_metrics, name="metrics"),  # Prometheus scrape target
 ]
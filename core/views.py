@@ -5,12 +5,16 @@ from django.contrib.auth.models import User, AnonymousUser
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.http import JsonResponse, HttpRequest
+from django.http import JsonResponse, HttpRequest, HttpResponse
 from django.conf import settings
 from django.urls import reverse
+from django.templatetags.static import static
 from captcha.fields import CaptchaField
 from .forms import RegisterForm, LoginForm, ProfileForm
 from core.dataclasses import GuestUser
+from core.caching import get_profile_pic_manifest, get_profile_pic_version
+from memeleague.metrics import metrics
+from core.profiling import get_profile, get_profiled_lobbies, get_recent_profiles, set_lobby_profiling
 import random, os
 
 #-------- Helper Functions --------
@@ -25,11 +29,8 @@ def generate_username():
 
 # Helper function to fetch available profile pictures
 def get_available_profile_pics():
-    # Path to the profile pictures directory
-    profile_pic_dir = os.path.join(settings.STATICFILES_DIRS[0], "images", "profile_pics")
-
-    # Fetch all image files from the directory
-    return [f for f in os.listdir(profile_pic_dir) if f.endswith((".png", ".jpg", ".jpeg", ".gif"))]
+    # The manifest is cached and only rescanned when the folder changes
+    return list(get_profile_pic_manifest())
 
 # Function to generate a random username
 def generate_username_wrapper(request:HttpRequest):
@@ -39,6 +40,26 @@ def generate_username_wrapper(request:HttpRequest):
 def user_is_authenticated(request:HttpRequest) -> bool:
     return request.user.is_authenticated or GuestUser.is_valid_guest_user(request)
 
+def get_player_name(request:HttpRequest) -> str:
+    """
+    Returns the name the requesting user plays under, for registered and guest users alike,
+    or None if the request has neither.
+    """
+    if request.user.is_authenticated:
+        return request.user.username
+    guest_user = GuestUser.get_guest_user(request)
+    return guest_user.username if guest_user else None
+
+async def aget_player_name(request:HttpRequest) -> str:
+    """
+    Async version of get_player_name, for async views.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user.username
+    guest_user = GuestUser.get_guest_user(request)
+    return guest_user.username if guest_user else None
+
 #-------- View Functions --------
 
 # Home View
@@ -49,7 +70,7 @@ def home(request:HttpRequest):
     next_url = request.GET.get('next', None)
 
     # Redirect logged-in or guest users directly to the "next" URL if provided
-    if next_url and (request.user.is_authenticated or "guest_username" in request.session):
+    if next_url and user_is_authenticated(request):
         return redirect(next_url)
 
     # Handle POST request for guest login
@@ -59,6 +80,11 @@ def home(request:HttpRequest):
             profile_picture = request.POST.get("profile_picture")
         )
 
+        # Returning guests keep their id, so they stay the same participant in open lobbies
+        currentGuest = GuestUser.get_guest_user(request)
+        if currentGuest:
+            guestUser.guest_id = currentGuest.guest_id
+
         next_url = request.POST.get("next")  # Preserve the next parameter
 
         if not guestUser.is_valid():
@@ -67,25 +93,29 @@ def home(request:HttpRequest):
                 "error": "Please provide a username and select a profile picture.",
                 "random_username": generate_username(),
                 "profile_pics": get_available_profile_pics(),
-                "selected_profile_pic": profile_picture,
+                "profile_pics_version": get_profile_pic_version(),
+                "selected_profile_pic": guestUser.profile_picture,
                 "next": next_url,
+                "fragment_timeout": settings.PAGE_FRAGMENT_TIMEOUT,
             })
 
-        # Store guest data in the session
-        guestUser.save_guest_user_to_session(request)
+        # Store guest data in the signed guest cookie
+        guestUser.save_guest_user(request)
 
         # Redirect to the "next" URL if provided, or to the default lobby page
         return redirect(next_url or "lobby:join")
 
     # Handle GET request for rendering the home page
     profile_pics = get_available_profile_pics()
-    selected_profile_pic = f"/static/images/profile_pics/{random.choice(profile_pics)}" if profile_pics else ""
+    selected_profile_pic = static(f"images/profile_pics/{random.choice(profile_pics)}") if profile_pics else ""
 
     context = {
         "random_username": generate_username(),
         "profile_pics": profile_pics,
+        "profile_pics_version": get_profile_pic_version(),
         "selected_profile_pic": selected_profile_pic,
         "next": next_url,  # Pass next URL to the template
+        "fragment_timeout": settings.PAGE_FRAGMENT_TIMEOUT,
     }
     return render(request, "core/home.html", context)
 
@@ -180,7 +210,7 @@ def profile(request:HttpRequest):
     Handle user profile updates, including selecting a profile picture.
     """
     # Available profile pictures
-    profile_pictures = os.listdir(os.path.join('static', 'images', 'profile_pics'))
+    profile_pictures = get_available_profile_pics()
 
     if request.method == "POST":
         form = ProfileForm(request.POST, instance=request.user)
@@ -213,11 +243,53 @@ def save_profile(request:HttpRequest):
         username = request.POST.get("username")
         profile_picture = request.POST.get("profile_picture")
 
-        # Store the selected username and profile picture in the session
-        request.session["guest_username"] = username
-        request.session["guest_profile_picture"] = profile_picture
+        # Store the selected username and profile picture in the signed guest cookie
+        GuestUser(username=username, profile_picture=profile_picture).save_guest_user(request)
 
         # Redirect to the lobby or any desired page
         return redirect("lobby:join_or_create_lobby")
 
     return redirect("core:home")
+
+def profiles(request:HttpRequest):
+    """
+    Staff-only access to recorded profiles. GET lists them, or returns one with ?id= (as
+    collapsed stacks for flamegraph tools with &format=collapsed). POST switches profiling of
+    a lobby on for `duration` seconds, or off without a duration.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff only."}, status=403)
+
+    if request.method == "POST":
+        lobby_code = request.POST.get("lobby_code", "").upper()
+        if not lobby_code:
+            return JsonResponse({"error": "lobby_code is required."}, status=400)
+        try:
+            duration = int(request.POST.get("duration") or 0)
+        except ValueError:
+            return JsonResponse({"error": "duration must be a number of seconds."}, status=400)
+        set_lobby_profiling(lobby_code, duration or None)
+        return JsonResponse({"lobbies": get_profiled_lobbies()})
+
+    profile_id = request.GET.get("id")
+    if profile_id:
+        profile = get_profile(profile_id)
+        if profile is None:
+            return JsonResponse({"error": "Profile not found"}, status=404)
+        if request.GET.get("format") == "collapsed":
+            return HttpResponse(profile.collapsed(), content_type="text/plain")
+        return JsonResponse({**profile.summary(), "stacks": dict(profile.stacks.most_common())})
+
+    return JsonResponse({
+        "lobbies": get_profiled_lobbies(),
+        "profiles": [profile.summary() for profile in get_recent_profiles()],
+    })
+
+def websocket_metrics(request:HttpRequest):
+    """
+    WebSocket and channel layer metrics of this worker in the Prometheus text format, for
+    scrapers on METRICS_ALLOWED_IPS and for staff.
+    """
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS and not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,46 @@
+from django.conf import settings
+from lobby.views import async_redis_client
+import json
+
+# Chat history is a Redis list, newest first, trimmed on every push. With the length and the
+# size of each message capped, a lobby's history stays under CHAT_HISTORY_LENGTH *
+# CHAT_MESSAGE_MAX_BYTES bytes, and it lives outside the lobby blob every request loads.
+# Each message carries an ID, so a socket can tell the messages already in the history it was
+# sent from the same messages arriving live.
+CHAT_HISTORY_TTL = 7200  # The history expires with the lobby
+
+def generate_chat_key(lobby_code:str) -> str:
+    return f"lobby:{lobby_code}:chat"
+
+def generate_chat_id_key(lobby_code:str) -> str:
+    return f"lobby:{lobby_code}:chat_id"
+
+def truncate_message(message:str) -> str:
+    """
+    Cuts a message to CHAT_MESSAGE_MAX_BYTES of UTF-8 without splitting a character.
+    """
+    encoded = message.encode()
+    if len(encoded) <= settings.CHAT_MESSAGE_MAX_BYTES:
+        return message
+    return encoded[:settings.CHAT_MESSAGE_MAX_BYTES].decode(errors="ignore")
+
+async def aappend_chat_message(lobby_code:str, message:str) -> int:
+    """
+    Keeps a message in the lobby's history and returns its ID.
+    """
+    key, id_key = generate_chat_key(lobby_code), generate_chat_id_key(lobby_code)
+    message_id = await async_redis_client.incr(id_key)
+    pipeline = async_redis_client.pipeline()
+    pipeline.lpush(key, json.dumps({"id": message_id, "message": message}))
+    pipeline.ltrim(key, 0, settings.CHAT_HISTORY_LENGTH - 1)
+    pipeline.expire(key, CHAT_HISTORY_TTL)
+    pipeline.expire(id_key, CHAT_HISTORY_TTL)
+    await pipeline.execute()
+    return message_id
+
+async def aget_chat_history(lobby_code:str) -> list:
+    """
+    Returns the lobby's kept messages as dicts with "id" and "message", oldest first.
+    """
+    entries = await async_redis_client.lrange(generate_chat_key(lobby_code), 0, settings.CHAT_HISTORY_LENGTH - 1)
+    return [json.loads(entry) for entry in reversed(entries)]
@@ -1,24 +1,63 @@
-import json
+import json, time, uuid
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.conf import settings
-import redis
-
-# Redis client
-redis_client = redis.StrictRedis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    db=settings.REDIS_DB,
-    decode_responses=True
-)
-
-class LobbyConsumer(AsyncWebsocketConsumer):
+from lobby.outbound import OutboundQueue
+from memeleague.metrics import metrics
+from memeleague.probes import enabled as probes_enabled, issued_probes, probes, stamp
+from core.profiling import aprofile_if_selected
+from lobby.chat import aappend_chat_message, aget_chat_history, truncate_message
+from lobby.presence import PresenceSweeper, aget_present_users, aheartbeat, aremove_connection
+
+def clock_sync_reply(data:dict, received_at:float) -> str:
+    """
+    Answers an NTP-style clock sync request. The client's send time t0 is echoed with the
+    server's receive and send times t1 and t2, all in milliseconds; with its receive time t3
+    the client gets its offset ((t1 - t0) + (t2 - t3)) / 2 and the round trip (t3 - t0) - (t2 - t1).
+    """
+    return json.dumps({"action": "clock_sync", "t0": data.get("t0"), "t1": received_at * 1000, "t2": time.time() * 1000})
+
+class InstrumentedConsumer(AsyncWebsocketConsumer):
+    """
+    Base consumer recording connection and inbound message metrics; outbound frames are
+    counted by OutboundQueue.
+    """
+
+    async def websocket_connect(self, message):
+        self.metrics_lobby_code = self.scope['url_route']['kwargs'].get('lobby_code')
+        metrics.connected(self.metrics_lobby_code)
+        await super().websocket_connect(message)
+
+    async def websocket_disconnect(self, message):
+        metrics.disconnected(self.metrics_lobby_code)
+        await super().websocket_disconnect(message)
+
+    async def websocket_receive(self, message):
+        self.received_at = time.time()  # Before any other work, for clock sync replies
+        metrics.received(self.metrics_lobby_code, message.get('text') or "")
+        await super().websocket_receive(message)
+
+    async def reply_clock_sync(self, data:dict):
+        """
+        Answers a clock sync request directly rather than through the send queue, so t2 is
+        stamped as the frame goes out and a backlog cannot skew the client's offset.
+        """
+        text = clock_sync_reply(data, self.received_at)
+        await self.send(text_data=text)
+        metrics.sent(self.metrics_lobby_code, text)
+
+class LobbyConsumer(InstrumentedConsumer):
     async def connect(self):
         self.lobby_code = self.scope['url_route']['kwargs']['lobby_code']
         self.lobby_group_name = f"lobby_{self.lobby_code}"
-        self.username = self.scope['user'].username if self.scope['user'].is_authenticated else "Guest"
+        self.identity = self.scope.get('identity')  # "user:<pk>", "guest:<id>" or None, see IdentityMiddleware
+        self.username = self.get_username()
+        self.connection_id = uuid.uuid4().hex  # Tabs of the same user are present independently
+        self.outbound = OutboundQueue(self)
+        self.issued_probes = issued_probes()  # Stamps passed on to the client, accepted back once each
+        self.chat_history_ids = set()  # Messages sent in the history, not to be repeated live
 
-        # Add user to Redis presence list
-        redis_client.sadd(f"lobby:{self.lobby_code}:users", self.username)
+        # Add the connection to the lobby's presence, kept alive by the client's pings
+        await aheartbeat(self.lobby_code, self.connection_id, self.username)
+        PresenceSweeper.track(self.channel_layer, self.lobby_code)
 
         # Join lobby group
         await self.channel_layer.group_add(
@@ -30,9 +69,39 @@ class LobbyConsumer(AsyncWebsocketConsumer):
         # Notify all participants about the new user
         await self.update_participants()
 
+        # Catch the new socket up on the conversation in one frame. The history is read after
+        # joining the group so no message falls in between; one sent in that gap can arrive both
+        # ways, and chat_message skips it.
+        history = await aget_chat_history(self.lobby_code)
+        if history:
+            self.chat_history_ids = {entry["id"] for entry in history}
+            self.queue_frame(json.dumps({"action": "chat_history", "messages": [entry["message"] for entry in history]}))
+
+    def get_username(self):
+        """
+        Returns the name this connection appears under: the account or guest name, or a
+        unique placeholder for connections without either so they do not share a presence entry.
+        """
+        user = self.scope.get('user')
+        if user is not None and user.is_authenticated:
+            return user.username
+        guest_user = self.scope.get('guest_user')
+        if guest_user:
+            return guest_user.username
+        return f"Guest-{uuid.uuid4().hex[:6]}"
+
+    def queue_frame(self, text_data:str, key=None, merge=None):
+        """
+        Sends a frame through the socket's bounded queue, see OutboundQueue.put.
+        """
+        self.outbound.put(text_data, key, merge)
+
     async def disconnect(self, close_code):
-        # Remove user from Redis presence list
-        redis_client.srem(f"lobby:{self.lobby_code}:users", self.username)
+        self.outbound.close()
+
+        # Remove this connection from the presence; other tabs of the user stay
+        await aremove_connection(self.lobby_code, self.connection_id, self.username)
+        PresenceSweeper.untrack(self.lobby_code)
 
         # Leave the lobby group
         await self.channel_layer.group_discard(
@@ -43,24 +112,40 @@ class LobbyConsumer(AsyncWebsocketConsumer):
         # Notify all participants about the user leaving
         await self.update_participants()
 
+    async def websocket_receive(self, message):
+        # Covers the receive of every subclass
+        async with aprofile_if_selected(f"{type(self).__name__}.receive", self.lobby_code):
+            await super().websocket_receive(message)
+
     async def receive(self, text_data):
         data = json.loads(text_data)
         action = data.get("action")
 
-        if action == "send_message":
-            # Broadcast a chat message
-            message = data.get("message")
+        if action == "ping":
+            await aheartbeat(self.lobby_code, self.connection_id, self.username)
+            if probes_enabled() and data.get("probes"):
+                probes.echoed(self.lobby_code, data, self.issued_probes)
+            self.queue_frame(json.dumps({"action": "pong"}), key="pong")
+
+        elif action == "clock_sync":
+            await self.reply_clock_sync(data)
+
+        elif action == "send_message":
+            # Keep the message for later joiners, then broadcast it
+            message = truncate_message(f"{self.username}: {data.get('message')}")
+            message_id = await aappend_chat_message(self.lobby_code, message)
             await self.channel_layer.group_send(
                 self.lobby_group_name,
-                {
+                stamp({
                     "type": "chat_message",
-                    "message": f"{self.username}: {message}",
-                }
+                    "id": message_id,
+                    "message": message,
+                })
             )
 
     async def update_participants(self):
-        # Get all users from Redis
-        participants = list(redis_client.smembers(f"lobby:{self.lobby_code}:users"))
+        # Get everyone with a live connection from Redis
+        participants = await aget_present_users(self.lobby_code)
 
         # Notify all clients about updated participants
         await self.channel_layer.group_send(
@@ -73,17 +158,29 @@ class LobbyConsumer(AsyncWebsocketConsumer):
 
     async def participants_update(self, event):
         participants = event["participants"]
-        await self.send(text_data=json.dumps({
+        # Only the latest list matters to a client that has fallen behind
+        self.queue_frame(json.dumps({
             "action": "update_participants",
             "participants": participants,
-        }))
+        }), key="update_participants")
 
     async def chat_message(self, event):
+        if event.get("id") in self.chat_history_ids:
+            return  # Sent while connecting and already in the history
         message = event["message"]
-        await self.send(text_data=json.dumps({
+        self.queue_frame(json.dumps(self.with_probe({
             "action": "chat_message",
             "message": message,
-        }))
+        }, event)))
+
+    def with_probe(self, frame:dict, event:dict) -> dict:
+        """
+        Records the fan-out latency of a stamped event and passes its probe on to the client.
+        """
+        probe = probes.fanned_out(self.lobby_code, event, self.issued_probes)
+        if probe:
+            frame["probe"] = probe
+        return frame
 
 class GamemodeConsumer(LobbyConsumer):
     """
@@ -102,7 +199,7 @@ class GamemodeConsumer(LobbyConsumer):
 
     async def disconnect(self, close_code):
         # Call parent logic
-        await super().disconnect()
+        await super().disconnect(close_code)
 
         # Additional cleanup specific to the gamemode
         await self.channel_layer.group_discard(
@@ -119,11 +216,11 @@ class GamemodeConsumer(LobbyConsumer):
             meme_data = data['meme']
             await self.channel_layer.group_send(
                 self.game_group_name,
-                {
+                stamp({
                     'type': 'game_message',
                     'action': 'meme_submission',
                     'meme': meme_data
-                }
+                })
             )
 
         elif action == "vote_meme":
@@ -131,11 +228,11 @@ class GamemodeConsumer(LobbyConsumer):
             vote_data = data['vote']
             await self.channel_layer.group_send(
                 self.game_group_name,
-                {
+                stamp({
                     'type': 'game_message',
                     'action': 'vote',
                     'vote': vote_data
-                }
+                })
             )
 
         # Call parent receive for common actions
@@ -146,7 +243,7 @@ class GamemodeConsumer(LobbyConsumer):
         data = event.get('meme') or event.get('vote')
 
         # Send game-specific messages
-        await self.send(text_data=json.dumps({
+        self.queue_frame(json.dumps(self.with_probe({
             'action': action,
             'data': data
-        }))
+        }, event)))
@@ -0,0 +1,111 @@
+from django.conf import settings
+from memeleague.metrics import metrics
+import asyncio, itertools, logging, time, weakref
+
+logger = logging.getLogger(__name__)
+
+SLOW_CLIENT_CLOSE_CODE = 4008
+
+class OutboundQueue:
+    """
+    Bounded queue of outgoing frames for one WebSocket, drained by its own writer task so
+    group event handlers return at once and the channel layer never backs up behind a slow
+    client. Frames put under a key replace the pending frame with that key, so a client that
+    falls behind gets only the latest participants list, manifest or display state. A socket
+    that stays over the limit for the grace period, or reaches twice the limit, is closed.
+    """
+    queues = weakref.WeakSet()  # Live queues of this process, for metrics
+    totals = dict.fromkeys(["sent", "coalesced", "disconnected", "failed"], 0)
+
+    def __init__(self, consumer, max_size:int=None, grace:float=None):
+        self.consumer = consumer
+        self.max_size = max_size or settings.WEBSOCKET_SEND_QUEUE_SIZE
+        self.grace = settings.WEBSOCKET_SEND_QUEUE_GRACE if grace is None else grace
+        self.frames = {}  # key -> text, in send order
+        self.sequence = itertools.count()
+        self.over_limit_since = None
+        self.closed = False
+        self.ready = asyncio.Event()
+        self.task = asyncio.ensure_future(self.run())
+        self.queues.add(self)
+
+    def put(self, text:str, key=None, merge=None):
+        """
+        Queues a frame. A keyed frame supersedes the pending one with the same key, or is combined
+        with it by merge(old, new) when the two cannot simply replace each other.
+        """
+        if self.closed:
+            return
+
+        if key is not None and key in self.frames:
+            old = self.frames.pop(key)
+            text = merge(old, text) if merge else text
+            self.totals["coalesced"] += 1
+        self.frames[next(self.sequence) if key is None else key] = text
+        self.ready.set()
+
+        if len(self.frames) > self.max_size:
+            now = time.monotonic()
+            self.over_limit_since = self.over_limit_since or now
+            if len(self.frames) >= 2 * self.max_size or now - self.over_limit_since > self.grace:
+                self.disconnect()
+
+    async def run(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            while self.frames:
+                key = next(iter(self.frames))
+                text = self.frames.pop(key)
+                try:
+                    await self.consumer.base_send({"type": "websocket.send", "text": text})
+                except Exception:
+                    # Without its writer the queue would only fill up, so the socket is given up
+                    logger.exception("Could not send a frame, closing the socket")
+                    await self.fail()
+                    return
+                self.totals["sent"] += 1
+                metrics.sent(getattr(self.consumer, "metrics_lobby_code", None), text)
+            self.over_limit_since = None
+
+    def disconnect(self):
+        """
+        Drops the pending frames and closes the socket of a client that cannot keep up.
+        """
+        self.closed = True
+        self.frames.clear()
+        self.task.cancel()
+        self.totals["disconnected"] += 1
+        asyncio.ensure_future(self.consumer.close(code=SLOW_CLIENT_CLOSE_CODE))
+
+    async def fail(self):
+        """
+        Closes the socket after a send failed; it may already be gone.
+        """
+        self.closed = True
+        self.frames.clear()
+        self.queues.discard(self)
+        self.totals["failed"] += 1
+        try:
+            await self.consumer.close()
+        except Exception:
+            logger.debug("Socket was already closed", exc_info=True)
+
+    def close(self):
+        self.closed = True
+        self.task.cancel()
+        self.queues.discard(self)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        Returns queue-depth metrics over the live sockets of this process.
+        """
+        depths = [len(queue.frames) for queue in cls.queues if not queue.closed]
+        return {
+            **cls.totals,
+            "sockets": len(depths),
+            "queued": sum(depths),
+            "max_depth": max(depths, default=0),
+            "over_limit": sum(1 for queue in cls.queues if queue.over_limit_since is not None and not queue.closed),
+        }
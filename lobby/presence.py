@@ -0,0 +1,82 @@
+from django.conf import settings
+from lobby.views import async_redis_client
+import asyncio, logging, time
+
+logger = logging.getLogger(__name__)
+
+# Presence is a sorted set of "<connection id>:<name>" scored by the connection's last heartbeat,
+# so each tab is tracked on its own and connections of a crashed worker simply go stale
+PRESENCE_TTL = 7200  # The whole set expires with the lobby
+
+def generate_presence_key(lobby_code:str) -> str:
+    return f"lobby:{lobby_code}:presence"
+
+def stale_before() -> float:
+    return time.time() - settings.PRESENCE_STALE_AFTER
+
+async def aheartbeat(lobby_code:str, connection_id:str, username:str):
+    """
+    Marks a connection as present now. Used on connect and for every ping.
+    """
+    key = generate_presence_key(lobby_code)
+    pipeline = async_redis_client.pipeline()
+    pipeline.zadd(key, {f"{connection_id}:{username}": time.time()})
+    pipeline.expire(key, PRESENCE_TTL)
+    await pipeline.execute()
+
+async def aremove_connection(lobby_code:str, connection_id:str, username:str):
+    await async_redis_client.zrem(generate_presence_key(lobby_code), f"{connection_id}:{username}")
+
+async def aget_present_users(lobby_code:str) -> list:
+    """
+    Returns the names with at least one live connection to the lobby.
+    """
+    members = await async_redis_client.zrangebyscore(generate_presence_key(lobby_code), stale_before(), "+inf")
+    return sorted({member.partition(":")[2] for member in members})
+
+async def asweep_stale_connections(lobby_code:str) -> int:
+    """
+    Removes connections that missed their heartbeats and returns how many were removed.
+    """
+    return await async_redis_client.zremrangebyscore(generate_presence_key(lobby_code), "-inf", f"({stale_before()}")
+
+class PresenceSweeper:
+    """
+    Per-process task sweeping stale connections of the lobbies this process has sockets for.
+    A sweep that removes anything sends the lobby a single participants update. Removal is
+    atomic in Redis, so when several workers sweep the same lobby only one of them sends it.
+    """
+    lobbies = {}  # lobby code -> number of local sockets
+    task = None
+
+    @classmethod
+    def track(cls, channel_layer, lobby_code:str):
+        cls.lobbies[lobby_code] = cls.lobbies.get(lobby_code, 0) + 1
+        if cls.task is None or cls.task.done():
+            cls.task = asyncio.ensure_future(cls.run(channel_layer))
+
+    @classmethod
+    def untrack(cls, lobby_code:str):
+        remaining = cls.lobbies.get(lobby_code, 0) - 1
+        if remaining > 0:
+            cls.lobbies[lobby_code] = remaining
+        else:
+            cls.lobbies.pop(lobby_code, None)
+
+        if not cls.lobbies and cls.task is not None:
+            cls.task.cancel()
+            cls.task = None
+
+    @classmethod
+    async def run(cls, channel_layer):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_SWEEP_INTERVAL)
+            for lobby_code in list(cls.lobbies):
+                try:
+                    if await asweep_stale_connections(lobby_code):
+                        await channel_layer.group_send(f"lobby_{lobby_code}", {
+                            "type": "participants_update",
+                            "participants": await aget_present_users(lobby_code),
+                        })
+                except Exception:
+                    logger.exception("Presence sweep of lobby %s failed", lobby_code)
@@ -42,3 +42,252 @@ class LobbyConsumerTestCase(TestCase):
 
         # Disconnect
         await communicator.disconnect()
+
+class LobbyPageCachingTestCase(TestCase):
+    def setUp(self):
+        from lobby.views import save_lobby_to_redis
+        from core.dataclasses import Lobby
+        self.lobby = Lobby(code="ETAG1", creator="Host")
+        save_lobby_to_redis(self.lobby)
+        from django.conf import settings
+        from core.dataclasses import GuestUser
+        session = self.client.session
+        session["host_lobby_code"] = self.lobby.code
+        session.save()
+        self.client.cookies[settings.GUEST_COOKIE_NAME] = GuestUser("Host", "host.png").to_token()
+
+    def test_lobby_page_returns_304_until_lobby_changes(self):
+        from lobby.views import save_lobby_to_redis
+        response = self.client.get(f"/lobby/{self.lobby.code}/")
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        response = self.client.get(f"/lobby/{self.lobby.code}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Saving the lobby bumps its version, which invalidates the ETag
+        save_lobby_to_redis(self.lobby)
+        response = self.client.get(f"/lobby/{self.lobby.code}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+class GuestJoinTestCase(TestCase):
+    def setUp(self):
+        from lobby.views import save_lobby_to_redis
+        from core.dataclasses import Lobby
+        self.lobby = Lobby(code="GUEST1", creator="Host")
+        save_lobby_to_redis(self.lobby)
+
+    def test_guest_cookie_identifies_guest_and_protects_names(self):
+        from lobby.views import load_lobby_from_redis
+        response = self.client.post("/", {"continue_as_guest": "1", "username": "Tapir", "profile_picture": "tapir.png"})
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn("username", self.client.session)
+
+        self.client.post(f"/lobby/join/{self.lobby.code}/")
+        participants = load_lobby_from_redis(self.lobby.code).participants
+        self.assertEqual([p["name"] for p in participants], ["Tapir"])
+        self.assertTrue(participants[0]["guest_id"])
+
+        # Another guest with the same name is turned away, a forged cookie is ignored
+        other = self.client_class()
+        other.post("/", {"continue_as_guest": "1", "username": "Tapir", "profile_picture": "tapir.png"})
+        response = other.post(f"/lobby/join/{self.lobby.code}/")
+        self.assertContains(response, "already taken")
+
+        forged = self.client_class()
+        forged.cookies["guest"] = self.client.cookies["guest"].value + "x"
+        response = forged.post(f"/lobby/join/{self.lobby.code}/")
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.url.startswith("/?next="))
+
+class OutboundQueueTestCase(TestCase):
+    def test_slow_client_gets_coalesced_frames_then_is_closed(self):
+        import asyncio
+        from lobby.outbound import SLOW_CLIENT_CLOSE_CODE, OutboundQueue
+
+        class SlowConsumer:
+            def __init__(self):
+                self.sent = []
+                self.closed_with = None
+                self.unblocked = asyncio.Event()
+
+            async def base_send(self, message):
+                await self.unblocked.wait()
+                self.sent.append(message["text"])
+
+            async def close(self, code=None):
+                self.closed_with = code
+
+        async def scenario():
+            consumer = SlowConsumer()
+            queue = OutboundQueue(consumer, max_size=3, grace=60)
+            await asyncio.sleep(0)
+
+            queue.put("chat 1")
+            for index in range(5):
+                queue.put(f"participants {index}", key="update_participants")
+            queue.put("chat 2")
+            self.assertEqual(len(queue.frames), 3)
+            consumer.unblocked.set()
+            await asyncio.sleep(0.01)
+            delivered = list(consumer.sent)
+
+            # Stuck again and reaching twice the limit closes the socket
+            consumer.unblocked.clear()
+            for index in range(8):
+                queue.put(f"chat {index}")
+            await asyncio.sleep(0)
+            return delivered, consumer.closed_with, queue
+
+        delivered, closed_with, queue = asyncio.run(scenario())
+        self.assertEqual(delivered, ["chat 1", "participants 4", "chat 2"])
+        self.assertEqual(closed_with, SLOW_CLIENT_CLOSE_CODE)
+        self.assertTrue(queue.closed)
+
+    def test_failed_send_closes_the_socket(self):
+        import asyncio
+        from lobby.outbound import OutboundQueue
+
+        class ClosedConsumer:
+            closed = False
+
+            async def base_send(self, message):
+                raise RuntimeError("Socket is closed")
+
+            async def close(self, code=None):
+                self.closed = True
+
+        async def scenario():
+            consumer = ClosedConsumer()
+            queue = OutboundQueue(consumer, max_size=3, grace=60)
+            queue.put("chat 1")
+            with self.assertLogs("lobby.outbound", "ERROR"):
+                await asyncio.sleep(0.01)
+            queue.put("chat 2")
+            return consumer, queue
+
+        consumer, queue = asyncio.run(scenario())
+        self.assertTrue(consumer.closed)
+        self.assertTrue(queue.closed)
+        self.assertEqual(queue.frames, {})
+
+class PresenceTestCase(TestCase):
+    def test_tabs_are_tracked_separately_and_stale_ones_swept(self):
+        import time
+        from lobby.presence import aget_present_users, aheartbeat, aremove_connection, asweep_stale_connections, generate_presence_key
+        from lobby.views import async_redis_client
+
+        async def scenario():
+            await async_redis_client.delete(generate_presence_key("PRES1"))
+            await aheartbeat("PRES1", "tab1", "alice")
+            await aheartbeat("PRES1", "tab2", "alice")
+            await aheartbeat("PRES1", "tab3", "bob")
+
+            # Closing one of alice's tabs keeps her present
+            await aremove_connection("PRES1", "tab1", "alice")
+            present = await aget_present_users("PRES1")
+
+            # bob's worker died without a disconnect
+            await async_redis_client.zadd(generate_presence_key("PRES1"), {"tab3:bob": time.time() - 3600})
+            return present, await aget_present_users("PRES1"), await asweep_stale_connections("PRES1"), await asweep_stale_connections("PRES1")
+
+        present, after_crash, swept, swept_again = async_to_sync(scenario)()
+        self.assertEqual(present, ["alice", "bob"])
+        self.assertEqual(after_crash, ["alice"])
+        self.assertEqual((swept, swept_again), (1, 0))
+
+class LatencyProbeTestCase(TestCase):
+    async def test_chat_messages_are_probed_end_to_end(self):
+        from django.test import override_settings
+        from memeleague.probes import probes
+
+        with override_settings(LATENCY_PROBES=True):
+            sender = WebsocketCommunicator(application, "/ws/lobby/PROBE1/")
+            receiver = WebsocketCommunicator(application, "/ws/lobby/PROBE1/")
+            await sender.connect()
+            await receiver.connect()
+
+            await sender.send_json_to({"action": "send_message", "message": "hi"})
+            frame = await receiver.receive_json_from()
+            while frame["action"] != "chat_message":
+                frame = await receiver.receive_json_from()
+            self.assertIn("ingress", frame["probe"])
+            self.assertTrue(probes.lobbies["PROBE1"]["fanout"])
+
+            # Forged stamps and repeated echoes are not recorded
+            echo = {"action": "ping", "rtt_ms": 0, "probes": [{"ingress": frame["probe"]["ingress"], "held_ms": 0}, {"ingress": 1.0, "held_ms": 0}]}
+            for _ in range(2):
+                await receiver.send_json_to(echo)
+                while (await receiver.receive_json_from())["action"] != "pong":
+                    pass
+            delivery = probes.lobbies["PROBE1"]["delivery"]
+            self.assertEqual((len(delivery), delivery.count), (1, 1))
+
+            await sender.send_json_to({"action": "send_message", "message": "unprobed"})
+            frame = await receiver.receive_json_from()
+            while frame["action"] != "chat_message":
+                frame = await receiver.receive_json_from()
+            with override_settings(LATENCY_PROBES=False):
+                await receiver.send_json_to({"action": "ping", "rtt_ms": 0, "probes": [dict(frame["probe"], held_ms=0)]})
+                while (await receiver.receive_json_from())["action"] != "pong":
+                    pass
+            self.assertEqual(delivery.count, 1)
+
+            await sender.disconnect()
+            await receiver.disconnect()
+        self.assertNotIn("PROBE1", probes.lobbies)
+
+class ChatHistoryTestCase(TestCase):
+    async def test_late_joiner_gets_capped_history(self):
+        from django.test import override_settings
+        from lobby.chat import generate_chat_key
+        from lobby.views import async_redis_client
+
+        await async_redis_client.delete(generate_chat_key("CHAT1"))
+        with override_settings(CHAT_HISTORY_LENGTH=3, CHAT_MESSAGE_MAX_BYTES=40):
+            sender = WebsocketCommunicator(application, "/ws/lobby/CHAT1/")
+            await sender.connect()
+            for message in ["one", "two", "three", "four", "x" * 100]:
+                await sender.send_json_to({"action": "send_message", "message": message})
+            received = 0
+            while received < 5:
+                received += (await sender.receive_json_from())["action"] == "chat_message"
+
+            late_joiner = WebsocketCommunicator(application, "/ws/lobby/CHAT1/")
+            await late_joiner.connect()
+            frame = await late_joiner.receive_json_from()
+            while frame["action"] != "chat_history":
+                frame = await late_joiner.receive_json_from()
+
+            self.assertEqual(len(frame["messages"]), 3)
+            self.assertTrue(frame["messages"][0].endswith(": three"))
+            self.assertTrue(frame["messages"][1].endswith(": four"))
+            self.assertEqual(len(frame["messages"][2].encode()), 40)
+            self.assertGreater(await async_redis_client.ttl(generate_chat_key("CHAT1")), 0)
+
+            await sender.disconnect()
+            await late_joiner.disconnect()
+
+    async def test_message_in_history_is_not_repeated_live(self):
+        from channels.layers import get_channel_layer
+        from lobby.chat import aappend_chat_message, generate_chat_key
+        from lobby.views import async_redis_client
+
+        await async_redis_client.delete(generate_chat_key("CHAT2"))
+        # A message kept just before the joiner reads the history, whose broadcast arrives after it
+        message_id = await aappend_chat_message("CHAT2", "host: gap")
+        joiner = WebsocketCommunicator(application, "/ws/lobby/CHAT2/")
+        await joiner.connect()
+        frame = await joiner.receive_json_from()
+        while frame["action"] != "chat_history":
+            frame = await joiner.receive_json_from()
+        self.assertEqual(frame["messages"], ["host: gap"])
+
+        channel_layer = get_channel_layer()
+        await channel_layer.group_send("lobby_CHAT2", {"type": "chat_message", "id": message_id, "message": "host: gap"})
+        await channel_layer.group_send("lobby_CHAT2", {"type": "chat_message", "id": message_id + 1, "message": "host: after"})
+        frame = await joiner.receive_json_from()
+        while frame["action"] != "chat_message":
+            frame = await joiner.receive_json_from()
+        self.assertEqual(frame["message"], "host: after")
+        await joiner.disconnect()
@@ -1,14 +1,17 @@
-import json, random, string, qrcode
+import json, random, string, time, qrcode
 from io import BytesIO
 from django.http import HttpResponse
 from django.shortcuts import render, redirect
 from django.conf import settings
 from django.utils.safestring import mark_safe
 import redis
+import redis.asyncio
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from core.views import user_is_authenticated
 from core.dataclasses import *
+from core.registry import gamemode_registry
+from core.caching import conditional_response, get_csrf_secret, get_user_identity, make_etag, set_validators
 
 
 # Redis connection
@@ -19,6 +22,14 @@ redis_client = redis.StrictRedis(
     decode_responses=True
 )
 
+# Async Redis connection, for async views and consumers
+async_redis_client = redis.asyncio.StrictRedis(
+    host=settings.REDIS_HOST,
+    port=settings.REDIS_PORT,
+    db=settings.REDIS_DB,
+    decode_responses=True
+)
+
 #-------- Helper Functions --------
 
 def generate_lobby_code():
@@ -39,8 +50,10 @@ def generate_lobby_key(lobby_code:str):
 
 def save_lobby_to_redis(lobby:Lobby):
     """
-    Save a Lobby instance to Redis.
+    Save a Lobby instance to Redis, bumping its version so cached pages are invalidated.
     """
+    lobby.version += 1
+    lobby.updated_at = time.time()
     redis_client.set(generate_lobby_key(lobby.code), lobby.serialize(), ex=7200)
 
 def load_lobby_from_redis(lobby_code:str) -> Lobby:
@@ -52,6 +65,23 @@ def load_lobby_from_redis(lobby_code:str) -> Lobby:
         return Lobby.deserialize(data)
     return None
 
+async def asave_lobby_to_redis(lobby:Lobby):
+    """
+    Async version of save_lobby_to_redis.
+    """
+    lobby.version += 1
+    lobby.updated_at = time.time()
+    await async_redis_client.set(generate_lobby_key(lobby.code), lobby.serialize(), ex=7200)
+
+async def aload_lobby_from_redis(lobby_code:str) -> Lobby:
+    """
+    Async version of load_lobby_from_redis.
+    """
+    data = await async_redis_client.get(generate_lobby_key(lobby_code))
+    if data:
+        return Lobby.deserialize(data)
+    return None
+
 #-------- View Functions --------
 
 def create(request:HttpResponse):
@@ -111,14 +141,25 @@ def join(request:HttpResponse, lobby_code=None):
         if request.user.is_authenticated:
             username = request.user.username
             profile_pic = "/static/images/default_pic.png"  # Replace with real profile picture logic
+            identity = {"user_id": request.user.id, "guest_id": None}  # Links game history to accounts
         else:
-            user:GuestUser = GuestUser.get_guest_user_from_session(request)
+            user:GuestUser = GuestUser.get_guest_user(request)
             username = user.username
             profile_pic = user.profile_picture
-
-        # Ensure the user is not the host and add to participants if not already present
-        if username not in [p["name"] for p in lobby.participants]:
-            lobby.participants.append({"name": username, "profile_pic": profile_pic})
+            identity = {"user_id": None, "guest_id": user.guest_id}
+
+        # Names identify players during the game, so another player's name cannot be reused
+        participant = next((p for p in lobby.participants if p["name"] == username), None)
+        if participant and (participant.get("user_id"), participant.get("guest_id")) != (identity["user_id"], identity["guest_id"]):
+            return render(request, 'lobby/join.html', {"error": "That name is already taken in this lobby."})
+
+        # Add to participants if not already present
+        if not participant:
+            lobby.participants.append({
+                "name": username,
+                "profile_pic": profile_pic,
+                **identity,
+            })
             save_lobby_to_redis(lobby)
 
         #  # Send a WebSocket message to update participants
@@ -183,16 +224,19 @@ def lobby(request: HttpResponse, lobby_code):
         if request.user.is_authenticated:
             username = request.user.username
         else:
-            username = GuestUser.get_guest_user_from_session(request).username
+            username = GuestUser.get_guest_user(request).username
 
         # Redirect unjoined users to the join view
         if not is_host and username not in [p["name"] for p in lobby.participants]:
             return redirect('lobby:join_with_code', lobby_code=lobby_code)
 
-    # Define gamemodes
-    gamemodes = [gamemode.get_class().get_settings() for gamemode in Gamemodes] + [{"key":"dummy","name":"Dummy"}]
+    # Serve a 304 if the client already has this version of the lobby for this viewer
+    etag = make_etag(lobby.code, lobby.version, "host" if is_host else "player", get_user_identity(request), get_csrf_secret(request))
+    not_modified = conditional_response(request, etag, lobby.updated_at)
+    if not_modified:
+        return not_modified
 
-    return render(
+    response = render(
         request,
         'lobby/lobby.html',
         {
@@ -200,6 +244,10 @@ def lobby(request: HttpResponse, lobby_code):
             "participants": lobby.participants,
             "is_host": is_host,
             "can_start_game": can_start_game,
-            "gamemodes": gamemodes,
+            "gamemodes": gamemode_registry.settings,
+            "gamemodes_json": gamemode_registry.settings_json,
+            "fragment_timeout": settings.PAGE_FRAGMENT_TIMEOUT,
+            "heartbeat_interval": settings.PRESENCE_HEARTBEAT_INTERVAL,
         }
     )
+    return set_validators(response, etag, lobby.updated_at)
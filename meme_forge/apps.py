@@ -1,5 +1,14 @@
 from django.apps import AppConfig
 
-# class MemeForgeConfig(AppConfig):
-#     default_auto_field = 'django.db.models.BigAutoField'
-#     name = 'meme_forge'
+
+class MemeForgeConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'meme_forge'
+
+    def ready(self):
+        # Rebuild the template search index whenever templates change
+        from django.db.models.signals import post_delete, post_save
+        from meme_forge.models import MemeTemplate
+        from meme_forge.search import invalidate_search_index
+        post_save.connect(invalidate_search_index, sender=MemeTemplate, dispatch_uid="template_search_save")
+        post_delete.connect(invalidate_search_index, sender=MemeTemplate, dispatch_uid="template_search_delete")
@@ -1,6 +1,27 @@
-from lobby.consumers import LobbyConsumer
+import json, logging, time
+from lobby.consumers import GamemodeConsumer, InstrumentedConsumer
+from memeleague.probes import stamp
+from lobby.views import aload_lobby_from_redis
+from meme_forge.views import Likes, acheck_vote, aget_prefetch_manifest
+from meme_forge.votes import VoteBatcher
+from meme_forge.display import aget_phase_event
+from meme_forge.relay import SpectatorRelay
+from lobby.outbound import OutboundQueue
+
+logger = logging.getLogger(__name__)
+
+class MemeForgeConsumer(GamemodeConsumer):
+    async def connect(self):
+        await super().connect()
+
+        # Let the client warm its cache with the templates it will be dealt next
+        await self.prefetch_manifest({})
+
+        # Sockets opened mid-round still need the deadlines to count down to
+        event = await aget_phase_event(self.lobby_code)
+        if event:
+            await self.round_phase(event)
 
-class MemeForgeConsumer(LobbyConsumer):
     async def receive(self, text_data):
         data = json.loads(text_data)
         action = data['action']
@@ -8,30 +29,99 @@ class MemeForgeConsumer(LobbyConsumer):
         if action == "submit_meme":
             meme_data = data['meme']
             await self.channel_layer.group_send(
-                self.group_name,
-                {
+                self.game_group_name,
+                stamp({
                     'type': 'meme_submission',
                     'meme': meme_data
-                }
+                })
             )
         elif action == "vote_meme":
-            vote_data = data['vote']
-            await self.channel_layer.group_send(
-                self.group_name,
-                {
-                    'type': 'vote_cast',
-                    'vote': vote_data
-                }
-            )
+            # The socket's own player votes; players see the batched tallies instead of each vote
+            vote_data = data.get('vote') or {}
+            try:
+                Likes.validate_like(vote_data.get('like'))
+            except ValueError as error:
+                self.reject_vote(str(error))
+                return
+            # Sockets without an account or guest get a new name on every connect, so they cannot vote
+            if self.identity is None:
+                self.reject_vote("Authentication required.")
+                return
+            lobby = await aload_lobby_from_redis(self.lobby_code)
+            if not lobby:
+                self.reject_vote("Lobby not found")
+                return
+            rejection = await acheck_vote(lobby, self.username, vote_data.get('submission_id'))
+            if rejection:
+                self.reject_vote(rejection[0])
+                return
+            try:
+                await VoteBatcher.add(self.lobby_code, self.username, vote_data['submission_id'], vote_data['like'])
+            except Exception:
+                # A failed batch write only costs this vote, not the socket
+                logger.exception("Could not record a vote in lobby %s", self.lobby_code)
+                self.reject_vote("The vote could not be recorded, try again.")
+        else:
+            # Pings and chat are handled by the lobby consumer
+            await super().receive(text_data)
+
+    def reject_vote(self, error:str):
+        self.queue_frame(json.dumps({'action': 'vote_rejected', 'error': error}))
 
     async def meme_submission(self, event):
-        await self.send(text_data=json.dumps({
+        self.queue_frame(json.dumps(self.with_probe({
             'action': 'meme_submission',
             'meme': event['meme']
-        }))
+        }, event)))
+
+    async def vote_tally(self, event):
+        # Each tally covers the whole round, so a pending one is simply replaced
+        self.queue_frame(json.dumps(self.with_probe({
+            'action': 'vote_tally',
+            'tallies': event['tallies'],
+            'votes': event['votes']
+        }, event)), key='vote_tally')
+
+    async def round_phase(self, event):
+        # Absolute deadlines on the server's clock; clients count down locally with their clock offset
+        self.queue_frame(json.dumps({
+            'action': 'round_phase',
+            'round': event['round'],
+            'phases': event['phases'],
+            'server_time': time.time()
+        }), key='round_phase')
+
+    async def prefetch_manifest(self, event):
+        # Each socket sends its own player's upcoming templates
+        self.queue_frame(json.dumps({
+            'action': 'prefetch_manifest',
+            'urls': await aget_prefetch_manifest(self.lobby_code, self.username)
+        }), key='prefetch_manifest')
+
+class DisplayConsumer(InstrumentedConsumer):
+    """
+    Read-only stream for the host's TV display and spectators. Instead of every submission
+    and vote it receives aggregated snapshots of the round, at most one per interval, through
+    the worker's SpectatorRelay for the lobby.
+    """
+
+    async def connect(self):
+        self.lobby_code = self.scope['url_route']['kwargs']['lobby_code']
+        self.relay = None
+        self.outbound = OutboundQueue(self)
+        await self.accept()
+        self.relay = await SpectatorRelay.join(self.channel_layer, self.lobby_code, self)
+
+    def queue_frame(self, text_data:str, key=None, merge=None):
+        self.outbound.put(text_data, key, merge)
+
+    async def disconnect(self, close_code):
+        self.outbound.close()
+        if self.relay is not None:
+            await self.relay.leave(self)
 
-    async def vote_cast(self, event):
-        await self.send(text_data=json.dumps({
-            'action': 'vote',
-            'vote': event['vote']
-        }))
+    async def receive(self, text_data=None, bytes_data=None):
+        # Displays are read-only apart from syncing their clock for the countdown
+        data = json.loads(text_data or "{}")
+        if data.get("action") == "clock_sync":
+            await self.reply_clock_sync(data)
@@ -0,0 +1,134 @@
+from channels.layers import get_channel_layer
+from core.dataclasses import Lobby, MemeForge
+from lobby.views import async_redis_client, generate_lobby_key
+import time
+
+# The host's TV display and spectators get aggregated snapshots instead of every submission and vote
+DISPLAY_SNAPSHOT_INTERVAL = 0.5  # Seconds between snapshots of one lobby, at most
+SNAPSHOT_PENDING_TTL = 60
+
+def get_display_group(lobby_code:str) -> str:
+    return f"display_{lobby_code}"
+
+async def aset_round_deadline(lobby_code:str, time_limit:int, ttl:int) -> float:
+    """
+    Stores when the current round ends, as an absolute timestamp clients count down to, and
+    returns it.
+    """
+    deadline = time.time() + time_limit
+    await async_redis_client.set(f"lobby:{lobby_code}:round_deadline", deadline, ex=ttl)
+    return deadline
+
+def build_phase_event(current_round:int, deadline:float) -> dict:
+    """
+    Returns the group event announcing a round's phases with their absolute server deadlines.
+    Voting follows the submission deadline, so clients move on to it by their own clock
+    instead of waiting for a message.
+    """
+    return {
+        "type": "round_phase",
+        "round": current_round,
+        "phases": [
+            {"phase": "submission", "ends_at": deadline},
+            {"phase": "voting", "ends_at": deadline + MemeForge.TIME_LIMIT_VOTING},
+        ],
+    }
+
+async def aget_phase_event(lobby_code:str):
+    """
+    Returns the phase event of the round in play, or None before the game starts.
+    """
+    current_round, deadline = await async_redis_client.mget(f"lobby:{lobby_code}:current_round", f"lobby:{lobby_code}:round_deadline")
+    if not current_round or not deadline:
+        return None
+    return build_phase_event(int(current_round), float(deadline))
+
+def queue_snapshot_reads(pipeline, lobby_code:str):
+    """
+    Queues the reads a snapshot is built from on a (sync or async) Redis pipeline.
+    """
+    pipeline.hkeys(f"lobby:{lobby_code}:submissions")
+    pipeline.hgetall(f"lobby:{lobby_code}:votes")
+    pipeline.get(f"lobby:{lobby_code}:current_round")
+    pipeline.get(f"lobby:{lobby_code}:round_deadline")
+    pipeline.get(generate_lobby_key(lobby_code))
+
+async def abuild_display_snapshot(lobby_code:str) -> dict:
+    """
+    Aggregates the current round for displays: who has submitted, vote tallies per submission
+    and the round deadline.
+    """
+    pipeline = async_redis_client.pipeline()
+    queue_snapshot_reads(pipeline, lobby_code)
+    return assemble_display_snapshot(*await pipeline.execute())
+
+def assemble_display_snapshot(submitted, votes, current_round, deadline, lobby_data) -> dict:
+    from meme_forge.views import LIKE_POINTS
+
+    lobby = Lobby.deserialize(lobby_data) if lobby_data else None
+    submitted = set(submitted)
+    order = [participant["name"] for participant in lobby.participants] if lobby else sorted(submitted)
+
+    # Keyed by name rather than listed, so a submission or vote changes a single entry of the delta
+    players = {player: {"submitted": player in submitted, **dict.fromkeys([*LIKE_POINTS, "score"], 0)} for player in order}
+    for vote_key, like in votes.items():
+        _, _, submission_player = vote_key.partition(":")
+        tally = players.get(submission_player)
+        if tally is not None and like in LIKE_POINTS:
+            tally[like] += 1
+            tally["score"] += LIKE_POINTS[like]
+
+    return {
+        "round": int(current_round or 0),
+        "order": order,
+        "players": players,
+        "submitted_count": len(submitted),
+        "deadline": float(deadline) if deadline else None,
+        "server_time": time.time(),
+    }
+
+def compute_delta(old:dict, new:dict, path:tuple=()) -> tuple:
+    """
+    Returns the changes turning `old` into `new`: changed keys with their new value, nested
+    dicts as nested changes, and the key paths of removed keys. None is a value like any
+    other, e.g. a phase without a deadline.
+    """
+    changes, removed = {}, []
+    for key, value in new.items():
+        if key not in old:
+            changes[key] = value
+        elif old[key] != value:
+            if isinstance(value, dict) and isinstance(old[key], dict):
+                changes[key], nested_removed = compute_delta(old[key], value, path + (key,))
+                removed.extend(nested_removed)
+            else:
+                changes[key] = value
+    removed.extend([*path, key] for key in sorted(old.keys() - new.keys()))
+    return changes, removed
+
+async def aclaim_snapshot_slot(lobby_code:str) -> bool:
+    """
+    Returns true if a snapshot may be sent now. Otherwise marks one as pending, which the
+    next flush sends once the interval has passed, so the last change is never lost.
+    """
+    if await async_redis_client.set(f"lobby:{lobby_code}:display_throttle", 1, nx=True, px=int(DISPLAY_SNAPSHOT_INTERVAL * 1000)):
+        await async_redis_client.delete(f"lobby:{lobby_code}:display_pending")
+        return True
+    await async_redis_client.set(f"lobby:{lobby_code}:display_pending", 1, ex=SNAPSHOT_PENDING_TTL)
+    return False
+
+async def aclaim_pending_snapshot(lobby_code:str) -> bool:
+    """
+    Returns true if a pending snapshot should be sent now.
+    """
+    return bool(await async_redis_client.exists(f"lobby:{lobby_code}:display_pending")) and await aclaim_snapshot_slot(lobby_code)
+
+async def arequest_display_snapshot(lobby_code:str):
+    """
+    Sends displays a fresh snapshot after a change, rate-capped per lobby.
+    """
+    if await aclaim_snapshot_slot(lobby_code):
+        await get_channel_layer().group_send(
+            get_display_group(lobby_code),
+            {"type": "display_snapshot", "snapshot": await abuild_display_snapshot(lobby_code)},
+        )
@@ -0,0 +1,83 @@
+from typing import Any, List, Optional, Tuple
+from PIL import Image
+
+HASH_SIZE = 8  # 8x8 gradient bits, i.e. a 64-bit hash
+
+def dhash(path:str, hash_size:int=HASH_SIZE) -> int:
+    """
+    Computes the difference hash of an image: the sign of the horizontal brightness gradient
+    on a downscaled grayscale copy. Resizing, recompression and small edits barely change it.
+    """
+    with Image.open(path) as image:
+        image.seek(0)  # First frame of animated images
+        pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS).getdata())
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+def hash_to_hex(value:int) -> str:
+    return f"{value:016x}"
+
+def hex_to_hash(value:str) -> int:
+    return int(value, 16)
+
+def hamming_distance(first:int, second:int) -> int:
+    return (first ^ second).bit_count()
+
+class BKTree:
+    """
+    Burkhard-Keller tree over hashes in hamming space. A lookup within a small radius only
+    visits the subtrees the triangle inequality allows, instead of every stored hash.
+    """
+
+    def __init__(self):
+        self.root: Optional[list] = None  # [hash, payloads, {distance: child}]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, value:int, payload:Any):
+        """
+        Stores a payload under the given hash.
+        """
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [payload], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [payload], {}]
+                return
+            node = child
+
+    def find(self, value:int, max_distance:int) -> List[Tuple[int, Any]]:
+        """
+        Returns (distance, payload) pairs for all hashes within max_distance, closest first.
+        """
+        if self.root is None:
+            return []
+
+        matches = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, payload) for payload in node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+
+        return sorted(matches, key=lambda match: match[0])
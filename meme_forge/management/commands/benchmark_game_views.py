@@ -0,0 +1,129 @@
+import asyncio, json, time
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import AsyncRequestFactory
+from core.dataclasses import GuestUser, Lobby
+from core.views import get_player_name
+from lobby.views import async_redis_client, asave_lobby_to_redis, generate_lobby_key, load_lobby_from_redis, redis_client
+from meme_forge import views
+from meme_forge.display import DISPLAY_SNAPSHOT_INTERVAL, SNAPSHOT_PENDING_TTL, assemble_display_snapshot, get_display_group, queue_snapshot_reads
+
+BENCHMARK_LOBBY_CODE = "BENCH0"
+BENCHMARK_PLAYERS = 8
+
+
+async def anonymous_user():
+    return AnonymousUser()
+
+#-------- Sync Baseline --------
+# The endpoints as they were before they became async: blocking Redis calls, and a hop back
+# into the event loop for each group send. Kept here only to measure against.
+
+def sync_request_display_snapshot(lobby_code):
+    if redis_client.set(f"lobby:{lobby_code}:display_throttle", 1, nx=True, px=int(DISPLAY_SNAPSHOT_INTERVAL * 1000)):
+        redis_client.delete(f"lobby:{lobby_code}:display_pending")
+        pipeline = redis_client.pipeline()
+        queue_snapshot_reads(pipeline, lobby_code)
+        async_to_sync(get_channel_layer().group_send)(
+            get_display_group(lobby_code),
+            {"type": "display_snapshot", "snapshot": assemble_display_snapshot(*pipeline.execute())},
+        )
+    else:
+        redis_client.set(f"lobby:{lobby_code}:display_pending", 1, ex=SNAPSHOT_PENDING_TTL)
+
+def sync_vote_meme(request, lobby_code):
+    if not load_lobby_from_redis(lobby_code):
+        return JsonResponse({"error": "Lobby not found"}, status=404)
+    like = request.POST.get("like")
+    try:
+        views.Likes.validate_like(like)
+    except ValueError:
+        return JsonResponse({"error": "Invalid vote type"}, status=400)
+    redis_client.hset(f"lobby:{lobby_code}:votes", f"{get_player_name(request)}:{request.POST.get('submission_id')}", like)
+    sync_request_display_snapshot(lobby_code)
+    return JsonResponse({"message": "Vote recorded"})
+
+def sync_submit_meme(request, lobby_code):
+    if not load_lobby_from_redis(lobby_code):
+        return JsonResponse({"error": "Lobby not found"}, status=404)
+    redis_client.hset(
+        f"lobby:{lobby_code}:submissions",
+        get_player_name(request),
+        json.dumps({"template_id": request.POST.get("template_id"), "text": request.POST.get("submission_text")}),
+    )
+    sync_request_display_snapshot(lobby_code)
+    return JsonResponse({"message": "Meme submitted successfully"})
+
+def sync_final_leaderboard(request, lobby_code):
+    scores = redis_client.hgetall(f"lobby:{lobby_code}:leaderboard")
+    return JsonResponse({"leaderboard": sorted(scores.items(), key=lambda x: int(x[1]), reverse=True)})
+
+
+class Command(BaseCommand):
+    help = "Measures requests per second of the async game endpoints on one worker, against their former sync versions served the way ASGI serves sync views (in a thread, with blocking Redis). Uses the configured Redis and channel layer."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help="Requests per endpoint and mode"
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help="Requests in flight at once"
+        )
+
+    def handle(self, *args, **kwargs):
+        async_to_sync(self.run_benchmark)(kwargs['requests'], kwargs['concurrency'])
+
+    async def run_benchmark(self, total, concurrency):
+        players = [f"bench{index}" for index in range(BENCHMARK_PLAYERS)]
+        await asave_lobby_to_redis(Lobby(code=BENCHMARK_LOBBY_CODE, creator=players[0], participants=[{"name": player, "profile_pic": ""} for player in players]))
+        await async_redis_client.hset(f"lobby:{BENCHMARK_LOBBY_CODE}:leaderboard", mapping={player: index for index, player in enumerate(players)})
+
+        factory = AsyncRequestFactory()
+        endpoints = {
+            "vote_meme": (views.vote_meme, sync_vote_meme, lambda index: factory.post(f"/meme-forge/vote/{BENCHMARK_LOBBY_CODE}/", {"submission_id": players[(index + 1) % len(players)], "like": "like"})),
+            "submit_meme": (views.submit_meme, sync_submit_meme, lambda index: factory.post(f"/meme-forge/submit/{BENCHMARK_LOBBY_CODE}/", {"template_id": "1", "submission_text": "benchmark"})),
+            "final_leaderboard": (views.final_leaderboard, sync_final_leaderboard, lambda index: factory.get(f"/meme-forge/leaderboard/{BENCHMARK_LOBBY_CODE}/")),
+        }
+
+        try:
+            for name, (view, sync_view, make_request) in endpoints.items():
+                modes = {
+                    "async": view,
+                    # Django runs sync views under ASGI in one shared thread per worker
+                    "sync (baseline)": sync_to_async(sync_view, thread_sensitive=True),
+                }
+                for mode, handler in modes.items():
+                    rate = await self.measure(handler, make_request, players, total, concurrency)
+                    self.stdout.write(f"{name:<20} {mode:<18} {rate:>10.0f} req/s")
+        finally:
+            await async_redis_client.delete(*[
+                f"lobby:{BENCHMARK_LOBBY_CODE}:{suffix}"
+                for suffix in ("leaderboard", "votes", "submissions", "display_throttle", "display_pending")
+            ], generate_lobby_key(BENCHMARK_LOBBY_CODE))
+
+    async def measure(self, handler, make_request, players, total, concurrency) -> float:
+        """
+        Runs `total` requests through the handler with at most `concurrency` in flight and returns requests per second.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(index):
+            request = make_request(index)
+            request.guest_user = GuestUser(players[index % len(players)], "")
+            request.auser = anonymous_user
+            request.user = AnonymousUser()
+            async with semaphore:
+                await handler(request, BENCHMARK_LOBBY_CODE)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(send(index) for index in range(total)))
+        return total / (time.perf_counter() - started)
@@ -0,0 +1,75 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+from meme_forge.models import MemeTemplate
+from meme_forge.textboxes import detect_text_boxes, file_digest
+
+
+def detect_or_none(path):
+    """
+    Runs the detector in a worker process; unreadable images yield None instead of failing the batch.
+    """
+    try:
+        return detect_text_boxes(path)
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    help = "Detects caption regions for template images in parallel and stores text_boxes and text_input_count. Results are cached by image content, so reruns only process changed images."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes"
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help="Recompute text boxes even for images that have not changed"
+        )
+
+    def handle(self, *args, **kwargs):
+        templates = list(MemeTemplate.objects.exclude(image_url_local='').only('id', 'name', 'image_url_local', 'text_boxes', 'text_boxes_digest'))
+
+        # Results already stored in the database, by content digest, so identical images are detected once
+        cached = {} if kwargs['force'] else {template.text_boxes_digest: template.text_boxes for template in templates if template.text_boxes_digest}
+
+        pending = {}  # digest -> templates using that image
+        paths = {}  # digest -> image path
+        for template in templates:
+            path = finders.find(template.image_url_local.removeprefix(settings.STATIC_URL))
+            if not path:
+                self.stderr.write(self.style.WARNING(f"Image file not found for template '{template.name}'."))
+                continue
+
+            digest = file_digest(path)
+            if digest == template.text_boxes_digest and not kwargs['force']:
+                continue
+            pending.setdefault(digest, []).append(template)
+            paths.setdefault(digest, path)
+
+        to_detect = [digest for digest in pending if digest not in cached]
+        if to_detect:
+            with ProcessPoolExecutor(max_workers=max(kwargs['workers'], 1)) as pool:
+                detected = pool.map(detect_or_none, [paths[digest] for digest in to_detect], chunksize=8)
+                cached.update(zip(to_detect, detected))
+
+        updated = []
+        for digest, digest_templates in pending.items():
+            boxes = cached[digest]
+            if boxes is None:
+                self.stderr.write(self.style.WARNING(f"Could not read image {paths[digest]}."))
+                continue
+            for template in digest_templates:
+                template.text_boxes = boxes
+                template.text_input_count = len(boxes)
+                template.text_boxes_digest = digest
+                updated.append(template)
+
+        MemeTemplate.objects.bulk_update(updated, ['text_boxes', 'text_input_count', 'text_boxes_digest'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Detected text boxes for {len(to_detect)} image(s), updated {len(updated)} template(s)."))
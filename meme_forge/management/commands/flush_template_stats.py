@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from meme_forge.template_stats import flush_template_stats
+
+
+class Command(BaseCommand):
+    help = "Flushes template deal/reroll counters from Redis to the database and republishes selection weights. Run periodically, e.g. from cron."
+
+    def handle(self, *args, **kwargs):
+        updated = flush_template_stats()
+        self.stdout.write(self.style.SUCCESS(f"Flushed statistics for {updated} template(s) and republished selection weights."))
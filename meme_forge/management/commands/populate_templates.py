@@ -1,7 +1,10 @@
 import os
 import json
+from django.conf import settings
+from django.contrib.staticfiles import finders
 from django.core.management.base import BaseCommand
 from meme_forge.models import MemeTemplate
+from meme_forge.imagehash import BKTree, dhash, hash_to_hex, hex_to_hash
 
 
 class Command(BaseCommand):
@@ -20,6 +23,24 @@ class Command(BaseCommand):
             default='static/images/memes_raw',
             help="Directory where meme images are stored"
         )
+        parser.add_argument(
+            '--duplicates',
+            choices=['report', 'merge', 'keep'],
+            default='report',
+            help="What to do with images that look like an existing template: report and skip them, "
+                 "merge their names into the existing template's alternative names, or keep them anyway"
+        )
+        parser.add_argument(
+            '--max-distance',
+            type=int,
+            default=6,
+            help="Maximum hamming distance between perceptual hashes for two images to count as duplicates"
+        )
+        parser.add_argument(
+            '--hash-existing',
+            action='store_true',
+            help="Compute missing perceptual hashes for templates already in the database before importing"
+        )
 
     def handle(self, *args, **kwargs):
         data_dir = kwargs['data_dir']
@@ -33,7 +54,16 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR(f"Image directory not found: {image_dir}"))
             return
 
-        for json_file in os.listdir(data_dir):
+        if kwargs['hash_existing']:
+            self.hash_existing_templates()
+
+        # Load existing names and hashes once instead of querying per file
+        existing_names = set(MemeTemplate.objects.values_list('name', flat=True))
+        hash_index = BKTree()
+        for template_id, name, phash in MemeTemplate.objects.exclude(phash='').values_list('id', 'name', 'phash'):
+            hash_index.add(hex_to_hash(phash), (template_id, name))
+
+        for json_file in sorted(os.listdir(data_dir)):
             if not json_file.endswith('.json'):
                 continue
 
@@ -71,12 +101,30 @@ class Command(BaseCommand):
                     width, height = 0, 0  # Default to 0x0 for invalid dimensions
 
                 # Check if the template already exists
-                if MemeTemplate.objects.filter(name=name).exists():
+                if name in existing_names:
                     self.stdout.write(self.style.WARNING(f"Template '{name}' already exists. Skipping."))
                     continue
 
+                # Look for visually near-identical templates
+                try:
+                    image_hash = dhash(local_image_path)
+                except OSError:
+                    self.stderr.write(self.style.WARNING(f"Could not hash image {local_image_path}."))
+                    image_hash = None
+
+                if image_hash is not None and kwargs['duplicates'] != 'keep':
+                    duplicates = hash_index.find(image_hash, kwargs['max_distance'])
+                    if duplicates:
+                        distance, (duplicate_id, duplicate_name) = duplicates[0]
+                        if kwargs['duplicates'] == 'merge':
+                            self.merge_into(duplicate_id, [name] + alternative_names)
+                            self.stdout.write(self.style.WARNING(f"Template '{name}' merged into near-duplicate '{duplicate_name}' (distance {distance})."))
+                        else:
+                            self.stdout.write(self.style.WARNING(f"Template '{name}' looks like '{duplicate_name}' (distance {distance}). Skipping."))
+                        continue
+
                 # Save to the database
-                MemeTemplate.objects.create(
+                template = MemeTemplate.objects.create(
                     name=name,
                     alternative_names=alternative_names,
                     image_url_web=image_url_web,
@@ -86,11 +134,44 @@ class Command(BaseCommand):
                     width=width,
                     height=height,
                     tags=[],  # Add tags logic if applicable
-                    text_boxes=[],  # Add text box logic if applicable
+                    text_boxes=[],  # Filled in by detect_text_boxes
+                    phash=hash_to_hex(image_hash) if image_hash is not None else "",
                 )
+                existing_names.add(name)
+                if image_hash is not None:
+                    hash_index.add(image_hash, (template.id, name))
                 self.stdout.write(self.style.SUCCESS(f"Template '{name}' added successfully."))
 
             except json.JSONDecodeError:
                 self.stderr.write(self.style.ERROR(f"Invalid JSON format in file: {json_file}"))
             except Exception as e:
                 self.stderr.write(self.style.ERROR(f"Unexpected error processing file {json_file}: {str(e)}"))
+
+    def hash_existing_templates(self):
+        """
+        Computes perceptual hashes for templates that do not have one yet, saving them in bulk.
+        """
+        templates = list(MemeTemplate.objects.filter(phash='').exclude(image_url_local=''))
+        hashed = []
+        for template in templates:
+            path = finders.find(template.image_url_local.removeprefix(settings.STATIC_URL))
+            try:
+                if not path:
+                    raise OSError
+                template.phash = hash_to_hex(dhash(path))
+                hashed.append(template)
+            except OSError:
+                self.stderr.write(self.style.WARNING(f"Could not hash image {template.image_url_local} of template '{template.name}'."))
+
+        MemeTemplate.objects.bulk_update(hashed, ['phash'], batch_size=500)
+        self.stdout.write(self.style.SUCCESS(f"Hashed {len(hashed)} existing template(s)."))
+
+    @staticmethod
+    def merge_into(template_id, names):
+        """
+        Adds the given names to an existing template's alternative names.
+        """
+        template = MemeTemplate.objects.get(id=template_id)
+        known = {template.name, *template.alternative_names}
+        template.alternative_names += [name for name in names if name and name not in known]
+        template.save(update_fields=['alternative_names'])
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meme_forge', '0003_game_history'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('games_played', models.PositiveIntegerField(default=0)),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+                ('best_score', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WeeklyPlayerScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start', models.DateField()),
+                ('games_played', models.PositiveIntegerField(default=0)),
+                ('total_score', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='memetemplate',
+            name='times_submitted',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='memetemplate',
+            name='total_score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='memetemplate',
+            index=models.Index(fields=['-times_submitted', '-total_score'], name='meme_forge__times_s_07320d_idx'),
+        ),
+        migrations.AddField(
+            model_name='playerstats',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='meme_forge_stats', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='weeklyplayerscore',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meme_forge_weekly_scores', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='playerstats',
+            index=models.Index(fields=['-total_score', 'id'], name='meme_forge__total_s_44ffd2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weeklyplayerscore',
+            index=models.Index(fields=['week_start', '-total_score', 'id'], name='meme_forge__week_st_5a9b55_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='weeklyplayerscore',
+            constraint=models.UniqueConstraint(fields=('user', 'week_start'), name='unique_weekly_score_per_user'),
+        ),
+    ]
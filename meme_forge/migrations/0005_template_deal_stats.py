@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meme_forge', '0004_leaderboards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memetemplate',
+            name='times_dealt',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='memetemplate',
+            name='times_rerolled',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
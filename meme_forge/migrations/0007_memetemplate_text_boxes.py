@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:02
+
+from django.db import migrations, models
+
+
+def count_existing_text_boxes(apps, schema_editor):
+    MemeTemplate = apps.get_model('meme_forge', 'MemeTemplate')
+    templates = [template for template in MemeTemplate.objects.only('id', 'text_boxes') if template.text_boxes]
+    for template in templates:
+        template.text_input_count = len(template.text_boxes)
+    MemeTemplate.objects.bulk_update(templates, ['text_input_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meme_forge', '0006_memetemplate_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memetemplate',
+            name='text_boxes_digest',
+            field=models.CharField(blank=True, max_length=80),
+        ),
+        migrations.AddField(
+            model_name='memetemplate',
+            name='text_input_count',
+            field=models.PositiveSmallIntegerField(default=2),
+        ),
+        migrations.RunPython(count_existing_text_boxes, migrations.RunPython.noop),
+    ]
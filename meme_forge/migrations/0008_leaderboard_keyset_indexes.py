@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meme_forge', '0007_memetemplate_text_boxes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='memetemplate',
+            name='meme_forge__times_s_07320d_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='meme_forge__score_f611fa_idx',
+        ),
+        migrations.AddIndex(
+            model_name='memetemplate',
+            index=models.Index(fields=['-times_submitted', '-total_score', '-id'], name='meme_forge__times_s_256698_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['-score', '-id'], name='meme_forge__score_f7e3af_idx'),
+        ),
+    ]
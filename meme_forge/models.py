@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from django.templatetags.static import static
 from core.dataclasses import TemplateTags
 
 class MemeTemplate(models.Model):
@@ -23,15 +25,31 @@ class MemeTemplate(models.Model):
 
     # Tags and text box metadata
     tags = models.JSONField(default=list, blank=True)  # Default to an empty list
-    text_boxes = models.JSONField(default=list, blank=True)  # Default to an empty list
+    text_boxes = models.JSONField(default=list, blank=True)  # Caption regions as fractions of the image, see detect_text_boxes
+    text_input_count = models.PositiveSmallIntegerField(default=2)  # Captions a player writes, one per text box
+    text_boxes_digest = models.CharField(max_length=80, blank=True)  # Content digest of the image the text boxes were detected on
 
     # Image dimensions
     width = models.PositiveIntegerField(default=0)  # Ensure positive integer values
     height = models.PositiveIntegerField(default=0)  # Ensure positive integer values
 
+    # Perceptual (difference) hash of the image as 16 hex digits, used to detect near-duplicates
+    phash = models.CharField(max_length=16, blank=True, db_index=True)
+
+    # Popularity, maintained when a game's results are committed
+    times_submitted = models.PositiveIntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+
+    # Deal statistics, counted in Redis during play and flushed in bulk by flush_template_stats
+    times_dealt = models.PositiveIntegerField(default=0)
+    times_rerolled = models.PositiveIntegerField(default=0)
+
+    MIN_SELECTION_WEIGHT = 0.1  # Keeps unpopular templates in rotation now and then
+
     class Meta:
         indexes = [
             models.Index(fields=['name']),  # Add an index for the 'name' field to optimize queries
+            models.Index(fields=['-times_submitted', '-total_score', '-id']),  # Template popularity leaderboard
         ]
 
     def __str__(self):
@@ -44,6 +62,41 @@ class MemeTemplate(models.Model):
         """
         return f"{self.width}x{self.height}"
 
+    @property
+    def image_url(self):
+        """
+        Public URL of the template image. Local images resolve to their hashed static name
+        so clients can cache them indefinitely; the web URL is the fallback.
+        """
+        return self.resolve_image_url(self.image_url_local, self.image_url_web)
+
+    @staticmethod
+    def resolve_image_url(image_url_local, image_url_web):
+        """
+        The image_url of a template given its stored URLs, for rows fetched with values().
+        """
+        if image_url_local and image_url_local.startswith(settings.STATIC_URL):
+            return static(image_url_local[len(settings.STATIC_URL):])
+        return image_url_local or image_url_web
+
+    @property
+    def average_score(self):
+        """
+        Average score of the memes made with this template.
+        """
+        return self.total_score / self.times_submitted if self.times_submitted else 0.0
+
+    @classmethod
+    def get_selection_weight(cls, times_dealt, times_rerolled, times_submitted, total_score):
+        """
+        Relative chance of a template being dealt: templates that score well are favoured,
+        templates that are mostly rerolled away are dealt less often.
+        """
+        reroll_rate = times_rerolled / times_dealt if times_dealt else 0.0
+        average_score = total_score / times_submitted if times_submitted else 0.0
+        weight = (1.0 + max(average_score, 0.0)) * (1.0 - 0.5 * min(reroll_rate, 1.0))
+        return max(weight, cls.MIN_SELECTION_WEIGHT)
+
     @staticmethod
     def validate_tags(tags):
         """
@@ -61,3 +114,122 @@ class MemeTemplate(models.Model):
             raise ValueError("Width and height values are too large, must be under 10,000.")
         if not self.file_size.endswith("KB") and not self.file_size.endswith("MB"):
             raise ValueError("File size must be a string ending with 'KB' or 'MB'.")
+
+class Game(models.Model):
+    """
+    A finished game. Written together with its rounds, submissions and votes when the game ends.
+    """
+    lobby_code = models.CharField(max_length=10)
+    gamemode = models.CharField(max_length=50)
+    settings = models.JSONField(default=dict, blank=True)  # Host settings the game was played with
+    players = models.JSONField(default=list, blank=True)  # Participant names at game end
+    final_scores = models.JSONField(default=dict, blank=True)  # Player name -> total score
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['lobby_code', 'finished_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.gamemode} game in lobby {self.lobby_code} ({self.finished_at:%Y-%m-%d %H:%M})"
+
+class Round(models.Model):
+    """
+    A single round of a finished game.
+    """
+    game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='rounds')
+    number = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['game', 'number'], name='unique_round_number_per_game'),
+        ]
+        ordering = ['number']
+
+    def __str__(self):
+        return f"Round {self.number} of game {self.game_id}"
+
+class Submission(models.Model):
+    """
+    A meme a player submitted in a round, with the score it received.
+    """
+    round = models.ForeignKey(Round, on_delete=models.CASCADE, related_name='submissions')
+    player_name = models.CharField(max_length=150)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions')  # Empty for guests
+    template = models.ForeignKey(MemeTemplate, on_delete=models.SET_NULL, null=True, blank=True, related_name='submissions')
+    text = models.JSONField(default=list, blank=True)  # Captions, one per text box
+    score = models.IntegerField(default=0)
+    created_at = models.DateTimeField()  # Time the game was persisted
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['round', 'player_name'], name='unique_submission_per_player_and_round'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at']),  # "My past games"
+            models.Index(fields=['-score', '-id']),  # "Top memes"
+        ]
+
+    def __str__(self):
+        return f"{self.player_name}: {self.text}"
+
+class Vote(models.Model):
+    """
+    A vote cast on a submission.
+    """
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='votes')
+    voter_name = models.CharField(max_length=150)
+    voter = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='votes')  # Empty for guests
+    like = models.CharField(
+        max_length=10,
+        choices=[('like', 'Like'), ('superlike', 'Superlike'), ('dislike', 'Dislike')]
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['submission', 'voter_name'], name='unique_vote_per_voter_and_submission'),
+        ]
+
+    def __str__(self):
+        return f"{self.voter_name} -> {self.like}"
+
+class PlayerStats(models.Model):
+    """
+    All-time MemeForge totals of a registered player, updated when a game's results are committed.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meme_forge_stats')
+    games_played = models.PositiveIntegerField(default=0)
+    wins = models.PositiveIntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+    best_score = models.IntegerField(default=0)  # Best single-game score
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_score', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.total_score}"
+
+class WeeklyPlayerScore(models.Model):
+    """
+    MemeForge totals of a registered player for one week, starting on Monday.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meme_forge_weekly_scores')
+    week_start = models.DateField()
+    games_played = models.PositiveIntegerField(default=0)
+    total_score = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'week_start'], name='unique_weekly_score_per_user'),
+        ]
+        indexes = [
+            models.Index(fields=['week_start', '-total_score', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.week_start}): {self.total_score}"
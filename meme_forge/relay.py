@@ -0,0 +1,119 @@
+from meme_forge.display import DISPLAY_SNAPSHOT_INTERVAL, abuild_display_snapshot, aclaim_pending_snapshot, compute_delta, get_display_group
+import asyncio, json, logging
+
+logger = logging.getLogger(__name__)
+
+class SpectatorRelay:
+    """
+    Per-process relay of one lobby's display stream. The relay, not each spectator, is the
+    member of the lobby's display group, so a snapshot crosses the channel layer once per
+    worker. It is then sent to every local spectator as one delta frame encoded once.
+    """
+    relays = {}  # lobby code -> relay of this process
+
+    def __init__(self, channel_layer, lobby_code:str):
+        self.channel_layer = channel_layer
+        self.lobby_code = lobby_code
+        self.display_group_name = get_display_group(lobby_code)
+        self.channel_name = None
+        self.spectators = set()
+        self.snapshot = None
+        self.sequence = 0
+        self.started = None  # Future of start(), shared by everyone joining meanwhile
+        self.tasks = []
+
+    @classmethod
+    async def join(cls, channel_layer, lobby_code:str, consumer) -> "SpectatorRelay":
+        """
+        Adds a spectator socket to the lobby's relay, starting the relay for the first one,
+        and sends it the current snapshot in full.
+        """
+        relay = cls.relays.get(lobby_code)
+        if relay is None:
+            relay = cls.relays[lobby_code] = cls(channel_layer, lobby_code)
+            relay.started = asyncio.ensure_future(relay.start())
+        try:
+            # Shielded so a joiner that goes away does not cancel the start for the others
+            await asyncio.shield(relay.started)
+        except Exception:
+            # Every joiner of a relay that failed to start gets the error; the next join retries
+            if cls.relays.get(lobby_code) is relay:
+                del cls.relays[lobby_code]
+            raise
+
+        relay.spectators.add(consumer)
+        consumer.queue_frame(relay.full_frame(), "display", relay.merge_frames)
+        return relay
+
+    async def leave(self, consumer):
+        """
+        Removes a spectator socket, stopping the relay after the last one.
+        """
+        self.spectators.discard(consumer)
+        if not self.spectators and self.relays.get(self.lobby_code) is self:
+            del self.relays[self.lobby_code]
+            await self.stop()
+
+    async def start(self):
+        self.channel_name = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(self.display_group_name, self.channel_name)
+        self.snapshot = await abuild_display_snapshot(self.lobby_code)
+        self.tasks = [
+            asyncio.ensure_future(self.receive_snapshots()),
+            asyncio.ensure_future(self.flush_pending_snapshots()),
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await self.channel_layer.group_discard(self.display_group_name, self.channel_name)
+
+    def full_frame(self) -> str:
+        return json.dumps({"action": "display_snapshot", "sequence": self.sequence, "snapshot": self.snapshot})
+
+    def merge_frames(self, old:str, new:str) -> str:
+        """
+        Deltas build on each other, so a spectator that has not received the previous frame
+        yet gets the current snapshot in full instead of both.
+        """
+        return self.full_frame()
+
+    async def receive_snapshots(self):
+        while True:
+            message = await self.channel_layer.receive(self.channel_name)
+            if message.get("type") != "display_snapshot":
+                continue
+            try:
+                await self.publish(message["snapshot"])
+            except Exception:
+                # A bad snapshot is skipped rather than ending the stream
+                logger.exception("Could not relay a display snapshot of lobby %s", self.lobby_code)
+
+    async def flush_pending_snapshots(self):
+        """
+        Sends snapshots that were held back by the rate cap. Claiming is global, so only one
+        worker sends each of them.
+        """
+        while True:
+            await asyncio.sleep(DISPLAY_SNAPSHOT_INTERVAL)
+            try:
+                if await aclaim_pending_snapshot(self.lobby_code):
+                    await self.channel_layer.group_send(
+                        self.display_group_name,
+                        {"type": "display_snapshot", "snapshot": await abuild_display_snapshot(self.lobby_code)},
+                    )
+            except Exception:
+                logger.exception("Could not flush the pending display snapshot of lobby %s", self.lobby_code)
+
+    async def publish(self, snapshot:dict):
+        """
+        Fans a new snapshot out to the local spectators as a delta against the previous one.
+        """
+        # Encoded before the state changes, so a snapshot that fails leaves the relay as it was
+        changes, removed = compute_delta(self.snapshot, snapshot)
+        frame = json.dumps({"action": "display_delta", "sequence": self.sequence + 1, "changes": changes, "removed": removed})
+        self.snapshot = snapshot
+        self.sequence += 1
+
+        for consumer in self.spectators:
+            consumer.queue_frame(frame, "display", self.merge_frames)
@@ -0,0 +1,75 @@
+from typing import Hashable, List, Sequence
+import heapq, random
+
+class AliasTable:
+    """
+    Walker/Vose alias table for O(1) weighted draws from a fixed set of items.
+    Building the table is O(n); it is rebuilt whenever the weights change.
+    """
+
+    def __init__(self, items:Sequence[Hashable], weights:Sequence[float]):
+        if len(items) != len(weights):
+            raise ValueError("Items and weights must have the same length.")
+
+        self.items = list(items)
+        self.weights = [max(float(weight), 0.0) for weight in weights]
+        size = len(self.items)
+        total = sum(self.weights)
+
+        # Fall back to uniform sampling if no item carries any weight
+        if total <= 0:
+            self.weights = [1.0] * size
+            total = float(size)
+
+        self.probability = [1.0] * size
+        self.alias = list(range(size))
+
+        scaled = [weight * size / total for weight in self.weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probability[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] += scaled[less] - 1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # Leftovers are 1.0 up to rounding error
+        for index in small + large:
+            self.probability[index] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng=random) -> Hashable:
+        """
+        Returns one item, chosen with probability proportional to its weight.
+        """
+        index = rng.randrange(len(self.items))
+        return self.items[index] if rng.random() < self.probability[index] else self.items[self.alias[index]]
+
+    def sample(self, count:int, rng=random) -> List[Hashable]:
+        """
+        Returns `count` distinct items, favouring heavier ones. Uses rejection on the alias
+        table while duplicates are unlikely, and a weighted shuffle otherwise.
+        """
+        if count >= len(self.items):
+            return list(self.items)
+
+        if count <= len(self.items) // 2:
+            chosen = []
+            seen = set()
+            attempts = 0
+            while len(chosen) < count and attempts < count * 20:
+                item = self.draw(rng)
+                attempts += 1
+                if item not in seen:
+                    seen.add(item)
+                    chosen.append(item)
+            if len(chosen) == count:
+                return chosen
+
+        # Efraimidis-Spirakis weighted sampling without replacement
+        keys = ((rng.random() ** (1.0 / weight) if weight > 0 else 0.0, index) for index, weight in enumerate(self.weights))
+        return [self.items[index] for _, index in heapq.nlargest(count, keys)]
@@ -0,0 +1,128 @@
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from django.core.cache import cache
+from typing import Dict, List, Optional, Set, Tuple
+import re, time
+
+SEARCH_INDEX_VERSION_KEY = "template_search:version"
+MIN_SIMILARITY = 0.3  # Dice coefficient below which fuzzy matches are dropped
+PREFIX_MATCH_SCORE = 2.0  # Prefix matches always rank above fuzzy ones
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+_NAME_SUFFIX = re.compile(r"\s*meme template$")
+
+def normalize(text:str) -> str:
+    """
+    Lowercases text and collapses everything but letters and digits into single spaces.
+    """
+    return _NON_ALPHANUMERIC.sub(" ", (text or "").lower()).strip()
+
+def trigrams(text:str) -> Set[str]:
+    """
+    Returns the padded character trigrams of normalized text.
+    """
+    padded = f"  {text} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+@dataclass
+class IndexedTemplate:
+    """
+    A template as stored in the search index.
+    """
+    id: int
+    name: str
+    image_url: str
+
+@dataclass
+class TemplateSearchIndex:
+    """
+    In-process trigram and prefix index over template names and alternative names.
+    """
+    templates: List[IndexedTemplate] = field(default_factory=list)
+    terms: List[Tuple[int, str, Set[str]]] = field(default_factory=list)  # (template index, term, trigrams)
+    postings: Dict[str, Set[int]] = field(default_factory=lambda: defaultdict(set))  # trigram -> term indices
+    prefixes: List[Tuple[str, int]] = field(default_factory=list)  # Sorted (term or word, template index)
+
+    @classmethod
+    def build(cls, templates) -> "TemplateSearchIndex":
+        """
+        Builds the index from an iterable of MemeTemplate instances.
+        """
+        index = cls()
+        prefixes = set()
+        for template in templates:
+            template_index = len(index.templates)
+            index.templates.append(IndexedTemplate(id=template.id, name=template.name, image_url=template.image_url))
+
+            names = [_NAME_SUFFIX.sub("", normalize(template.name))] + [normalize(name) for name in template.alternative_names]
+            for term in dict.fromkeys(name for name in names if name):
+                term_trigrams = trigrams(term)
+                term_index = len(index.terms)
+                index.terms.append((template_index, term, term_trigrams))
+                for trigram in term_trigrams:
+                    index.postings[trigram].add(term_index)
+
+                prefixes.add((term, template_index))
+                for word in term.split(" ")[1:]:
+                    prefixes.add((word, template_index))
+
+        index.prefixes = sorted(prefixes)
+        return index
+
+    def search(self, query:str, limit:int=10) -> List[Tuple[IndexedTemplate, float]]:
+        """
+        Returns up to `limit` (template, score) pairs, best first. Names or words starting
+        with the query rank first, then names sharing enough trigrams to tolerate typos.
+        """
+        query = normalize(query)
+        if not query:
+            return []
+
+        scores = {}
+
+        # Prefix matches: binary search for the first term >= query and walk forward
+        position = bisect_left(self.prefixes, (query, -1))
+        while position < len(self.prefixes) and self.prefixes[position][0].startswith(query):
+            term, template_index = self.prefixes[position]
+            scores[template_index] = max(scores.get(template_index, 0.0), PREFIX_MATCH_SCORE + len(query) / len(term))
+            position += 1
+
+        # Fuzzy matches: count shared trigrams through the postings lists
+        query_trigrams = trigrams(query)
+        shared = Counter()
+        for trigram in query_trigrams:
+            for term_index in self.postings.get(trigram, ()):
+                shared[term_index] += 1
+
+        for term_index, count in shared.items():
+            template_index, _, term_trigrams = self.terms[term_index]
+            similarity = 2.0 * count / (len(query_trigrams) + len(term_trigrams))
+            if similarity >= MIN_SIMILARITY and similarity > scores.get(template_index, 0.0):
+                scores[template_index] = similarity
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.templates[item[0]].name))
+        return [(self.templates[template_index], round(score, 3)) for template_index, score in ranked[:limit]]
+
+# Per-process index and the version it was built for
+_index: Optional[TemplateSearchIndex] = None
+_index_version = None
+
+def get_search_index() -> TemplateSearchIndex:
+    """
+    Returns the process-local search index, rebuilding it if templates changed since it was built.
+    """
+    global _index, _index_version
+    from meme_forge.models import MemeTemplate
+
+    version = cache.get_or_set(SEARCH_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
+    if _index is None or version != _index_version:
+        _index = TemplateSearchIndex.build(MemeTemplate.objects.only("id", "name", "alternative_names", "image_url_local", "image_url_web"))
+        _index_version = version
+    return _index
+
+def invalidate_search_index(*args, **kwargs):
+    """
+    Signal handler marking the search index stale in every process.
+    """
+    cache.set(SEARCH_INDEX_VERSION_KEY, time.time_ns(), timeout=None)
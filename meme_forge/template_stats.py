@@ -0,0 +1,135 @@
+from django.core.cache import cache
+from django.db import transaction
+from typing import Iterable, Optional
+from lobby.views import async_redis_client, redis_client
+from meme_forge.models import MemeTemplate
+from meme_forge.sampling import AliasTable
+from redis.exceptions import ResponseError
+import time
+
+# Redis hashes of template ID -> count, accumulated during play and flushed in bulk
+TEMPLATE_COUNTER_KEYS = {
+    "dealt": "template_stats:dealt",
+    "rerolled": "template_stats:rerolled",
+}
+# Counters being flushed; deleted only once the flush is committed, retried by the next flush otherwise
+TEMPLATE_STAGING_KEYS = {
+    "dealt": "template_stats:flushing:dealt",
+    "rerolled": "template_stats:flushing:rerolled",
+}
+TEMPLATE_FLUSH_LOCK_KEY = "template_stats:flush_lock"
+TEMPLATE_FLUSH_LOCK_TIMEOUT = 300
+TEMPLATE_COUNTER_FIELDS = {
+    "dealt": "times_dealt",
+    "rerolled": "times_rerolled",
+}
+
+# Published selection weights, read by every worker when the version changes
+TEMPLATE_WEIGHTS_KEY = "template_stats:weights"
+TEMPLATE_WEIGHTS_VERSION_KEY = "template_stats:weights_version"
+
+# Per-process alias tables, keyed by tag constraint, for the weights version in _sampler_version
+_samplers = {}
+_sampler_version = None
+
+#-------- Counters --------
+
+async def arecord_template_event(event:str, template_id, amount:int=1):
+    """
+    Count a template being dealt or rerolled away. A single HINCRBY, no database access.
+    """
+    await async_redis_client.hincrby(TEMPLATE_COUNTER_KEYS[event], template_id, amount)
+
+def flush_template_stats() -> int:
+    """
+    Move the accumulated Redis counters onto MemeTemplate in one bulk update and
+    republish the selection weights. Returns the number of templates updated, or 0 if
+    another flush is running.
+    """
+    # Two flushes of the same staged counters would apply them twice
+    if not redis_client.set(TEMPLATE_FLUSH_LOCK_KEY, 1, nx=True, ex=TEMPLATE_FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        # RENAME moves a counter aside atomically, so increments after it start a fresh hash.
+        # Counters staged by a failed flush are applied first; new ones wait for the next flush.
+        counters = {}
+        for event, key in TEMPLATE_COUNTER_KEYS.items():
+            staging_key = TEMPLATE_STAGING_KEYS[event]
+            if not redis_client.exists(staging_key):
+                try:
+                    redis_client.rename(key, staging_key)
+                except ResponseError:
+                    pass  # Nothing counted since the last flush
+            counters[event] = redis_client.hgetall(staging_key)
+
+        template_ids = {int(template_id) for counts in counters.values() for template_id in counts}
+        with transaction.atomic():
+            templates = list(MemeTemplate.objects.select_for_update().filter(id__in=template_ids))
+            for template in templates:
+                for event, field in TEMPLATE_COUNTER_FIELDS.items():
+                    setattr(template, field, getattr(template, field) + int(counters[event].get(str(template.id), 0)))
+            MemeTemplate.objects.bulk_update(templates, list(TEMPLATE_COUNTER_FIELDS.values()), batch_size=500)
+            transaction.on_commit(lambda: redis_client.delete(*TEMPLATE_STAGING_KEYS.values()))
+    finally:
+        redis_client.delete(TEMPLATE_FLUSH_LOCK_KEY)
+
+    publish_template_weights()
+    return len(templates)
+
+#-------- Weighted Selection --------
+
+def publish_template_weights():
+    """
+    Compute every template's selection weight and publish them for all workers.
+    """
+    rows = MemeTemplate.objects.values_list("id", "tags", "times_dealt", "times_rerolled", "times_submitted", "total_score")
+    weights = [
+        (template_id, MemeTemplate.get_selection_weight(dealt, rerolled, submitted, score), tags)
+        for template_id, tags, dealt, rerolled, submitted, score in rows
+    ]
+    version = time.time_ns()
+    cache.set(TEMPLATE_WEIGHTS_KEY, {"version": version, "templates": weights}, timeout=None)
+    cache.set(TEMPLATE_WEIGHTS_VERSION_KEY, version, timeout=None)
+
+async def aget_template_sampler(tags:Iterable[str]) -> Optional[AliasTable]:
+    """
+    Returns an alias table over the templates matching any of the given tags (all templates
+    if none), or None if no weights have been published yet. Tables are built once per
+    weights version and tag set, so drawing k templates is O(k).
+    """
+    version = await cache.aget(TEMPLATE_WEIGHTS_VERSION_KEY)
+    if version is None:
+        return None
+
+    tags = frozenset(tags)
+    sampler = _get_cached_sampler(version, tags)
+    if sampler is None:
+        sampler = _build_sampler(tags, await cache.aget(TEMPLATE_WEIGHTS_KEY))
+    return sampler
+
+def _get_cached_sampler(version, tags:frozenset) -> Optional[AliasTable]:
+    """
+    Returns the table built for the tag set under the given weights version, dropping tables of older versions.
+    """
+    global _sampler_version
+
+    if version != _sampler_version:
+        _samplers.clear()
+        _sampler_version = version
+    return _samplers.get(tags)
+
+def _build_sampler(tags:frozenset, published) -> Optional[AliasTable]:
+    """
+    Builds and caches the table for the tag set from the published weights.
+    """
+    if not published:
+        return None
+
+    matching = [
+        (template_id, weight)
+        for template_id, weight, template_tags in published["templates"]
+        if not tags or tags.intersection(template_tags)
+    ]
+    _samplers[tags] = AliasTable([template_id for template_id, _ in matching], [weight for _, weight in matching])
+    return _samplers[tags]
@@ -42,3 +42,569 @@ class GamemodeConsumerTestCase(TestCase):
 
         # Disconnect
         await communicator.disconnect()
+
+class TemplateDealingTestCase(TestCase):
+    def setUp(self):
+        from meme_forge.models import MemeTemplate
+        self.lobby_code = "DEAL1"
+        self.templates = [
+            MemeTemplate.objects.create(name=f"Template {i}", image_url_local=f"/static/images/memes_raw/{i}.jpg")
+            for i in range(6)
+        ]
+
+    def test_hands_feed_prefetch_manifest_and_reroll(self):
+        from meme_forge.views import adeal_hands, adeal_next_template, aget_prefetch_manifest, aload_templates_to_redis
+        deal_hands, deal_next_template = async_to_sync(adeal_hands), async_to_sync(adeal_next_template)
+        get_prefetch_manifest, load_templates_to_redis = async_to_sync(aget_prefetch_manifest), async_to_sync(aload_templates_to_redis)
+        load_templates_to_redis(self.lobby_code, self.templates)
+        deal_hands(self.lobby_code, ["alice", "bob"], self.templates, 3)
+
+        manifest = get_prefetch_manifest(self.lobby_code, "alice")
+        self.assertEqual(len(manifest), 3)
+
+        # Dealing moves the head of the hand into play, the manifest advances with it
+        current = deal_next_template(self.lobby_code, "alice")
+        self.assertEqual(current["image_url"], manifest[0])
+        self.assertEqual(get_prefetch_manifest(self.lobby_code, "alice"), manifest[1:])
+
+        # Hands do not overlap while there are enough templates
+        self.assertFalse(set(manifest) & set(get_prefetch_manifest(self.lobby_code, "bob")))
+
+class GameHistoryTestCase(TestCase):
+    def test_finished_game_is_persisted_once(self):
+        from core.dataclasses import Lobby, MemeForge
+        from lobby.views import redis_client
+        from meme_forge.models import Game, MemeTemplate, Submission, Vote
+        from meme_forge.views import aarchive_round, persist_game
+        archive_round = async_to_sync(aarchive_round)
+
+        lobby_code = "HIST1"
+        template = MemeTemplate.objects.create(name="History Template")
+        lobby = Lobby(
+            code=lobby_code,
+            creator="Host",
+            participants=[{"name": "alice", "profile_pic": ""}, {"name": "bob", "profile_pic": ""}],
+            game_started=True,
+            gamemode=MemeForge(rounds=1, time_limit_rounds=60, rerolls_per_player=0, template_constraints={"tags": []}),
+        )
+        redis_client.delete(f"lobby:{lobby_code}:persisted", f"lobby:{lobby_code}:history")
+        redis_client.hset(f"lobby:{lobby_code}:submissions", mapping={
+            "alice": json.dumps({"template_id": str(template.id), "text": "top text"}),
+            "bob": json.dumps({"template_id": "999999", "text": "bottom text"}),
+        })
+        redis_client.hset(f"lobby:{lobby_code}:votes", mapping={"bob:alice": "superlike", "alice:bob": "dislike"})
+
+        archive_round(lobby_code, 1)
+
+        # A failed write is rolled back and leaves the game to be persisted again
+        from unittest import mock
+        with mock.patch("meme_forge.views.update_leaderboards", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                persist_game(lobby_code, lobby)
+        self.assertEqual(Game.objects.count(), 0)
+
+        game = persist_game(lobby_code, lobby)
+
+        self.assertEqual(game.final_scores, {"alice": 5, "bob": -1})
+        self.assertEqual(Submission.objects.filter(round__game=game).count(), 2)
+        self.assertEqual(Submission.objects.get(round__game=game, player_name="bob").template, None)
+        self.assertEqual(Vote.objects.filter(submission__round__game=game).count(), 2)
+
+        # A second call for the same lobby is a no-op
+        self.assertIsNone(persist_game(lobby_code, lobby))
+        self.assertEqual(Game.objects.count(), 1)
+
+    def test_second_game_in_a_lobby_is_persisted_on_its_own(self):
+        from core.dataclasses import Lobby, MemeForge
+        from lobby.views import redis_client
+        from meme_forge.models import Game, Round
+        from meme_forge.views import aarchive_round, areset_game, persist_game
+        archive_round, reset_game = async_to_sync(aarchive_round), async_to_sync(areset_game)
+
+        lobby_code = "HIST2"
+        lobby = Lobby(code=lobby_code, creator="Host", participants=[{"name": "alice", "profile_pic": ""}], game_started=True)
+        redis_client.delete(f"lobby:{lobby_code}:persisted", f"lobby:{lobby_code}:history")
+        for rounds in (2, 1):
+            # What start_game does before dealing
+            reset_game(lobby_code)
+            lobby.gamemode = MemeForge(rounds=rounds, time_limit_rounds=60, rerolls_per_player=0, template_constraints={"tags": []})
+            for number in range(1, rounds + 1):
+                redis_client.hset(f"lobby:{lobby_code}:submissions", "alice", json.dumps({"template_id": "", "text": f"round {number}"}))
+                archive_round(lobby_code, number)
+            self.assertIsNotNone(persist_game(lobby_code, lobby))
+
+        games = Game.objects.filter(lobby_code=lobby_code).order_by("id")
+        self.assertEqual([Round.objects.filter(game=game).count() for game in games], [2, 1])
+
+    def test_only_the_host_advances_a_started_game(self):
+        from core.dataclasses import Lobby
+        from lobby.views import save_lobby_to_redis
+
+        self.assertEqual(self.client.post("/meme-forge/next-round/NOPE1/").status_code, 404)
+        save_lobby_to_redis(Lobby(code="NEXT1", creator="Host"))
+        self.assertEqual(self.client.get("/meme-forge/next-round/NEXT1/").status_code, 405)
+        self.assertEqual(self.client.post("/meme-forge/next-round/NEXT1/").status_code, 403)
+
+        session = self.client.session
+        session["host_lobby_code"] = "NEXT1"
+        session.save()
+        self.assertEqual(self.client.post("/meme-forge/next-round/NEXT1/").status_code, 400)
+
+class LeaderboardTestCase(TestCase):
+    def test_committed_game_updates_leaderboards(self):
+        from django.contrib.auth import get_user_model
+        from core.dataclasses import Lobby, MemeForge
+        from lobby.views import redis_client
+        from meme_forge.models import PlayerStats, WeeklyPlayerScore
+        from meme_forge.views import aarchive_round, persist_game, get_leaderboard_page
+        archive_round = async_to_sync(aarchive_round)
+
+        user = get_user_model().objects.create_user(username="alice", password="secret")
+        lobby_code = "LEAD1"
+        lobby = Lobby(
+            code=lobby_code,
+            creator="Host",
+            participants=[{"name": "alice", "profile_pic": "", "user_id": user.id}, {"name": "guest", "profile_pic": ""}],
+            game_started=True,
+            gamemode=MemeForge(rounds=1, time_limit_rounds=60, rerolls_per_player=0, template_constraints={"tags": []}),
+        )
+        redis_client.delete(f"lobby:{lobby_code}:persisted", f"lobby:{lobby_code}:history")
+        redis_client.hset(f"lobby:{lobby_code}:submissions", mapping={
+            "alice": json.dumps({"template_id": "", "text": "top text"}),
+            "guest": json.dumps({"template_id": "", "text": "bottom text"}),
+        })
+        redis_client.hset(f"lobby:{lobby_code}:votes", mapping={"guest:alice": "like"})
+
+        # Warm the cache before the game is committed
+        rows, _, _ = get_leaderboard_page("all_time")
+        self.assertEqual(rows, [])
+
+        archive_round(lobby_code, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            persist_game(lobby_code, lobby)
+
+        stats = PlayerStats.objects.get(user=user)
+        self.assertEqual((stats.games_played, stats.wins, stats.total_score), (1, 1, 2))
+        self.assertEqual(WeeklyPlayerScore.objects.get(user=user).total_score, 2)
+        user.refresh_from_db()
+        self.assertEqual(user.pb_meme_forge, 2)
+
+        # Committing bumped the version, so the cached empty page is not served
+        rows, has_previous, has_next = get_leaderboard_page("all_time")
+        self.assertEqual([row["user__username"] for row in rows], ["alice"])
+        self.assertFalse(has_previous or has_next)
+
+    def test_pages_follow_the_keyset(self):
+        from unittest import mock
+        from django.contrib.auth import get_user_model
+        from meme_forge.models import PlayerStats
+        from meme_forge.views import bump_leaderboard_version, get_leaderboard_cursor, get_leaderboard_page
+
+        for index, score in enumerate([5, 9, 5, 1, 7]):
+            user = get_user_model().objects.create_user(username=f"player{index}", password="secret")
+            PlayerStats.objects.create(user=user, total_score=score)
+        bump_leaderboard_version()  # Rows written directly, not by a committed game
+
+        with mock.patch("meme_forge.views.LEADERBOARD_PAGE_SIZE", 2):
+            first, has_previous, has_next = get_leaderboard_page("all_time")
+            self.assertEqual([row["total_score"] for row in first], [9, 7])
+            self.assertEqual((has_previous, has_next), (False, True))
+
+            # Ties on the score are broken by id, so no row is skipped or repeated
+            second, _, _ = get_leaderboard_page("all_time", tuple(map(int, get_leaderboard_cursor("all_time", first[-1]).split(","))))
+            self.assertEqual([row["user__username"] for row in second], ["player0", "player2"])
+            third, has_previous, has_next = get_leaderboard_page("all_time", (second[-1]["total_score"], second[-1]["id"]))
+            self.assertEqual([row["total_score"] for row in third], [1])
+            self.assertEqual((has_previous, has_next), (True, False))
+
+            back, has_previous, _ = get_leaderboard_page("all_time", (second[0]["total_score"], second[0]["id"]), backwards=True)
+            self.assertEqual(back, first)
+            self.assertFalse(has_previous)
+
+        response = self.client.get("/meme-forge/leaderboard/?board=all_time&after=7,9999&rank=2")
+        self.assertEqual(response.status_code, 200)
+
+class TemplateSelectionTestCase(TestCase):
+    def test_alias_table_follows_weights(self):
+        import random
+        from meme_forge.sampling import AliasTable
+        table = AliasTable(["a", "b", "c"], [1, 3, 0])
+        rng = random.Random(0)
+        draws = [table.draw(rng) for _ in range(4000)]
+        self.assertNotIn("c", draws)
+        self.assertAlmostEqual(draws.count("b") / len(draws), 0.75, delta=0.03)
+        self.assertEqual(len(set(table.sample(2, rng))), 2)
+
+    def test_flush_moves_counters_to_templates(self):
+        from meme_forge.models import MemeTemplate
+        from unittest import mock
+        from meme_forge.template_stats import TEMPLATE_COUNTER_KEYS, TEMPLATE_STAGING_KEYS, aget_template_sampler, arecord_template_event, flush_template_stats
+        get_template_sampler, record_template_event = async_to_sync(aget_template_sampler), async_to_sync(arecord_template_event)
+        from lobby.views import redis_client
+        redis_client.delete(*TEMPLATE_COUNTER_KEYS.values(), *TEMPLATE_STAGING_KEYS.values())
+
+        popular = MemeTemplate.objects.create(name="Popular", tags=["animated"])
+        unpopular = MemeTemplate.objects.create(name="Unpopular")
+        for _ in range(4):
+            record_template_event("dealt", popular.id)
+            record_template_event("dealt", unpopular.id)
+            record_template_event("rerolled", unpopular.id)
+
+        # A failed update keeps the counters staged for the next flush
+        with mock.patch("meme_forge.template_stats.MemeTemplate.objects.bulk_update", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_template_stats()
+        record_template_event("dealt", popular.id)
+        self.assertTrue(redis_client.exists(*TEMPLATE_STAGING_KEYS.values()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_template_stats(), 2)
+        unpopular.refresh_from_db()
+        self.assertEqual((unpopular.times_dealt, unpopular.times_rerolled), (4, 4))
+        self.assertFalse(redis_client.exists(*TEMPLATE_STAGING_KEYS.values()))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(flush_template_stats(), 1)
+        popular.refresh_from_db()
+        self.assertEqual(popular.times_dealt, 5)
+        self.assertFalse(redis_client.exists(*TEMPLATE_COUNTER_KEYS.values()))
+
+        sampler = get_template_sampler([])
+        self.assertEqual(len(sampler), 2)
+        self.assertGreater(sampler.weights[sampler.items.index(popular.id)], sampler.weights[sampler.items.index(unpopular.id)])
+        self.assertEqual(get_template_sampler(["animated"]).items, [popular.id])
+
+class TemplateSearchTestCase(TestCase):
+    def setUp(self):
+        from meme_forge.models import MemeTemplate
+        MemeTemplate.objects.create(name="10 Guy Meme Template", alternative_names=["Really High Guy", "Stoner Stanley"])
+        MemeTemplate.objects.create(name="Distracted Boyfriend Meme Template", alternative_names=["Man Looking at Other Woman"])
+
+    def test_prefix_alias_and_typo_matches(self):
+        from meme_forge.search import get_search_index
+        index = get_search_index()
+        self.assertEqual(index.search("distr")[0][0].name, "Distracted Boyfriend Meme Template")
+        self.assertEqual(index.search("stoner")[0][0].name, "10 Guy Meme Template")
+        self.assertEqual(index.search("distracted boyfreind")[0][0].name, "Distracted Boyfriend Meme Template")
+        self.assertEqual(index.search("zzzz"), [])
+
+    def test_index_rebuilds_when_templates_change(self):
+        from meme_forge.models import MemeTemplate
+        from meme_forge.search import get_search_index
+        get_search_index()
+        MemeTemplate.objects.create(name="Drake Hotline Bling Meme Template")
+        self.assertEqual(get_search_index().search("drake")[0][0].name, "Drake Hotline Bling Meme Template")
+
+class DuplicateDetectionTestCase(TestCase):
+    def test_near_duplicates_are_found(self):
+        import os, random, tempfile
+        from PIL import Image
+        from meme_forge.imagehash import BKTree, dhash
+
+        rng = random.Random(1)
+        original = Image.new("L", (64, 64))
+        original.putdata([rng.randrange(256) for _ in range(64 * 64)])
+        other = Image.new("L", (64, 64))
+        other.putdata([rng.randrange(256) for _ in range(64 * 64)])
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = {}
+            for name, image in (("original", original), ("resized", original.resize((128, 128))), ("other", other)):
+                paths[name] = os.path.join(directory, f"{name}.png")
+                image.save(paths[name])
+            hashes = {name: dhash(path) for name, path in paths.items()}
+
+        tree = BKTree()
+        tree.add(hashes["original"], "original")
+        tree.add(hashes["other"], "other")
+        self.assertEqual([payload for _, payload in tree.find(hashes["resized"], 6)], ["original"])
+
+class TextBoxDetectionTestCase(TestCase):
+    def test_caption_bands_are_found_on_calm_areas(self):
+        import os, random, tempfile
+        from PIL import Image
+        from meme_forge.textboxes import detect_text_boxes
+
+        # Plain white bands above and below a noisy picture
+        rng = random.Random(2)
+        image = Image.new("L", (120, 120), 255)
+        noise = Image.new("L", (120, 60))
+        noise.putdata([rng.randrange(256) for _ in range(120 * 60)])
+        image.paste(noise, (0, 30))
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "template.png")
+            image.save(path)
+            boxes = detect_text_boxes(path)
+
+        self.assertEqual(len(boxes), 2)
+        self.assertEqual((boxes[0]["y"], boxes[0]["width"]), (0.0, 1.0))
+        self.assertGreaterEqual(boxes[1]["y"], 0.75)
+
+class DisplaySnapshotTestCase(TestCase):
+    def test_snapshot_aggregates_round_and_rate_caps(self):
+        import json
+        from core.dataclasses import Lobby
+        from lobby.views import redis_client, save_lobby_to_redis
+        from asgiref.sync import async_to_sync
+        from meme_forge.display import abuild_display_snapshot, aclaim_pending_snapshot, aclaim_snapshot_slot, aset_round_deadline
+        claim_pending_snapshot, claim_snapshot_slot = async_to_sync(aclaim_pending_snapshot), async_to_sync(aclaim_snapshot_slot)
+        build_display_snapshot, set_round_deadline = async_to_sync(abuild_display_snapshot), async_to_sync(aset_round_deadline)
+
+        lobby = Lobby(code="TV1", creator="Host", participants=[{"name": "alice", "profile_pic": ""}, {"name": "bob", "profile_pic": ""}])
+        save_lobby_to_redis(lobby)
+        redis_client.delete("lobby:TV1:submissions", "lobby:TV1:votes", "lobby:TV1:display_throttle", "lobby:TV1:display_pending")
+        redis_client.hset("lobby:TV1:submissions", "alice", json.dumps({"template_id": 1, "text": "hi"}))
+        redis_client.hset("lobby:TV1:votes", mapping={"bob:alice": "superlike", "carol:alice": "dislike"})
+        set_round_deadline("TV1", 60, 60)
+
+        snapshot = build_display_snapshot("TV1")
+        self.assertEqual(snapshot["order"], ["alice", "bob"])
+        self.assertEqual(snapshot["players"]["alice"], {"submitted": True, "like": 0, "superlike": 1, "dislike": 1, "score": 4})
+        self.assertFalse(snapshot["players"]["bob"]["submitted"])
+        self.assertAlmostEqual(snapshot["deadline"] - snapshot["server_time"], 60, delta=1)
+
+        # A second change within the interval is held back until the next flush
+        self.assertTrue(claim_snapshot_slot("TV1"))
+        self.assertFalse(claim_snapshot_slot("TV1"))
+        self.assertFalse(claim_pending_snapshot("TV1"))
+        redis_client.delete("lobby:TV1:display_throttle")
+        self.assertTrue(claim_pending_snapshot("TV1"))
+        self.assertFalse(redis_client.exists("lobby:TV1:display_pending"))
+
+    def test_relay_fans_out_deltas_to_local_spectators(self):
+        import asyncio, json
+        from asgiref.sync import async_to_sync
+        from core.dataclasses import Lobby
+        from lobby.views import save_lobby_to_redis
+        from meme_forge.display import abuild_display_snapshot, get_display_group
+        from meme_forge.relay import SpectatorRelay
+
+        save_lobby_to_redis(Lobby(code="TV2", creator="Host", participants=[{"name": "alice", "profile_pic": ""}]))
+
+        class Spectator:
+            def __init__(self):
+                self.frames = []
+
+            def queue_frame(self, text_data, key=None, merge=None):
+                self.frames.append(json.loads(text_data))
+
+        async def scenario():
+            layer = get_channel_layer()
+            spectators = [Spectator() for _ in range(3)]
+            relays = [await SpectatorRelay.join(layer, "TV2", spectator) for spectator in spectators]
+            self.assertEqual(len(set(map(id, relays))), 1)
+
+            snapshot = await abuild_display_snapshot("TV2")
+            snapshot["players"]["alice"]["submitted"] = True
+            await layer.group_send(get_display_group("TV2"), {"type": "display_snapshot", "snapshot": snapshot})
+            await asyncio.sleep(0.05)
+            for spectator in spectators:
+                await relays[0].leave(spectator)
+            return spectators
+
+        spectators = async_to_sync(scenario)()
+        for spectator in spectators:
+            self.assertEqual(spectator.frames[0]["action"], "display_snapshot")
+            self.assertEqual(spectator.frames[1]["action"], "display_delta")
+            self.assertEqual(spectator.frames[1]["changes"]["players"], {"alice": {"submitted": True}})
+            self.assertEqual(spectator.frames[1]["removed"], [])
+        self.assertNotIn("TV2", SpectatorRelay.relays)
+
+    def test_delta_tells_removed_keys_from_none_values(self):
+        from meme_forge.display import compute_delta
+        old = {"round": 1, "deadline": 100.0, "players": {"alice": {"submitted": False}, "bob": {"submitted": False}}}
+        new = {"round": 2, "deadline": None, "players": {"alice": {"submitted": False}}}
+        self.assertEqual(compute_delta(old, new), ({"round": 2, "deadline": None, "players": {}}, [["players", "bob"]]))
+
+    def test_failed_relay_start_reaches_every_joiner(self):
+        import asyncio
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from meme_forge.relay import SpectatorRelay
+
+        async def failing_start(relay):
+            await asyncio.sleep(0.01)
+            raise ConnectionError
+
+        async def scenario():
+            joins = [SpectatorRelay.join(get_channel_layer(), "TV3", object()) for _ in range(2)]
+            return await asyncio.wait_for(asyncio.gather(*joins, return_exceptions=True), 1)
+
+        with mock.patch.object(SpectatorRelay, "start", failing_start):
+            results = async_to_sync(scenario)()
+        self.assertTrue(all(isinstance(result, ConnectionError) for result in results))
+        self.assertNotIn("TV3", SpectatorRelay.relays)
+
+class AsyncGameViewsTestCase(TestCase):
+    async def test_vote_and_reroll_run_async(self):
+        from django.conf import settings
+        from django.test import AsyncClient
+        from core.dataclasses import GuestUser, Lobby
+        from lobby.views import async_redis_client, asave_lobby_to_redis
+        from meme_forge.models import MemeTemplate
+        from meme_forge.views import adeal_hands, aload_templates_to_redis, reroll_template, vote_meme
+        import asyncio
+
+        self.assertTrue(asyncio.iscoroutinefunction(vote_meme))
+        self.assertTrue(asyncio.iscoroutinefunction(reroll_template))
+
+        templates = [await MemeTemplate.objects.acreate(name=f"Async {index}", image_url_local=f"/static/images/memes_raw/a{index}.jpg") for index in range(3)]
+        await asave_lobby_to_redis(Lobby(code="ASYNC1", creator="Host", participants=[{"name": "Tapir", "profile_pic": ""}]))
+        await aload_templates_to_redis("ASYNC1", templates)
+        await adeal_hands("ASYNC1", ["Tapir"], templates, 3)
+        await async_redis_client.set("lobby:ASYNC1:rerolls:Tapir", 1)
+
+        # Requests without an account or guest identity are refused rather than failing
+        anonymous = AsyncClient(enforce_csrf_checks=False)
+        for path in ("vote", "reroll", "submit"):
+            self.assertEqual((await anonymous.post(f"/meme-forge/{path}/ASYNC1/")).status_code, 403)
+
+        client = AsyncClient(enforce_csrf_checks=False)
+        client.cookies[settings.GUEST_COOKIE_NAME] = GuestUser("Tapir", "tapir.png").to_token()
+
+        # Votes need a submission of this round
+        await async_redis_client.delete("lobby:ASYNC1:submissions")
+        self.assertEqual((await client.post("/meme-forge/vote/ASYNC1/", {"like": "like"})).status_code, 400)
+        self.assertEqual((await client.post("/meme-forge/vote/ASYNC1/", {"submission_id": "Otter", "like": "like"})).status_code, 400)
+        await async_redis_client.hset("lobby:ASYNC1:submissions", "Otter", "{}")
+
+        response = await client.post("/meme-forge/vote/ASYNC1/", {"submission_id": "Otter", "like": "superlike"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(await async_redis_client.hget("lobby:ASYNC1:votes", "Tapir:Otter"), "superlike")
+
+        stranger = AsyncClient(enforce_csrf_checks=False)
+        stranger.cookies[settings.GUEST_COOKIE_NAME] = GuestUser("Stranger", "tapir.png").to_token()
+        self.assertEqual((await stranger.post("/meme-forge/vote/ASYNC1/", {"submission_id": "Otter", "like": "like"})).status_code, 403)
+
+        response = await client.post("/meme-forge/reroll/ASYNC1/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["prefetch"]), 2)
+        response = await client.post("/meme-forge/reroll/ASYNC1/")
+        self.assertEqual(response.status_code, 400)
+
+class ClockSyncTestCase(TestCase):
+    async def test_phase_deadlines_and_clock_sync(self):
+        from lobby.views import async_redis_client
+        from meme_forge.display import aset_round_deadline
+        from core.dataclasses import MemeForge
+        import time
+
+        await async_redis_client.set("lobby:CLOCK1:current_round", 2)
+        deadline = await aset_round_deadline("CLOCK1", 90, 60)
+
+        communicator = WebsocketCommunicator(application, "/ws/meme_forge/CLOCK1/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        # A socket opened mid-round gets the round's absolute deadlines
+        frames = [await communicator.receive_json_from() for _ in range(3)]
+        phase = next(frame for frame in frames if frame["action"] == "round_phase")
+        self.assertEqual(phase["round"], 2)
+        self.assertEqual(phase["phases"], [
+            {"phase": "submission", "ends_at": deadline},
+            {"phase": "voting", "ends_at": deadline + MemeForge.TIME_LIMIT_VOTING},
+        ])
+
+        sent = time.time() * 1000
+        await communicator.send_json_to({"action": "clock_sync", "t0": sent})
+        reply = await communicator.receive_json_from()
+        self.assertEqual(reply["action"], "clock_sync")
+        self.assertEqual(reply["t0"], sent)
+        self.assertLessEqual(sent, reply["t1"])
+        self.assertLessEqual(reply["t1"], reply["t2"])
+        await communicator.disconnect()
+
+class VoteBatchingTestCase(TestCase):
+    async def test_socket_votes_are_written_and_tallied_in_batches(self):
+        from django.conf import settings
+        from django.test import override_settings
+        from core.dataclasses import GuestUser, Lobby
+        from lobby.views import async_redis_client, asave_lobby_to_redis
+        from meme_forge.votes import VoteBatcher
+
+        players = ["Tapir", "Otter", "Lynx"]
+        await asave_lobby_to_redis(Lobby(code="VOTES1", creator="Host", participants=[{"name": name, "profile_pic": ""} for name in players]))
+        await async_redis_client.delete("lobby:VOTES1:votes", "lobby:VOTES1:submissions")
+        await async_redis_client.hset("lobby:VOTES1:submissions", "Otter", "{}")
+
+        def guest_headers(name):
+            return [(b"cookie", f"{settings.GUEST_COOKIE_NAME}={GuestUser(name, 'tapir.png').to_token()}".encode())]
+
+        with override_settings(VOTE_BATCH_WINDOW=0.05):
+            communicators = [WebsocketCommunicator(application, "/ws/meme_forge/VOTES1/", headers=guest_headers(name)) for name in players]
+            for communicator in communicators:
+                await communicator.connect()
+            for communicator in communicators:
+                await communicator.send_json_to({"action": "vote_meme", "vote": {"submission_id": "Otter", "like": "superlike"}})
+            await communicators[0].send_json_to({"action": "vote_meme", "vote": {"submission_id": "Otter", "like": "meh"}})
+
+            # One tally for the whole batch reaches each socket, and the invalid vote is rejected
+            frames = []
+            while len([frame for frame in frames if frame["action"] == "vote_tally"]) < 1:
+                frames.append(await communicators[1].receive_json_from())
+            tally = next(frame for frame in frames if frame["action"] == "vote_tally")
+            self.assertEqual(tally["votes"], 3)
+            self.assertEqual(tally["tallies"]["Otter"]["superlike"], 3)
+            self.assertEqual(tally["tallies"]["Otter"]["score"], 15)
+            self.assertEqual(len(await async_redis_client.hgetall("lobby:VOTES1:votes")), 3)
+            self.assertNotIn("VOTES1", VoteBatcher.batchers)
+
+            frame = await communicators[0].receive_json_from()
+            while frame["action"] != "vote_rejected":
+                frame = await communicators[0].receive_json_from()
+            self.assertIn("Invalid like", frame["error"])
+
+            # Anonymous sockets, strangers and votes for players without a submission are rejected
+            rejected = [
+                (WebsocketCommunicator(application, "/ws/meme_forge/VOTES1/"), "Otter", "Authentication required."),
+                (WebsocketCommunicator(application, "/ws/meme_forge/VOTES1/", headers=guest_headers("Stranger")), "Otter", "Only players"),
+                (communicators[1], "Lynx", "No such submission"),
+            ]
+            for communicator, submission_id, error in rejected:
+                if communicator not in communicators:
+                    await communicator.connect()
+                await communicator.send_json_to({"action": "vote_meme", "vote": {"submission_id": submission_id, "like": "like"}})
+                frame = await communicator.receive_json_from()
+                while frame["action"] != "vote_rejected":
+                    frame = await communicator.receive_json_from()
+                self.assertIn(error, frame["error"])
+                if communicator not in communicators:
+                    await communicator.disconnect()
+
+            # A failed batch write rejects the vote and leaves the socket open
+            from unittest import mock
+            with mock.patch("meme_forge.votes.async_redis_client.pipeline", side_effect=ConnectionError):
+                await communicators[2].send_json_to({"action": "vote_meme", "vote": {"submission_id": "Otter", "like": "like"}})
+                frame = await communicators[2].receive_json_from()
+                while frame["action"] != "vote_rejected":
+                    frame = await communicators[2].receive_json_from()
+            await communicators[2].send_json_to({"action": "ping"})
+            while (await communicators[2].receive_json_from())["action"] != "pong":
+                pass
+
+            for communicator in communicators:
+                await communicator.disconnect()
+
+class PinTemplateTestCase(TestCase):
+    def test_only_the_host_pins_up_to_the_deal_total(self):
+        from core.dataclasses import Lobby, MemeForge
+        from lobby.views import redis_client, save_lobby_to_redis
+        from meme_forge.models import MemeTemplate
+
+        save_lobby_to_redis(Lobby(code="PIN1", creator="Host", participants=[{"name": "Host", "profile_pic": ""}]))
+        redis_client.delete("lobby:PIN1:pinned_templates")
+        limit = MemeForge.DEFAULT_ROUNDS * (1 + MemeForge.DEFAULT_REROLLS)
+        templates = [MemeTemplate.objects.create(name=f"Pinned {index}") for index in range(limit + 1)]
+
+        response = self.client.post("/meme-forge/pin/PIN1/", {"template_id": templates[0].id})
+        self.assertEqual(response.status_code, 403)
+
+        session = self.client.session
+        session["host_lobby_code"] = "PIN1"
+        session.save()
+        for template in templates[:limit]:
+            self.assertEqual(self.client.post("/meme-forge/pin/PIN1/", {"template_id": template.id}).status_code, 200)
+        response = self.client.post("/meme-forge/pin/PIN1/", {"template_id": templates[limit].id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(redis_client.scard("lobby:PIN1:pinned_templates"), limit)
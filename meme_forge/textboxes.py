@@ -0,0 +1,104 @@
+from typing import Dict, List
+from PIL import Image, ImageFilter, ImageOps, ImageStat
+import hashlib
+
+DETECTOR_VERSION = 1  # Bump when the heuristics change so cached results are recomputed
+ANALYSIS_WIDTH = 96  # Width of the downscaled copy the heuristics run on
+GRID_SIZE = 12  # Cells per side of the analysis grid
+MAX_EDGE_DENSITY = 14.0  # Mean edge magnitude (0-255) of a cell that text can go on
+MAX_CELL_DEVIATION = 28.0  # Brightness standard deviation of a cell that text can go on
+MIN_BOX_AREA = 0.05  # Smallest caption region, as a fraction of the image
+MIN_BOX_WIDTH = 0.25  # Narrowest caption region, as a fraction of the image width
+MAX_TEXT_BOXES = 4
+
+# Classic top and bottom caption bands, used when no calm region is found
+DEFAULT_TEXT_BOXES = [
+    {"x": 0.0, "y": 0.0, "width": 1.0, "height": 0.2},
+    {"x": 0.0, "y": 0.8, "width": 1.0, "height": 0.2},
+]
+
+def file_digest(path:str) -> str:
+    """
+    Returns the cache key for an image: the detector version and a SHA-256 of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return f"{DETECTOR_VERSION}:{digest.hexdigest()}"
+
+def calm_cells(path:str) -> List[List[bool]]:
+    """
+    Splits a grayscale copy of the image into a grid and marks the cells with few edges
+    and little contrast, i.e. the areas where a caption does not cover anything.
+    """
+    with Image.open(path) as image:
+        image.seek(0)  # First frame of animated images
+        height = max(GRID_SIZE, round(ANALYSIS_WIDTH * image.height / max(image.width, 1)))
+        gray = image.convert("L").resize((ANALYSIS_WIDTH, height), Image.Resampling.BILINEAR)
+    # The filter copies border pixels through unchanged, so blank out the one-pixel frame
+    edges = ImageOps.expand(ImageOps.crop(gray.filter(ImageFilter.FIND_EDGES), 1), border=1, fill=0)
+
+    grid = []
+    for row in range(GRID_SIZE):
+        top, bottom = row * height // GRID_SIZE, (row + 1) * height // GRID_SIZE
+        cells = []
+        for column in range(GRID_SIZE):
+            box = (column * ANALYSIS_WIDTH // GRID_SIZE, top, (column + 1) * ANALYSIS_WIDTH // GRID_SIZE, bottom)
+            edge_density = ImageStat.Stat(edges.crop(box)).mean[0]
+            deviation = ImageStat.Stat(gray.crop(box)).stddev[0]
+            cells.append(edge_density <= MAX_EDGE_DENSITY and deviation <= MAX_CELL_DEVIATION)
+        grid.append(cells)
+    return grid
+
+def largest_rectangle(grid:List[List[bool]]):
+    """
+    Returns (area, row, column, rows, columns) of the largest all-True rectangle in the grid,
+    using the histogram-and-stack method row by row.
+    """
+    best = (0, 0, 0, 0, 0)
+    heights = [0] * len(grid[0])
+    for row, cells in enumerate(grid):
+        heights = [height + 1 if cell else 0 for height, cell in zip(heights, cells)]
+        stack = []  # Column indices with increasing heights
+        for column in range(len(heights) + 1):
+            current = heights[column] if column < len(heights) else 0
+            while stack and heights[stack[-1]] >= current:
+                bar_height = heights[stack.pop()]
+                left = stack[-1] + 1 if stack else 0
+                area = bar_height * (column - left)
+                if area > best[0]:
+                    best = (area, row - bar_height + 1, left, bar_height, column - left)
+            stack.append(column)
+    return best
+
+def detect_text_boxes(path:str) -> List[Dict[str, float]]:
+    """
+    Proposes caption regions for a template image, as fractions of its size, top to bottom.
+    Repeatedly takes the largest calm rectangle that is big and wide enough for a caption.
+    """
+    grid = calm_cells(path)
+    cell_count = GRID_SIZE * GRID_SIZE
+
+    boxes = []
+    while len(boxes) < MAX_TEXT_BOXES:
+        area, row, column, rows, columns = largest_rectangle(grid)
+        if area / cell_count < MIN_BOX_AREA:
+            break
+
+        for used_row in range(row, row + rows):
+            for used_column in range(column, column + columns):
+                grid[used_row][used_column] = False
+        if columns / GRID_SIZE < MIN_BOX_WIDTH:
+            continue  # Too narrow for a caption, but keep looking elsewhere
+
+        boxes.append({
+            "x": round(column / GRID_SIZE, 3),
+            "y": round(row / GRID_SIZE, 3),
+            "width": round(columns / GRID_SIZE, 3),
+            "height": round(rows / GRID_SIZE, 3),
+        })
+
+    if not boxes:
+        return [dict(box) for box in DEFAULT_TEXT_BOXES]
+    return sorted(boxes, key=lambda box: (box["y"], box["x"]))
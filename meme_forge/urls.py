@@ -4,10 +4,15 @@ from . import views
 app_name = 'memeforge'
 
 urlpatterns = [
+    path('game/<str:lobby_code>/', views.game, name='game'),  # Game interface
+    path('spectate/<str:lobby_code>/', views.spectate, name='spectate'),  # Read-only display for spectators
     path('start/<str:lobby_code>/', views.start_game, name='start_game'),  # Start the game
     path('reroll/<str:lobby_code>/', views.reroll_template, name='reroll_template'),  # Handle reroll requests
     path('submit/<str:lobby_code>/', views.submit_meme, name='submit_meme'),  # Submit a meme
     path('vote/<str:lobby_code>/', views.vote_meme, name='vote_meme'),  # Handle voting
+    path('templates/search/', views.search_templates, name='search_templates'),  # Search templates by name or alias
+    path('pin/<str:lobby_code>/', views.pin_template, name='pin_template'),  # Pin a template for the next game
+    path('leaderboard/', views.global_leaderboard, name='global_leaderboard'),  # Leaderboards across all games
     path('leaderboard/<str:lobby_code>/', views.final_leaderboard, name='final_leaderboard'),  # Final leaderboard
     path('next-round/<str:lobby_code>/', views.next_round, name='next_round'),  # Transition to the next round
 ]
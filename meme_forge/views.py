@@ -1,12 +1,27 @@
 from django.http import JsonResponse, HttpResponse
-from django.shortcuts import render
+from django.shortcuts import render, redirect
+from django.conf import settings
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from .models import MemeTemplate
-from random import sample
-from lobby.views import redis_client, load_lobby_from_redis, save_lobby_to_redis
-from core.dataclasses import MemeForge
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from .models import MemeTemplate, Game, Round, Submission, Vote, PlayerStats, WeeklyPlayerScore
+from random import sample, shuffle
+from django.db.models import Q
+from lobby.views import redis_client, async_redis_client, load_lobby_from_redis, aload_lobby_from_redis, asave_lobby_to_redis
+from core.dataclasses import Gamemodes, MemeForge
+from core.registry import gamemode_registry
+from .template_stats import aget_template_sampler, arecord_template_event
+from .search import get_search_index
+from .votes import VoteBatcher
+from .display import arequest_display_snapshot, aset_round_deadline, build_phase_event
+from core.caching import conditional_response, get_csrf_secret, get_user_identity, make_etag, set_validators
+from core.views import user_is_authenticated, aget_player_name
 from enum import Enum
+from datetime import datetime, timedelta
+import json, time
 
 class Likes(Enum):
     LIKE = "like"
@@ -19,236 +34,799 @@ class Likes(Enum):
         if not like in valid_likes:
             raise ValueError(f"Invalid like. Valid options are: {valid_likes}")
 
+# Points a submission receives per vote type
+LIKE_POINTS = {
+    Likes.LIKE.value: 2,
+    Likes.SUPERLIKE.value: 5,
+    Likes.DISLIKE.value: -1,
+}
+
+GAME_KEY_TTL = 7200  # Game state expires together with the lobby
+PREFETCH_DEPTH = 3  # Number of upcoming templates clients preload
+LEADERBOARDS = {
+    "all_time": "All-Time Players",
+    "weekly": "This Week",
+    "top_memes": "Top Memes",
+    "templates": "Popular Templates",
+}
+SEARCH_RESULT_LIMIT = 20
+LEADERBOARD_PAGE_SIZE = 25
+# Sort order of each leaderboard, ending in a unique field so rows can be paged by keyset
+LEADERBOARD_ORDERINGS = {
+    "all_time": ("-total_score", "id"),
+    "weekly": ("-total_score", "id"),
+    "top_memes": ("-score", "-id"),
+    "templates": ("-times_submitted", "-total_score", "-id"),
+}
+LEADERBOARD_CACHE_TIMEOUT = 600
+LEADERBOARD_VERSION_KEY = "leaderboard:version"
+
 #-------- Helper Functions --------
 
-def select_templates(participants, rounds, rerolls, constraints):
+async def aselect_templates(participants, rounds, rerolls, constraints):
     """
     Selects templates for the game based on the given constraints.
     Ensures duplicates are avoided unless the database lacks enough templates.
     """
-    templates = MemeTemplate.objects.filter(tags__overlap=constraints.get("tags", []))
-    total_required = participants * rounds * rerolls
-    total_available = templates.count()
+    tags = constraints.get("tags", [])
 
-    if total_available <= total_required:
-        # Not enough templates, allow duplicates
-        selected_templates = list(templates)
-    else:
-        # Sample without duplicates
-        selected_templates = sample(list(templates), total_required)
+    # Every player needs one template per round plus one per reroll
+    total_required = get_deal_total(participants, rounds, rerolls)
+
+    # Prefer the weighted alias table published by flush_template_stats
+    sampler = await aget_template_sampler(tags)
+    if sampler is not None and len(sampler):
+        return [template async for template in MemeTemplate.objects.filter(id__in=sampler.sample(total_required))]
+
+    templates = MemeTemplate.objects.all()
+    if tags:
+        tag_filter = Q()
+        for tag in tags:
+            tag_filter |= Q(tags__contains=[tag])
+        templates = templates.filter(tag_filter)
 
-    return selected_templates
+    templates = [template async for template in templates]
+    if len(templates) <= total_required:
+        return templates
+    return sample(templates, total_required)
 
-def load_templates_to_redis(lobby_code, templates):
+def serialize_template(template):
+    """
+    Returns the JSON a template is stored as in a lobby's Redis template hash.
+    """
+    return json.dumps({
+        "id": template.id,
+        "name": template.name,
+        "image_url": template.image_url,
+        "text_input_count": template.text_input_count,
+        "text_boxes": template.text_boxes,
+        "tags": template.tags,
+    })
+
+async def aload_templates_to_redis(lobby_code, templates):
     """
     Load templates into Redis for use during the game.
     """
     redis_key = f"lobby:{lobby_code}:templates"
-    existing_templates = redis_client.hkeys(redis_key)  # Get already loaded templates
+    existing_templates = set(await async_redis_client.hkeys(redis_key))
 
-    new_templates = {}
-    for template in templates:
-        if template.id not in existing_templates:
-            new_templates[template.id] = {
-                "name": template.name,
-                "image_url": template.image_url,
-                "text_input_count": template.text_input_count,
-                "tags": template.tags,
-            }
-
-    # Add new templates to Redis
+    new_templates = {
+        template.id: serialize_template(template)
+        for template in templates
+        if str(template.id) not in existing_templates
+    }
     if new_templates:
-        redis_client.hmset(redis_key, new_templates)
-        redis_client.expire(redis_key, 7200)  # TTL of 2 hours
+        await async_redis_client.hset(redis_key, mapping=new_templates)
+        await async_redis_client.expire(redis_key, GAME_KEY_TTL)
 
-def calculate_scores(lobby_code):
+async def aget_pinned_templates(lobby_code):
     """
-    Calculate scores based on votes stored in Redis.
+    Returns the templates pinned for the lobby, which are always part of the deal.
     """
-    votes_key = f"lobby:{lobby_code}:votes"
-    submissions_key = f"lobby:{lobby_code}:submissions"
+    pinned_ids = await async_redis_client.smembers(f"lobby:{lobby_code}:pinned_templates")
+    return [template async for template in MemeTemplate.objects.filter(id__in=pinned_ids)] if pinned_ids else []
 
-    votes = redis_client.hgetall(votes_key)
-    submissions = redis_client.hgetall(submissions_key)
-
-    scores = {}
+def get_deal_total(players, rounds, rerolls):
+    """
+    Returns how many templates a game deals: a hand of rounds * (1 + rerolls) per player.
+    Up to this many pinned templates are guaranteed to be dealt.
+    """
+    return players * rounds * (1 + rerolls)
 
-    for submission_id, submission_data in submissions.items():
-        submission = json.loads(submission_data)
-        participant_id = submission_id  # Assuming submission ID maps to participant
-        participant_score = scores.get(participant_id, 0)
+def generate_hand_key(lobby_code, player):
+    """
+    Generate the Redis key holding the templates dealt to a player, in play order.
+    """
+    return f"lobby:{lobby_code}:hand:{player}"
 
-        # Calculate scores based on votes
-        for vote_key, vote_type in votes.items():
-            if submission_id in vote_key:  # Check if vote is for this submission
-                if vote_type == Likes.LIKE.value:
-                    participant_score += 2
-                elif vote_type == Likes.SUPERLIKE.value:
-                    participant_score += 5
-                elif vote_type == Likes.DISLIKE.value:
-                    participant_score -= 1
+async def adeal_hands(lobby_code, players, templates, hand_size):
+    """
+    Deal each player a hand of template IDs covering all of their rounds and rerolls.
+    Templates are only repeated across hands if there are not enough to go around.
+    """
+    template_ids = [template.id for template in templates]
+    if not template_ids:
+        return
+
+    shuffle(template_ids)
+    pipeline = async_redis_client.pipeline()
+    for index, player in enumerate(players):
+        hand = [template_ids[(index * hand_size + offset) % len(template_ids)] for offset in range(hand_size)]
+        hand_key = generate_hand_key(lobby_code, player)
+        pipeline.delete(hand_key)
+        pipeline.rpush(hand_key, *hand)
+        pipeline.expire(hand_key, GAME_KEY_TTL)
+    await pipeline.execute()
+
+async def adeal_next_template(lobby_code, player):
+    """
+    Move the next template of a player's hand into play and return its data, or None if the hand is empty.
+    """
+    template_id = await async_redis_client.lpop(generate_hand_key(lobby_code, player))
+    if template_id is None:
+        return None
 
-        scores[participant_id] = participant_score
+    await async_redis_client.hset(f"lobby:{lobby_code}:current_templates", player, template_id)
+    await arecord_template_event("dealt", template_id)
+    template = await async_redis_client.hget(f"lobby:{lobby_code}:templates", template_id)
+    return json.loads(template) if template else None
 
-    # Save scores to Redis for the current round
-    leaderboard_key = f"lobby:{lobby_code}:leaderboard"
-    redis_client.hmset(leaderboard_key, scores)
+async def aget_prefetch_manifest(lobby_code, player):
+    """
+    Returns the image URLs of the next templates in a player's hand, so clients can
+    warm their cache before the round or reroll that needs them.
+    """
+    upcoming = await async_redis_client.lrange(generate_hand_key(lobby_code, player), 0, PREFETCH_DEPTH - 1)
+    if not upcoming:
+        return []
 
-    return scores
+    templates = await async_redis_client.hmget(f"lobby:{lobby_code}:templates", upcoming)
+    return [json.loads(template)["image_url"] for template in templates if template]
 
-def update_leaderboard(lobby_code):
+async def acheck_vote(lobby, voter, submission_id):
+    """
+    Checks that the voter plays in the lobby and votes for a submission of this round.
+    Returns an error message and status code, or None for a valid vote.
+    """
+    if voter not in {participant["name"] for participant in lobby.participants}:
+        return "Only players in the lobby can vote.", 403
+    if not submission_id:
+        return "No submission to vote for.", 400
+    if not await async_redis_client.hexists(f"lobby:{lobby.code}:submissions", submission_id):
+        return "No such submission this round.", 400
+    return None
+
+async def abroadcast_prefetch_manifests(lobby_code):
     """
-    Calculate scores and broadcast updated leaderboard to all participants.
+    Ask every game socket of the lobby to push its player's prefetch manifest.
     """
-    scores = calculate_scores(lobby_code)
+    await get_channel_layer().group_send(f"game_{lobby_code}", {"type": "prefetch_manifest"})
 
-    # Send updated leaderboard via WebSocket
-    group_name = f"lobby_{lobby_code}"
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        group_name,
-        {
-            "type": "leaderboard_update",
-            "data": {"scores": scores},
-        },
+async def aarchive_round(lobby_code, round_number):
+    """
+    Keep a copy of the round's submissions and votes in Redis before they are reset,
+    so the whole game can be persisted in one go when it ends.
+    """
+    history_key = f"lobby:{lobby_code}:history"
+    pipeline = async_redis_client.pipeline()
+    pipeline.hgetall(f"lobby:{lobby_code}:submissions")
+    pipeline.hgetall(f"lobby:{lobby_code}:votes")
+    submissions, votes = await pipeline.execute()
+    await async_redis_client.hset(history_key, round_number, json.dumps({"submissions": submissions, "votes": votes}))
+    await async_redis_client.expire(history_key, GAME_KEY_TTL)
+
+async def areset_game(lobby_code):
+    """
+    Clear what an earlier game in the lobby left behind, so the new one starts from round 1
+    with an empty history and is persisted when it ends.
+    """
+    await async_redis_client.delete(
+        f"lobby:{lobby_code}:persisted",
+        f"lobby:{lobby_code}:history",
+        f"lobby:{lobby_code}:submissions",
+        f"lobby:{lobby_code}:votes",
     )
 
+def persist_game(lobby_code, lobby):
+    """
+    Write the finished game with all its rounds, submissions and votes to the database
+    in a single transaction using bulk inserts. Returns the Game, or None if it was already persisted.
+    """
+    persisted_key = f"lobby:{lobby_code}:persisted"
+    if not redis_client.set(persisted_key, 1, nx=True, ex=GAME_KEY_TTL):
+        return None
+
+    try:
+        return write_game(lobby_code, lobby)
+    except Exception:
+        # Release the claim so a failed game can be persisted again
+        redis_client.delete(persisted_key)
+        raise
+
+def write_game(lobby_code, lobby):
+    """
+    Does the work of persist_game once the game is claimed.
+    """
+    history = {
+        int(number): json.loads(round_data)
+        for number, round_data in redis_client.hgetall(f"lobby:{lobby_code}:history").items()
+    }
+    started_at = redis_client.get(f"lobby:{lobby_code}:started_at")
+    user_ids = {participant["name"]: participant.get("user_id") for participant in lobby.participants}
+    now = timezone.now()
+
+    # Parse submissions and score them from the round's votes
+    parsed_rounds = {}
+    template_ids = set()
+    final_scores = {name: 0 for name in user_ids}
+    for number, round_data in history.items():
+        submissions = {}
+        for player, submission_data in round_data["submissions"].items():
+            submission = json.loads(submission_data)
+            template_id = str(submission.get("template_id") or "")
+            submission["template_id"] = int(template_id) if template_id.isdigit() else None
+            submission["score"] = 0
+            submissions[player] = submission
+            template_ids.add(submission["template_id"])
+
+        votes = []
+        for vote_key, like in round_data["votes"].items():
+            voter, _, submission_player = vote_key.partition(":")
+            if submission_player in submissions and like in LIKE_POINTS:
+                submissions[submission_player]["score"] += LIKE_POINTS[like]
+                votes.append((voter, submission_player, like))
+
+        for player, submission in submissions.items():
+            final_scores[player] = final_scores.get(player, 0) + submission["score"]
+        parsed_rounds[number] = (submissions, votes)
+
+    existing_template_ids = set(MemeTemplate.objects.filter(id__in=template_ids).values_list("id", flat=True))
+
+    with transaction.atomic():
+        game = Game.objects.create(
+            lobby_code=lobby_code,
+            gamemode=lobby.gamemode.key,
+            settings={key: value for key, value in lobby.gamemode.__dict__.items() if key != "key"},
+            players=list(user_ids),
+            final_scores=final_scores,
+            started_at=timezone.make_aware(datetime.fromtimestamp(float(started_at))) if started_at else None,
+            finished_at=now,
+        )
+
+        Round.objects.bulk_create([Round(game=game, number=number) for number in sorted(parsed_rounds)])
+        round_ids = dict(Round.objects.filter(game=game).values_list("number", "id"))
+
+        submissions = [
+            Submission(
+                round_id=round_ids[number],
+                player_name=player,
+                user_id=user_ids.get(player),
+                template_id=submission["template_id"] if submission["template_id"] in existing_template_ids else None,
+                text=submission.get("text") or [],
+                score=submission["score"],
+                created_at=now,
+            )
+            for number, (round_submissions, _) in parsed_rounds.items()
+            for player, submission in round_submissions.items()
+        ]
+        Submission.objects.bulk_create(submissions)
+        submission_ids = {
+            (round_id, player_name): submission_id
+            for round_id, player_name, submission_id in Submission.objects.filter(round__game=game).values_list("round_id", "player_name", "id")
+        }
+
+        Vote.objects.bulk_create([
+            Vote(
+                submission_id=submission_ids[(round_ids[number], submission_player)],
+                voter_name=voter,
+                voter_id=user_ids.get(voter),
+                like=like,
+            )
+            for number, (_, votes) in parsed_rounds.items()
+            for voter, submission_player, like in votes
+        ])
+
+        update_leaderboards(game, user_ids, submissions)
+
+    return game
+
+def update_leaderboards(game, user_ids, submissions):
+    """
+    Fold a committed game into the materialized leaderboards: all-time and weekly player
+    totals, personal bests and template popularity. Must run inside the game's transaction.
+    """
+    user_scores = {user_ids[name]: score for name, score in game.final_scores.items() if user_ids.get(name)}
+    top_score = max(game.final_scores.values(), default=None)
+
+    if user_scores:
+        # All-time totals
+        stats = {stat.user_id: stat for stat in PlayerStats.objects.select_for_update().filter(user_id__in=user_scores)}
+        new_stats = []
+        for user_id, score in user_scores.items():
+            stat = stats.get(user_id)
+            if stat is None:
+                stat = PlayerStats(user_id=user_id, best_score=score)
+                new_stats.append(stat)
+            stat.games_played += 1
+            stat.total_score += score
+            stat.best_score = max(stat.best_score, score)
+            stat.wins += int(score == top_score)
+        PlayerStats.objects.bulk_create(new_stats)
+        for stat in stats.values():
+            stat.updated_at = game.finished_at  # bulk_update skips auto_now
+        PlayerStats.objects.bulk_update(list(stats.values()), ["games_played", "total_score", "best_score", "wins", "updated_at"])
+
+        # Weekly totals
+        week_start = get_week_start()
+        weekly = {score.user_id: score for score in WeeklyPlayerScore.objects.select_for_update().filter(user_id__in=user_scores, week_start=week_start)}
+        new_weekly = []
+        for user_id, score in user_scores.items():
+            weekly_score = weekly.get(user_id)
+            if weekly_score is None:
+                weekly_score = WeeklyPlayerScore(user_id=user_id, week_start=week_start)
+                new_weekly.append(weekly_score)
+            weekly_score.games_played += 1
+            weekly_score.total_score += score
+        WeeklyPlayerScore.objects.bulk_create(new_weekly)
+        WeeklyPlayerScore.objects.bulk_update(list(weekly.values()), ["games_played", "total_score"])
+
+        # Personal bests
+        users = list(get_user_model().objects.filter(id__in=user_scores))
+        improved = []
+        for user in users:
+            if user.pb_meme_forge is None or user_scores[user.id] > user.pb_meme_forge:
+                user.pb_meme_forge = user_scores[user.id]
+                improved.append(user)
+        get_user_model().objects.bulk_update(improved, ["pb_meme_forge"])
+
+    # Template popularity
+    template_totals = {}
+    for submission in submissions:
+        if submission.template_id:
+            count, score = template_totals.get(submission.template_id, (0, 0))
+            template_totals[submission.template_id] = (count + 1, score + submission.score)
+    templates = list(MemeTemplate.objects.select_for_update().filter(id__in=template_totals))
+    for template in templates:
+        count, score = template_totals[template.id]
+        template.times_submitted += count
+        template.total_score += score
+    MemeTemplate.objects.bulk_update(templates, ["times_submitted", "total_score"])
+
+    # Cached leaderboard pages are keyed on this version
+    transaction.on_commit(bump_leaderboard_version)
+
+def get_week_start(day=None):
+    """
+    Returns the Monday of the week the given (or today's) date falls in.
+    """
+    day = day or timezone.localdate()
+    return day - timedelta(days=day.weekday())
+
+def get_leaderboard_version():
+    """
+    Returns the current version of the materialized leaderboards.
+    """
+    return cache.get_or_set(LEADERBOARD_VERSION_KEY, 1, timeout=None)
+
+def bump_leaderboard_version():
+    """
+    Invalidates all cached leaderboard pages.
+    """
+    try:
+        cache.incr(LEADERBOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(LEADERBOARD_VERSION_KEY, 2, timeout=None)
+
+def get_leaderboard_queryset(board):
+    """
+    Returns the indexed query backing one of the global leaderboards, ordered by
+    LEADERBOARD_ORDERINGS.
+    """
+    if board == "all_time":
+        queryset = PlayerStats.objects.values("id", "user__username", "games_played", "wins", "total_score", "best_score")
+    elif board == "weekly":
+        queryset = WeeklyPlayerScore.objects.filter(week_start=get_week_start()).values(
+            "id", "user__username", "games_played", "total_score")
+    elif board == "top_memes":
+        queryset = Submission.objects.values(
+            "id", "player_name", "text", "score", "template__name", "template__image_url_local", "template__image_url_web")
+    elif board == "templates":
+        queryset = MemeTemplate.objects.filter(times_submitted__gt=0).values(
+            "id", "name", "image_url_local", "image_url_web", "times_submitted", "total_score")
+    else:
+        raise KeyError(board)
+    return queryset.order_by(*LEADERBOARD_ORDERINGS[board])
+
+def get_keyset_filter(ordering, cursor, backwards=False):
+    """
+    Returns the filter for the rows after the cursor in the given ordering, or before it when
+    going backwards. The cursor holds the values of the ordering fields of a row.
+    """
+    condition = None
+    for field, value in reversed(list(zip(ordering, cursor))):
+        name = field.lstrip("-")
+        beyond = Q(**{f"{name}__{'lt' if field.startswith('-') != backwards else 'gt'}": value})
+        condition = beyond if condition is None else beyond | (Q(**{name: value}) & condition)
+    return condition
+
+def get_leaderboard_cursor(board, row):
+    return ",".join(str(row[field.lstrip("-")]) for field in LEADERBOARD_ORDERINGS[board])
+
+def parse_leaderboard_cursor(board, cursor):
+    """
+    Returns the values of a cursor from get_leaderboard_cursor, or None if it is malformed.
+    """
+    try:
+        values = tuple(int(value) for value in cursor.split(","))
+    except ValueError:
+        return None
+    return values if len(values) == len(LEADERBOARD_ORDERINGS[board]) else None
+
+def get_leaderboard_page(board, cursor=None, backwards=False):
+    """
+    Returns the page of a leaderboard after the cursor (before it when going backwards) as
+    (rows, has_previous, has_next). Pages are found by keyset on the board's index, so deep
+    pages cost the same as the first, and are served from the cache while no new game
+    results have been committed.
+    """
+    cache_key = f"leaderboard:{get_leaderboard_version()}:{board}:{cursor}:{backwards}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    queryset = get_leaderboard_queryset(board)
+    if cursor:
+        queryset = queryset.filter(get_keyset_filter(LEADERBOARD_ORDERINGS[board], cursor, backwards))
+    if backwards:
+        queryset = queryset.reverse()
+
+    # Fetch one extra row instead of counting the whole table
+    rows = list(queryset[:LEADERBOARD_PAGE_SIZE + 1])
+    has_more = len(rows) > LEADERBOARD_PAGE_SIZE
+    rows = rows[:LEADERBOARD_PAGE_SIZE]
+    for row in rows:
+        if "image_url_local" in row:
+            row["image_url"] = MemeTemplate.resolve_image_url(row["image_url_local"], row["image_url_web"])
+        if "template__image_url_local" in row:
+            row["template__image_url"] = MemeTemplate.resolve_image_url(row["template__image_url_local"], row["template__image_url_web"])
+
+    if backwards:
+        result = (rows[::-1], has_more, True)
+    else:
+        result = (rows, cursor is not None, has_more)
+    cache.set(cache_key, result, LEADERBOARD_CACHE_TIMEOUT)
+    return result
+
 #-------- View Functions --------
 
-def reroll_template(request:HttpResponse, lobby_code):
+def game(request:HttpResponse, lobby_code):
     """
-    Handle template reroll requests from a participant.
+    Render the game interface for the host and participants of a started lobby.
+    """
+    lobby = load_lobby_from_redis(lobby_code)
+    if not lobby:
+        return redirect('lobby:join')
+
+    if not user_is_authenticated(request):
+        return redirect(f"/?next=/lobby/join/{lobby_code}/")
+
+    if not lobby.game_started:
+        return redirect('lobby:lobby', lobby_code=lobby_code)
+
+    is_host = request.session.get("host_lobby_code") == lobby_code
+
+    # Serve a 304 if the client already has this version of the game page for this viewer
+    etag = make_etag("game", lobby.code, lobby.version, "host" if is_host else "player", get_user_identity(request), get_csrf_secret(request))
+    not_modified = conditional_response(request, etag, lobby.updated_at)
+    if not_modified:
+        return not_modified
+
+    response = render(request, 'meme_forge/game.html', {
+        "lobby": lobby,
+        "is_host": is_host,
+        "is_display": is_host,
+        "fragment_timeout": settings.PAGE_FRAGMENT_TIMEOUT,
+        "heartbeat_interval": settings.PRESENCE_HEARTBEAT_INTERVAL,
+    })
+    return set_validators(response, etag, lobby.updated_at)
+
+def spectate(request:HttpResponse, lobby_code):
+    """
+    Render the read-only display of a started game for spectators, who need not be signed in.
     """
     lobby = load_lobby_from_redis(lobby_code)
+    if not lobby or not lobby.game_started:
+        return redirect('lobby:join')
+
+    return render(request, 'meme_forge/game.html', {
+        "lobby": lobby,
+        "is_host": False,
+        "is_display": True,
+        "fragment_timeout": settings.PAGE_FRAGMENT_TIMEOUT,
+    })
+
+async def reroll_template(request:HttpResponse, lobby_code):
+    """
+    Handle template reroll requests from a participant.
+    """
+    lobby = await aload_lobby_from_redis(lobby_code)
     if not lobby:
         return JsonResponse({"error": "Lobby not found"}, status=404)
 
-    participant_id = request.user.id
-    remaining_rerolls_key = f"lobby:{lobby_code}:rerolls:{participant_id}"
-    remaining_rerolls = redis_client.get(remaining_rerolls_key)
+    player = await aget_player_name(request)
+    if player is None:
+        return JsonResponse({"error": "Authentication required."}, status=403)
+    remaining_rerolls_key = f"lobby:{lobby_code}:rerolls:{player}"
+    remaining_rerolls = await async_redis_client.get(remaining_rerolls_key)
 
     if not remaining_rerolls or int(remaining_rerolls) <= 0:
         return JsonResponse({"error": "No rerolls remaining"}, status=400)
 
-    # Get a new random template from Redis
-    redis_key = f"lobby:{lobby_code}:templates"
-    all_templates = redis_client.hgetall(redis_key)
-    new_template = sample(list(all_templates.values()), 1)[0]
+    # Count the template being rerolled away
+    current_template_id = await async_redis_client.hget(f"lobby:{lobby_code}:current_templates", player)
+    if current_template_id:
+        await arecord_template_event("rerolled", current_template_id)
+
+    # Draw the next template from the player's hand, which the client has already prefetched
+    new_template = await adeal_next_template(lobby_code, player)
+    if not new_template:
+        return JsonResponse({"error": "No templates left to draw"}, status=400)
 
-    # Deduct one reroll and return the new template
-    redis_client.decr(remaining_rerolls_key)
-    return JsonResponse({"template": new_template})
+    # Deduct one reroll and return the new template along with what to prefetch next
+    await async_redis_client.decr(remaining_rerolls_key)
+    return JsonResponse({"template": new_template, "prefetch": await aget_prefetch_manifest(lobby_code, player)})
 
-def submit_meme(request:HttpResponse, lobby_code):
+async def submit_meme(request:HttpResponse, lobby_code):
     """
     Handle meme submissions from participants.
     """
-    lobby = load_lobby_from_redis(lobby_code)
+    lobby = await aload_lobby_from_redis(lobby_code)
     if not lobby:
         return JsonResponse({"error": "Lobby not found"}, status=404)
 
-    participant_id = request.user.id
+    participant_id = await aget_player_name(request)
+    if participant_id is None:
+        return JsonResponse({"error": "Authentication required."}, status=403)
     submission_text = request.POST.get("submission_text")
     template_id = request.POST.get("template_id")
 
-    # Validate the template belongs to this participant
-    redis_key = f"lobby:{lobby_code}:submissions"
-    submissions = redis_client.hgetall(redis_key)
-
-    redis_client.hset(
-        redis_key,
+    await async_redis_client.hset(
+        f"lobby:{lobby_code}:submissions",
         participant_id,
         json.dumps({"template_id": template_id, "text": submission_text}),
     )
 
+    # Displays learn about submissions through rate-capped snapshots
+    await arequest_display_snapshot(lobby_code)
+
     return JsonResponse({"message": "Meme submitted successfully"})
 
-def start_game(request: HttpResponse, lobby_code):
+async def start_game(request: HttpResponse, lobby_code):
     """
     Start the game by updating the Lobby with the MemeForge gamemode
     and notifying all participants to redirect to the game interface.
     """
     if request.method == "POST":
-        lobby = load_lobby_from_redis(lobby_code)
+        lobby = await aload_lobby_from_redis(lobby_code)
         if not lobby:
             return JsonResponse({"error": "Lobby not found"}, status=404)
 
         # Ensure host is starting the game
-        if request.session.get("host_lobby_code") != lobby_code:
+        if await request.session.aget("host_lobby_code") != lobby_code:
             return JsonResponse({"error": "Only the host can start the game."}, status=403)
 
-        # Initialize the game mode
-        memeforge = MemeForge.from_post_request(request)
+        # Initialize the game mode from the validated host settings
+        try:
+            memeforge = gamemode_registry.get(Gamemodes.MEME_FORGE).parse(request.POST)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
         if memeforge:
+            # Every pinned template must fit into the hands the chosen settings deal
+            pinned_count = await async_redis_client.scard(f"lobby:{lobby_code}:pinned_templates")
+            deal_total = get_deal_total(len(lobby.participants), memeforge.rounds, memeforge.rerolls_per_player)
+            if pinned_count > deal_total:
+                return JsonResponse({"error": f"{pinned_count} templates are pinned, but this game only deals {deal_total}."}, status=400)
+
             lobby.gamemode = memeforge
             lobby.game_started = True
-            save_lobby_to_redis(lobby)
+            await asave_lobby_to_redis(lobby)
+            await areset_game(lobby_code)
+
+            # Deal every player their templates up front so clients can prefetch them
+            players = [participant["name"] for participant in lobby.participants]
+            templates = await aselect_templates(len(players), memeforge.rounds, memeforge.rerolls_per_player, memeforge.template_constraints)
+            # Pinned templates replace part of the random selection so all of them get dealt
+            pinned = await aget_pinned_templates(lobby_code)
+            templates = pinned + [template for template in templates if template not in pinned][:max(len(templates) - len(pinned), 0)]
+            await aload_templates_to_redis(lobby_code, templates)
+            await adeal_hands(lobby_code, players, templates, memeforge.rounds * (1 + memeforge.rerolls_per_player))
+            for player in players:
+                await async_redis_client.set(f"lobby:{lobby_code}:rerolls:{player}", memeforge.rerolls_per_player, ex=GAME_KEY_TTL)
+                await adeal_next_template(lobby_code, player)
+            await async_redis_client.set(f"lobby:{lobby_code}:current_round", 1, ex=GAME_KEY_TTL)
+            await async_redis_client.set(f"lobby:{lobby_code}:started_at", time.time(), ex=GAME_KEY_TTL)
+            deadline = await aset_round_deadline(lobby_code, memeforge.time_limit_rounds, GAME_KEY_TTL)
+            await arequest_display_snapshot(lobby_code)
 
             # Notify participants via WebSocket
             channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
+            await channel_layer.group_send(
                 f"lobby_{lobby_code}",
                 {
                     "type": "game_start",
                     "redirect_url": f"/meme-forge/game/{lobby_code}/"
                 }
             )
+            await channel_layer.group_send(f"game_{lobby_code}", build_phase_event(1, deadline))
             return JsonResponse({"message": "Game started", "redirect_url": f"/meme-forge/game/{lobby_code}/"})
     return JsonResponse({"error": "Invalid request method."}, status=405)
 
-def vote_meme(request:HttpResponse, lobby_code):
+async def vote_meme(request:HttpResponse, lobby_code):
     """
     Handle voting on memes.
     """
-    lobby = load_lobby_from_redis(lobby_code)
+    lobby = await aload_lobby_from_redis(lobby_code)
     if not lobby:
         return JsonResponse({"error": "Lobby not found"}, status=404)
 
-    voter_id = request.user.id
+    voter_id = await aget_player_name(request)
+    if voter_id is None:
+        return JsonResponse({"error": "Authentication required."}, status=403)
     submission_id = request.POST.get("submission_id")
     like = request.POST.get("like")
 
     # Ensure valid vote type
-    if not Likes.validate_like(like):
+    try:
+        Likes.validate_like(like)
+    except ValueError:
         return JsonResponse({"error": "Invalid vote type"}, status=400)
 
-    # Track votes in Redis
-    votes_key = f"lobby:{lobby_code}:votes"
-    redis_client.hset(
-        votes_key,
-        f"{voter_id}:{submission_id}",
-        like,
-    )
+    rejection = await acheck_vote(lobby, voter_id, submission_id)
+    if rejection:
+        error, status = rejection
+        return JsonResponse({"error": error}, status=status)
+
+    # Votes are written in batches with the others arriving at the same time, see VoteBatcher
+    await VoteBatcher.add(lobby_code, voter_id, submission_id, like)
 
     return JsonResponse({"message": "Vote recorded"})
 
-def final_leaderboard(request:HttpResponse, lobby_code):
+async def final_leaderboard(request:HttpResponse, lobby_code):
     """
     Aggregate scores from all rounds and display the final leaderboard.
     """
     leaderboard_key = f"lobby:{lobby_code}:leaderboard"
-    scores = redis_client.hgetall(leaderboard_key)
+    scores = await async_redis_client.hgetall(leaderboard_key)
 
     # Sort participants by score
     sorted_scores = sorted(scores.items(), key=lambda x: int(x[1]), reverse=True)
 
     return JsonResponse({"leaderboard": sorted_scores})
 
-def next_round(request: HttpResponse, lobby_code):
+def search_templates(request:HttpResponse):
+    """
+    Search templates by name or alternative name, tolerating prefixes and typos.
+    """
+    query = request.GET.get("q", "")
+    try:
+        limit = min(max(int(request.GET.get("limit", SEARCH_RESULT_LIMIT)), 1), SEARCH_RESULT_LIMIT)
+    except ValueError:
+        limit = SEARCH_RESULT_LIMIT
+
+    results = get_search_index().search(query, limit)
+    return JsonResponse({"results": [
+        {"id": template.id, "name": template.name, "image_url": template.image_url, "score": score}
+        for template, score in results
+    ]})
+
+def pin_template(request:HttpResponse, lobby_code):
+    """
+    Pin a template to the lobby so it is dealt when the game starts.
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method."}, status=405)
+
+    lobby = load_lobby_from_redis(lobby_code)
+    if not lobby:
+        return JsonResponse({"error": "Lobby not found"}, status=404)
+
+    if request.session.get("host_lobby_code") != lobby_code:
+        return JsonResponse({"error": "Only the host can pin templates."}, status=403)
+
+    if lobby.game_started:
+        return JsonResponse({"error": "The game has already started."}, status=400)
+
+    template_id = request.POST.get("template_id", "")
+    if not template_id.isdigit() or not MemeTemplate.objects.filter(id=template_id).exists():
+        return JsonResponse({"error": "Template not found"}, status=404)
+
+    # Only as many pins as the game deals can all be dealt; start_game checks again with the final settings
+    if isinstance(lobby.gamemode, MemeForge):
+        rounds, rerolls = lobby.gamemode.rounds, lobby.gamemode.rerolls_per_player
+    else:
+        rounds, rerolls = MemeForge.DEFAULT_ROUNDS, MemeForge.DEFAULT_REROLLS
+    limit = get_deal_total(len(lobby.participants), rounds, rerolls)
+    pinned_key = f"lobby:{lobby_code}:pinned_templates"
+    if redis_client.sadd(pinned_key, template_id) and redis_client.scard(pinned_key) > limit:
+        redis_client.srem(pinned_key, template_id)
+        return JsonResponse({"error": f"At most {limit} templates can be pinned."}, status=400)
+    redis_client.expire(pinned_key, GAME_KEY_TTL)
+    return JsonResponse({"message": "Template pinned", "pinned": sorted(redis_client.smembers(pinned_key))})
+
+def global_leaderboard(request:HttpResponse):
+    """
+    Display one page of a global leaderboard across all games.
+    """
+    board = request.GET.get("board", "all_time")
+    if board not in LEADERBOARDS:
+        board = "all_time"
+
+    # Pages are addressed by the row they follow or precede; the rank only numbers the rows
+    backwards = "before" in request.GET
+    cursor = parse_leaderboard_cursor(board, request.GET.get("before" if backwards else "after", ""))
+    try:
+        rank_offset = max(int(request.GET.get("rank", 0)), 0) if cursor else 0
+    except ValueError:
+        rank_offset = 0
+
+    rows, has_previous, has_next = get_leaderboard_page(board, cursor, backwards and cursor is not None)
+    if not has_previous:
+        rank_offset = 0
+    return render(request, 'meme_forge/leaderboard.html', {
+        "boards": LEADERBOARDS,
+        "board": board,
+        "rows": rows,
+        "rank_offset": rank_offset,
+        "has_previous": has_previous,
+        "has_next": has_next,
+        "previous_cursor": get_leaderboard_cursor(board, rows[0]) if rows and has_previous else None,
+        "next_cursor": get_leaderboard_cursor(board, rows[-1]) if rows and has_next else None,
+        "previous_rank": max(rank_offset - LEADERBOARD_PAGE_SIZE, 0),
+        "next_rank": rank_offset + len(rows),
+    })
+
+async def next_round(request: HttpResponse, lobby_code):
     """
     Transition to the next round or end the game.
     """
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request method."}, status=405)
+
+    lobby = await aload_lobby_from_redis(lobby_code)
+    if not lobby:
+        return JsonResponse({"error": "Lobby not found"}, status=404)
+
+    # Only the host moves the game on, and ending it persists the game
+    if await request.session.aget("host_lobby_code") != lobby_code:
+        return JsonResponse({"error": "Only the host can start the next round."}, status=403)
+
+    if not lobby.game_started or lobby.gamemode is None:
+        return JsonResponse({"error": "The game has not started."}, status=400)
+
     current_round_key = f"lobby:{lobby_code}:current_round"
-    current_round = int(redis_client.get(current_round_key) or 0)
-    lobby = load_lobby_from_redis(lobby_code)
+    current_round = int(await async_redis_client.get(current_round_key) or 0)
 
     if current_round >= lobby.gamemode.rounds:
-        # End game if rounds are complete
-        return final_leaderboard(request, lobby_code)
+        # End game if rounds are complete and store its history. Persisting runs in one
+        # transaction, which Django only offers to sync code, so it is the one thread hop here.
+        await aarchive_round(lobby_code, current_round)
+        await sync_to_async(persist_game)(lobby_code, lobby)
+        return await final_leaderboard(request, lobby_code)
 
     # Increment round and reset submissions and votes
-    redis_client.set(current_round_key, current_round + 1)
-    redis_client.delete(f"lobby:{lobby_code}:submissions")
-    redis_client.delete(f"lobby:{lobby_code}:votes")
+    await aarchive_round(lobby_code, current_round)
+    pipeline = async_redis_client.pipeline()
+    pipeline.set(current_round_key, current_round + 1)
+    pipeline.delete(f"lobby:{lobby_code}:submissions", f"lobby:{lobby_code}:votes")
+    await pipeline.execute()
+
+    # Put each player's next template into play and let clients prefetch the ones after it
+    for participant in lobby.participants:
+        await adeal_next_template(lobby_code, participant["name"])
+    await abroadcast_prefetch_manifests(lobby_code)
+    deadline = await aset_round_deadline(lobby_code, lobby.gamemode.time_limit_rounds, GAME_KEY_TTL)
+    await arequest_display_snapshot(lobby_code)
+    await get_channel_layer().group_send(f"game_{lobby_code}", build_phase_event(current_round + 1, deadline))
 
     return JsonResponse({"message": f"Round {current_round + 1} started"})
@@ -0,0 +1,79 @@
+from channels.layers import get_channel_layer
+from django.conf import settings
+from lobby.views import async_redis_client
+from memeleague.probes import stamp
+from meme_forge.display import arequest_display_snapshot
+import asyncio, time
+
+def tally_votes(votes:dict) -> dict:
+    """
+    Returns the vote counts and score of each submission from a round's votes hash.
+    """
+    from meme_forge.views import LIKE_POINTS
+
+    tallies = {}
+    for vote_key, like in votes.items():
+        _, _, submission_player = vote_key.partition(":")
+        if like in LIKE_POINTS:
+            tally = tallies.setdefault(submission_player, {**dict.fromkeys(LIKE_POINTS, 0), "score": 0})
+            tally[like] += 1
+            tally["score"] += LIKE_POINTS[like]
+    return tallies
+
+class VoteBatcher:
+    """
+    Per-process buffer of one lobby's incoming votes. Votes arriving within VOTE_BATCH_WINDOW
+    of the first are written in one Redis pipeline, and the lobby gets a single tally update
+    for the batch instead of a message per vote for every player.
+    """
+    batchers = {}  # lobby code -> open batch of this process
+
+    def __init__(self, lobby_code:str):
+        self.lobby_code = lobby_code
+        self.votes = {}  # "voter:submission_player" -> like; a repeated vote replaces the earlier one
+        self.waiters = []
+        self.opened_at = time.time()
+
+    @classmethod
+    def add(cls, lobby_code:str, voter:str, submission_player:str, like:str) -> asyncio.Future:
+        """
+        Buffers a vote, opening a batch for the lobby if none is open, and returns a future
+        resolved once the batch is written.
+        """
+        batcher = cls.batchers.get(lobby_code)
+        if batcher is None:
+            batcher = cls.batchers[lobby_code] = cls(lobby_code)
+            asyncio.ensure_future(batcher.flush())
+
+        batcher.votes[f"{voter}:{submission_player}"] = like
+        waiter = asyncio.get_running_loop().create_future()
+        batcher.waiters.append(waiter)
+        return waiter
+
+    async def flush(self):
+        await asyncio.sleep(settings.VOTE_BATCH_WINDOW)
+        # Votes arriving from here on open the next batch
+        if self.batchers.get(self.lobby_code) is self:
+            del self.batchers[self.lobby_code]
+
+        try:
+            votes_key = f"lobby:{self.lobby_code}:votes"
+            pipeline = async_redis_client.pipeline()
+            pipeline.hset(votes_key, mapping=self.votes)
+            pipeline.hgetall(votes_key)
+            _, votes = await pipeline.execute()
+
+            # The tally covers the whole round, so a client that misses one is corrected by the next
+            event = stamp({"type": "vote_tally", "tallies": tally_votes(votes), "votes": len(votes)})
+            if "probe_ingress" in event:
+                event["probe_ingress"] = self.opened_at  # Measured from the first vote, batching included
+            await get_channel_layer().group_send(f"game_{self.lobby_code}", event)
+            await arequest_display_snapshot(self.lobby_code)
+        except Exception as error:
+            for waiter in self.waiters:
+                if not waiter.done():
+                    waiter.set_exception(error)
+        else:
+            for waiter in self.waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
@@ -1,14 +1,19 @@
 import os
 from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-from lobby.routing import websocket_urlpatterns
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "memeleague.settings")
 
+# Initialize Django before importing consumers, which import models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter
+from lobby.routing import websocket_urlpatterns
+from memeleague.static import StaticFilesMiddleware
+from core.middleware import IdentityMiddleware
+
 application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
+    "http": StaticFilesMiddleware(django_asgi_app),
+    "websocket": IdentityMiddleware(
         URLRouter(
             websocket_urlpatterns
         )
@@ -0,0 +1,64 @@
+"""
+Channel layer with an in-process fast path for lobbies pinned to this worker.
+
+In multi-worker mode every socket of a lobby is connected to the worker that
+owns it, so a group send on that worker can be handed straight to the local
+receive buffers instead of going through Redis. Membership is still written to
+Redis, so sends from other processes (a view served elsewhere, a management
+command) keep reaching the lobby through the regular path.
+"""
+
+from channels_redis.core import RedisChannelLayer
+from collections import defaultdict
+from memeleague.metrics import CapacityDropHandler, metrics
+from memeleague.workers import lobby_code_from_group, owns_lobby
+import asyncio, copy, logging, time
+
+# channels_redis only logs channels it skipped for being over capacity
+capacity_logger = logging.getLogger("channels_redis.core")
+capacity_logger.setLevel(logging.INFO)
+capacity_logger.addHandler(CapacityDropHandler())
+
+class LobbyAffinityChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer that delivers group messages for locally owned lobbies in process.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.local_groups = defaultdict(set)  # group -> channels of this process
+        self.local_group_sends = 0
+        self.redis_group_sends = 0
+
+    def is_local_channel(self, channel:str) -> bool:
+        return "!" in channel and self.non_local_name(channel).endswith(self.client_prefix + "!")
+
+    async def group_add(self, group, channel):
+        await super().group_add(group, channel)
+        if self.is_local_channel(channel):
+            self.local_groups[group].add(channel)
+
+    async def group_discard(self, group, channel):
+        await super().group_discard(group, channel)
+        members = self.local_groups.get(group)
+        if members is not None:
+            members.discard(channel)
+            if not members:
+                del self.local_groups[group]
+
+    async def group_send(self, group, message):
+        started = time.perf_counter()
+
+        # Receivers wait on the loop that receives; messages from other loops go through Redis
+        if owns_lobby(lobby_code_from_group(group)) and asyncio.get_running_loop() is self.receive_event_loop:
+            self.local_group_sends += 1
+            for channel in self.local_groups.get(group, ()):
+                buffer = self.receive_buffer[channel]
+                if buffer.full():
+                    metrics.capacity_drops["local"] += 1  # The buffer drops its oldest message
+                buffer.put_nowait(copy.deepcopy(message))
+        else:
+            self.redis_group_sends += 1
+            await super().group_send(group, message)
+
+        metrics.group_send_latency.observe(time.perf_counter() - started)
@@ -0,0 +1,159 @@
+"""
+In-process WebSocket and channel layer metrics in the Prometheus text format.
+
+Counters are plain attributes updated from the event loop, so recording costs a
+dictionary update and takes no lock. Rates are derived when the metrics are
+rendered, over the window since the previous rate snapshot. Each worker reports
+its own numbers, labelled with its index; in multi-worker mode scrape every
+worker port.
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from django.conf import settings
+from memeleague.probes import probes
+import logging, time
+
+GROUP_SEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+RATE_WINDOW = 10  # Seconds between rate snapshots
+
+# Inbound frames come from clients, so only these actions get a label of their own; anything
+# else is counted as "other" to keep the output well-formed and its cardinality fixed
+KNOWN_ACTIONS = frozenset([
+    # Client to server
+    "ping", "send_message", "clock_sync", "submit_meme", "vote_meme",
+    # Server to client
+    "pong", "chat_message", "chat_history", "update_participants", "prefetch_manifest", "round_phase",
+    "meme_submission", "vote", "vote_tally", "vote_rejected", "display_snapshot", "display_delta",
+])
+
+def frame_action(text:str) -> str:
+    """
+    Returns the action of a JSON frame without parsing it. Frames put their action first.
+    """
+    if text.startswith('{"action": "'):
+        action = text[12:text.find('"', 12)]
+    elif text.startswith('{"action":"'):
+        action = text[11:text.find('"', 11)]
+    else:
+        return "other"
+    return action if action in KNOWN_ACTIONS else "other"
+
+def label(name:str, value) -> str:
+    """
+    Returns a Prometheus label pair with the value escaped.
+    """
+    escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'{name}="{escaped}"'
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value:float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class WebSocketMetrics:
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.lobby_sockets = Counter()  # lobby code -> open sockets
+        self.lobby_messages = Counter()  # lobby code -> messages in and out, while the lobby has sockets here
+        self.inbound = Counter()  # action -> messages
+        self.outbound = Counter()  # action -> messages
+        self.bytes_sent = 0
+        self.group_send_latency = Histogram(GROUP_SEND_BUCKETS)
+        self.capacity_drops = Counter()  # "local" or "redis" -> messages dropped
+        self.rate_snapshot = (time.monotonic(), 0, 0)
+        self.rates = (0.0, 0.0)
+
+    def connected(self, lobby_code:str):
+        self.connects += 1
+        self.lobby_sockets[lobby_code] += 1
+
+    def disconnected(self, lobby_code:str):
+        self.disconnects += 1
+        self.lobby_sockets[lobby_code] -= 1
+        if self.lobby_sockets[lobby_code] <= 0:
+            del self.lobby_sockets[lobby_code]
+            self.lobby_messages.pop(lobby_code, None)
+            probes.forget(lobby_code)
+
+    def received(self, lobby_code:str, text:str):
+        self.inbound[frame_action(text)] += 1
+        self.lobby_messages[lobby_code] += 1
+
+    def sent(self, lobby_code:str, text:str):
+        self.outbound[frame_action(text)] += 1
+        self.lobby_messages[lobby_code] += 1
+        self.bytes_sent += len(text)  # json.dumps output is ASCII
+
+    def update_rates(self):
+        now = time.monotonic()
+        then, connects, disconnects = self.rate_snapshot
+        if now - then >= RATE_WINDOW:
+            self.rates = ((self.connects - connects) / (now - then), (self.disconnects - disconnects) / (now - then))
+            self.rate_snapshot = (now, self.connects, self.disconnects)
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        from lobby.outbound import OutboundQueue
+
+        self.update_rates()
+        worker = label("worker", settings.WORKER_INDEX if settings.WORKER_INDEX is not None else 0)
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP memeleague_{name} {help_text}")
+            lines.append(f"# TYPE memeleague_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"memeleague_{name}{{{','.join([worker, *labels])}}} {value}")
+
+        metric("websocket_open_connections", "gauge", "Open WebSocket connections.", [((), self.connects - self.disconnects)])
+        metric("websocket_connects_total", "counter", "WebSocket connects.", [((), self.connects)])
+        metric("websocket_disconnects_total", "counter", "WebSocket disconnects.", [((), self.disconnects)])
+        metric("websocket_connects_per_second", "gauge", f"Connects per second over the last {RATE_WINDOW}s window.", [((), round(self.rates[0], 3))])
+        metric("websocket_disconnects_per_second", "gauge", f"Disconnects per second over the last {RATE_WINDOW}s window.", [((), round(self.rates[1], 3))])
+        metric("websocket_messages_received_total", "counter", "Inbound messages by action.", [((label("action", action),), count) for action, count in sorted(self.inbound.items())])
+        metric("websocket_messages_sent_total", "counter", "Outbound messages by action.", [((label("action", action),), count) for action, count in sorted(self.outbound.items())])
+        metric("websocket_bytes_sent_total", "counter", "Bytes sent to WebSockets.", [((), self.bytes_sent)])
+        metric("lobby_messages_total", "counter", "Messages in and out per lobby with sockets on this worker.", [((label("lobby", code),), count) for code, count in sorted(self.lobby_messages.items())])
+
+        queue_stats = OutboundQueue.stats()
+        metric("websocket_send_queue_depth", "gauge", "Frames waiting in socket send queues.", [((), queue_stats["queued"])])
+        metric("websocket_send_queue_max_depth", "gauge", "Deepest socket send queue.", [((), queue_stats["max_depth"])])
+        metric("websocket_frames_coalesced_total", "counter", "Frames superseded in send queues.", [((), queue_stats["coalesced"])])
+        metric("websocket_slow_disconnects_total", "counter", "Sockets closed for not keeping up.", [((), queue_stats["disconnected"])])
+        metric("websocket_send_failures_total", "counter", "Sockets closed after a frame could not be sent.", [((), queue_stats["failed"])])
+        metric("channel_layer_capacity_drops_total", "counter", "Messages dropped because a channel was over capacity.", [((label("path", path),), count) for path, count in sorted(self.capacity_drops.items())])
+
+        histogram = self.group_send_latency
+        lines.append("# HELP memeleague_group_send_seconds Channel layer group_send latency.")
+        lines.append("# TYPE memeleague_group_send_seconds histogram")
+        cumulative = 0
+        for bound, count in zip([*histogram.buckets, "+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(f'memeleague_group_send_seconds_bucket{{{worker},le="{bound}"}} {cumulative}')
+        lines.append(f"memeleague_group_send_seconds_sum{{{worker}}} {histogram.sum}")
+        lines.append(f"memeleague_group_send_seconds_count{{{worker}}} {histogram.count}")
+        lines.extend(probes.render(worker))
+        return "\n".join(lines) + "\n"
+
+class CapacityDropHandler(logging.Handler):
+    """
+    Counts the channels channels_redis reports as over capacity during a group send, which it
+    only logs.
+    """
+
+    def emit(self, record):
+        if record.msg.endswith("channels over capacity in group %s") and record.args:
+            metrics.capacity_drops["redis"] += record.args[0]
+
+metrics = WebSocketMetrics()
@@ -0,0 +1,130 @@
+"""
+End-to-end latency probes for lobby events, switched on with LATENCY_PROBES.
+
+A chat message, vote or submission is stamped with the server time when its
+sender's socket receives it. Every recipient consumer measures the fan-out
+latency (ingress to handler, i.e. the channel layer and Redis) and passes the
+stamp on to its client. Clients echo the stamps with their next ping, together
+with how long they held them and the round trip time of the previous ping, so
+the server can place the arrival at the client on its own clock:
+
+    delivered = ping received - held - rtt / 2
+
+Only stamps the server passed on to that socket are accepted back, each once.
+Recent samples are kept per lobby and per worker and reported as percentiles
+on /metrics/, with running totals for the summary's sum and count.
+"""
+
+from collections import deque
+from django.conf import settings
+import time
+
+SAMPLES_KEPT = 1000  # Most recent samples per lobby and per worker and stage
+QUANTILES = (0.5, 0.9, 0.99)
+STAGES = ("fanout", "delivery")
+PROBES_OUTSTANDING = 50  # Stamps a socket may hold before the oldest are no longer accepted back
+
+def enabled() -> bool:
+    return settings.LATENCY_PROBES
+
+def stamp(event:dict) -> dict:
+    """
+    Adds the ingress time to a group event about to be sent, when probes are on.
+    """
+    if enabled():
+        event["probe_ingress"] = time.time()
+    return event
+
+def issued_probes() -> deque:
+    """
+    Returns the collection a consumer keeps the stamps it passed on to its client in.
+    """
+    return deque(maxlen=PROBES_OUTSTANDING)
+
+class Samples:
+    """
+    The recent samples of one stage, for the quantiles, and totals that only grow, so the
+    summary's _sum and _count work with rate().
+    """
+
+    def __init__(self):
+        self.recent = deque(maxlen=SAMPLES_KEPT)
+        self.sum = 0.0
+        self.count = 0
+
+    def __len__(self):
+        return len(self.recent)
+
+    def add(self, seconds:float):
+        self.recent.append(seconds)
+        self.sum += seconds
+        self.count += 1
+
+class LatencyProbes:
+    def __init__(self):
+        self.worker = {stage: Samples() for stage in STAGES}
+        self.lobbies = {}  # lobby code -> stage -> samples
+
+    def record(self, lobby_code:str, stage:str, seconds:float):
+        if seconds < 0:
+            return  # Clocks of different workers disagree by more than the latency
+        self.worker[stage].add(seconds)
+        lobby = self.lobbies.setdefault(lobby_code, {name: Samples() for name in STAGES})
+        lobby[stage].add(seconds)
+
+    def fanned_out(self, lobby_code:str, event:dict, issued:deque) -> dict:
+        """
+        Records the fan-out latency of a received group event and returns the probe to pass on to
+        the client, or None for unstamped events. The stamp is added to the socket's issued probes.
+        """
+        ingress = event.get("probe_ingress")
+        if ingress is None:
+            return None
+        self.record(lobby_code, "fanout", time.time() - ingress)
+        issued.append(ingress)
+        return {"ingress": ingress}
+
+    def echoed(self, lobby_code:str, data:dict, issued:deque):
+        """
+        Records the delivery latency of the probes a client echoes with its ping. Stamps the
+        socket was not issued, or that were already echoed, are ignored.
+        """
+        if not enabled():
+            return
+        received = time.time()
+        try:
+            rtt = max(float(data.get("rtt_ms") or 0), 0) / 1000
+            for probe in list(data.get("probes") or [])[-PROBES_OUTSTANDING:]:
+                ingress = probe["ingress"]
+                if ingress not in issued:
+                    continue
+                issued.remove(ingress)
+                delivered = received - max(float(probe["held_ms"]), 0) / 1000 - rtt / 2
+                # The half round trip is an estimate, so a very fast delivery can come out below zero
+                self.record(lobby_code, "delivery", max(delivered - ingress, 0.0))
+        except (KeyError, TypeError, ValueError):
+            pass  # Probes are best effort; a malformed echo is ignored
+
+    def forget(self, lobby_code:str):
+        self.lobbies.pop(lobby_code, None)
+
+    def render(self, worker_label:str) -> list:
+        from memeleague.metrics import label
+
+        lines = [
+            "# HELP memeleague_event_latency_seconds Latency of lobby events from the sender's socket, by stage.",
+            "# TYPE memeleague_event_latency_seconds summary",
+        ]
+        scopes = [("", self.worker)] + [("," + label("lobby", code), stages) for code, stages in sorted(self.lobbies.items())]
+        for lobby_label, stages in scopes:
+            for stage, samples in stages.items():
+                ordered = sorted(samples.recent)
+                labels = f'{worker_label},stage="{stage}"{lobby_label}'
+                for quantile in QUANTILES:
+                    value = ordered[min(int(quantile * len(ordered)), len(ordered) - 1)] if ordered else "NaN"
+                    lines.append(f'memeleague_event_latency_seconds{{{labels},quantile="{quantile}"}} {value}')
+                lines.append(f"memeleague_event_latency_seconds_sum{{{labels}}} {samples.sum}")
+                lines.append(f"memeleague_event_latency_seconds_count{{{labels}}} {samples.count}")
+        return lines
+
+probes = LatencyProbes()
@@ -0,0 +1,116 @@
+"""
+Minimal front proxy for multi-worker mode.
+
+Reads the head of each incoming connection, picks the worker owning the lobby
+in the request path and forwards the request with the client's address in
+X-Forwarded-For, replacing any the client sent. Connections without a lobby
+code are spread round robin. A WebSocket upgrade is then piped both ways; a
+plain HTTP request is forwarded with its body and "Connection: close", so every
+request arrives on a fresh connection with its own head rewritten and worker
+picked.
+"""
+
+from memeleague.workers import lobby_code_from_path, worker_for_lobby
+import asyncio, itertools, logging
+
+logger = logging.getLogger(__name__)
+
+MAX_HEAD_SIZE = 64 * 1024
+PIPE_CHUNK_SIZE = 64 * 1024
+# Headers the proxy sets itself; a client's own would let it pick the address workers see
+PROXY_HEADERS = (b"x-forwarded-for", b"x-forwarded-host", b"x-forwarded-port", b"x-forwarded-proto", b"forwarded")
+LENGTH_REQUIRED = b"HTTP/1.1 411 Length Required\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+
+def rewrite_head(head:bytes, client_host:str) -> tuple:
+    """
+    Rewrites a request head for the worker. Returns the head, the request path, whether the
+    request is a WebSocket upgrade and the length of its body, or None for a chunked body.
+    """
+    request_line, *header_lines = head[:-4].split(b"\r\n")
+    path = request_line.split(b" ")[1].decode("latin-1") if request_line.count(b" ") >= 2 else "/"
+
+    headers = []
+    for line in header_lines:
+        name, _, value = line.partition(b":")
+        headers.append((name.strip().lower(), line, value.strip()))
+    upgrade = any(name == b"upgrade" for name, _, _ in headers)
+    body_length = 0
+    for name, _, value in headers:
+        if name == b"transfer-encoding":
+            body_length = None
+            break
+        if name == b"content-length":
+            body_length = int(value)
+
+    dropped = PROXY_HEADERS if upgrade else PROXY_HEADERS + (b"connection", b"keep-alive")
+    lines = [request_line] + [line for name, line, _ in headers if name not in dropped]
+    lines.append(b"X-Forwarded-For: " + client_host.encode())
+    if not upgrade:
+        lines.append(b"Connection: close")
+    return b"\r\n".join(lines) + b"\r\n\r\n", path, upgrade, body_length
+
+class LobbyRouter:
+    """
+    Routes connections to upstream workers by lobby code.
+    """
+
+    def __init__(self, upstreams):
+        self.upstreams = list(upstreams)  # [(host, port)], indexed by worker index
+        self.round_robin = itertools.cycle(range(len(self.upstreams)))
+
+    def pick_worker(self, path:str) -> int:
+        lobby_code = lobby_code_from_path(path)
+        if lobby_code:
+            return worker_for_lobby(lobby_code, len(self.upstreams))
+        return next(self.round_robin)
+
+    async def handle(self, client_reader, client_writer):
+        upstream_writer = None
+        try:
+            head = await client_reader.readuntil(b"\r\n\r\n")
+
+            # Let the worker see the real client address (run daphne with --proxy-headers)
+            client_host = (client_writer.get_extra_info("peername") or ("", 0))[0]
+            head, path, upgrade, body_length = rewrite_head(head, client_host)
+            if not upgrade and body_length is None:
+                # The end of a chunked body is not tracked, so it could hide a second request
+                client_writer.write(LENGTH_REQUIRED)
+                await client_writer.drain()
+                return
+
+            host, port = self.upstreams[self.pick_worker(path)]
+            upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+            upstream_writer.write(head)
+            if upgrade:
+                await asyncio.gather(self.pipe(client_reader, upstream_writer), self.pipe(upstream_reader, client_writer))
+            else:
+                # Anything the client sends after the body is a further request and is dropped;
+                # "Connection: close" sends the client back through a new connection for it
+                if body_length:
+                    upstream_writer.write(await client_reader.readexactly(body_length))
+                await self.pipe(upstream_reader, client_writer)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, OSError, ValueError) as error:
+            logger.debug("Proxy connection closed: %s", error)
+        finally:
+            for writer in (client_writer, upstream_writer):
+                if writer is not None:
+                    writer.close()
+
+    @staticmethod
+    async def pipe(reader, writer):
+        """
+        Copies bytes until the reader is exhausted, then half-closes the writer.
+        """
+        try:
+            while chunk := await reader.read(PIPE_CHUNK_SIZE):
+                writer.write(chunk)
+                await writer.drain()
+            if writer.can_write_eof():
+                writer.write_eof()
+        except ConnectionError:
+            pass
+
+    async def serve(self, host:str, port:int):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEAD_SIZE, reuse_address=True)
+        async with server:
+            await server.serve_forever()
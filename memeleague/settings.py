@@ -48,6 +48,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.middleware.GuestUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -131,6 +133,21 @@ STATICFILES_DIRS = [
 # Path for collecting all static files (for production)
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Asset pipeline: collectstatic writes manifest-hashed, optimized and precompressed files
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage" if DEBUG else "memeleague.storage.AssetPipelineStorage",
+    },
+}
+
+STATIC_IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365  # Hashed files never change
+STATIC_DEFAULT_MAX_AGE = 60 * 60  # Unhashed files, e.g. meme images referenced by database paths
+STATIC_JPEG_QUALITY = 85
+STATIC_FONT_SUBSET_UNICODES = "U+0000-00FF,U+0131,U+0152-0153,U+02BB-02BC,U+02C6,U+02DA,U+02DC,U+2000-206F,U+2074,U+20AC,U+2122,U+2191,U+2193,U+2212,U+2215,U+FEFF,U+FFFD"  # Latin
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -155,14 +172,63 @@ CACHES = {
     }
 }
 
+# Page Caching
+# Bump PAGE_CACHE_VERSION on deploy to invalidate ETags of static pages
+PAGE_CACHE_VERSION = config("PAGE_CACHE_VERSION", default="1")
+PAGE_FRAGMENT_TIMEOUT = 300  # Seconds a rendered template fragment stays cached
+
 # Sessions Using Redis
 SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 SESSION_CACHE_ALIAS = "default"
 
+# Guest Users
+# Guests live in a signed cookie instead of the session, so no Redis lookup is needed to identify them
+GUEST_COOKIE_NAME = "guest"
+GUEST_COOKIE_MAX_AGE = 60 * 60 * 24 * 30  # 30 days
+GUEST_TOKEN_SALT = "core.guest"
+
+# WebSocket identities resolved per session key or guest token are cached in process
+WEBSOCKET_IDENTITY_CACHE_SIZE = 10000
+WEBSOCKET_IDENTITY_CACHE_TTL = 30  # Seconds, also the longest a logout takes to reach open sockets
+
+# Each socket buffers at most this many outgoing frames; superseded state frames are coalesced
+WEBSOCKET_SEND_QUEUE_SIZE = 100
+WEBSOCKET_SEND_QUEUE_GRACE = 5  # Seconds a socket may stay over the limit before it is closed
+
+# Lobby presence is kept alive by client pings; connections that miss them are swept
+PRESENCE_HEARTBEAT_INTERVAL = 15  # Seconds between client pings
+PRESENCE_STALE_AFTER = 45  # Seconds without a ping before a connection counts as gone
+PRESENCE_SWEEP_INTERVAL = 15
+
+# Lobby chat keeps only the latest messages, each capped in size, for sockets that join later
+CHAT_HISTORY_LENGTH = 50
+CHAT_MESSAGE_MAX_BYTES = 1000
+
+# Votes received within this many seconds of a lobby's first pending vote are written and broadcast as one batch
+VOTE_BATCH_WINDOW = 0.005
+
+# Profiling
+# Staff can profile a request with ?profile=1 or a whole lobby from /profiling/ or the profiling command
+PROFILING_SAMPLE_RATE = config("PROFILING_SAMPLE_RATE", default=0.0, cast=float)  # Share of all requests profiled
+PROFILING_SAMPLE_INTERVAL = 0.001  # Seconds between stack samples
+PROFILING_MAX_PROFILES = 50  # Most recent profiles kept
+PROFILING_RETENTION = 3600  # Seconds a profile is kept
+
+# Addresses allowed to scrape /metrics/ without a staff login
+METRICS_ALLOWED_IPS = config("METRICS_ALLOWED_IPS", default="127.0.0.1", cast=lambda v: v.split(","))
+
+# Stamp chat messages, votes and submissions to measure their latency to other players' sockets
+LATENCY_PROBES = config("LATENCY_PROBES", default=False, cast=bool)
+
+# Multi-Worker Mode
+# Set per process by the runworkers command; lobbies are pinned to workers so their group messages stay in process
+WORKER_COUNT = config("WORKER_COUNT", default=1, cast=int)
+WORKER_INDEX = config("WORKER_INDEX", default="", cast=lambda v: int(v) if v != "" else None)
+
 # Channels Configuration
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'BACKEND': 'memeleague.layers.LobbyAffinityChannelLayer',
         'CONFIG': {
             'hosts': [(REDIS_HOST, REDIS_PORT)],
         },
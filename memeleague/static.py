@@ -0,0 +1,103 @@
+"""
+ASGI middleware serving collected static files straight from STATIC_ROOT.
+
+Hashed files listed in the staticfiles manifest are immutable and get a
+one-year cache lifetime; precompressed .br/.gz siblings written by
+memeleague.storage are picked by Accept-Encoding. Anything else falls
+through to the wrapped application.
+"""
+
+from django.conf import settings
+from email.utils import formatdate
+import asyncio, json, mimetypes, os, posixpath
+
+CHUNK_SIZE = 64 * 1024
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+class StaticFilesMiddleware:
+    """
+    Serves files under STATIC_URL from STATIC_ROOT with long-lived cache headers.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.static_url = settings.STATIC_URL
+        self.static_root = os.path.realpath(settings.STATIC_ROOT)
+        self.immutable_files = self._load_manifest()
+
+    def _load_manifest(self) -> frozenset:
+        """
+        Returns the hashed file names from the staticfiles manifest, if collectstatic has run.
+        """
+        manifest_path = os.path.join(self.static_root, "staticfiles.json")
+        try:
+            with open(manifest_path) as file:
+                return frozenset(json.load(file).get("paths", {}).values())
+        except (OSError, ValueError):
+            return frozenset()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD") or not scope["path"].startswith(self.static_url):
+            return await self.application(scope, receive, send)
+
+        name = posixpath.normpath(scope["path"][len(self.static_url):]).lstrip("/")
+        path = os.path.realpath(os.path.join(self.static_root, name))
+        if not path.startswith(self.static_root + os.sep) or not os.path.isfile(path):
+            return await self.application(scope, receive, send)
+
+        await self.serve(scope, send, name, path)
+
+    async def serve(self, scope, send, name:str, path:str):
+        """
+        Sends the file, a precompressed variant of it, or a 304 if the client copy is current.
+        """
+        request_headers = dict(scope["headers"])
+        accept_encoding = request_headers.get(b"accept-encoding", b"").decode("latin-1")
+
+        content_encoding = None
+        serve_path = path
+        for encoding, suffix in ENCODINGS:
+            if encoding in accept_encoding and os.path.isfile(path + suffix):
+                content_encoding, serve_path = encoding, path + suffix
+                break
+
+        stat = os.stat(serve_path)
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + content_encoding if content_encoding else ""}"'
+
+        if name in self.immutable_files:
+            cache_control = f"public, max-age={settings.STATIC_IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            cache_control = f"public, max-age={settings.STATIC_DEFAULT_MAX_AGE}"
+
+        headers = [
+            (b"cache-control", cache_control.encode()),
+            (b"etag", etag.encode()),
+            (b"last-modified", formatdate(stat.st_mtime, usegmt=True).encode()),
+            (b"vary", b"Accept-Encoding"),
+        ]
+
+        if request_headers.get(b"if-none-match", b"").decode("latin-1") == etag:
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        content_type, _ = mimetypes.guess_type(name)
+        headers += [
+            (b"content-type", (content_type or "application/octet-stream").encode()),
+            (b"content-length", str(stat.st_size).encode()),
+        ]
+        if content_encoding:
+            headers.append((b"content-encoding", content_encoding.encode()))
+
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        with open(serve_path, "rb") as file:
+            while True:
+                chunk = await asyncio.to_thread(file.read, CHUNK_SIZE)
+                more_body = len(chunk) == CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+                if not more_body:
+                    break
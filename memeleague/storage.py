@@ -0,0 +1,136 @@
+"""
+Static asset pipeline for production builds.
+
+Runs as part of `collectstatic`: files are copied under manifest-hashed names,
+then images are re-encoded, fonts are subsetted and text-like assets get
+precompressed .gz/.br siblings that memeleague.static serves directly.
+"""
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+import gzip, io, os
+
+try:
+    import brotli
+except ImportError:  # Optional, only .gz variants are written without it
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Optional, images are copied as-is without it
+    Image = None
+
+try:
+    from fontTools import subset as font_subset
+except ImportError:  # Optional, fonts are copied as-is without it
+    font_subset = None
+
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".json", ".svg", ".ttf", ".otf", ".ico", ".webmanifest", ".txt", ".map")
+OPTIMIZABLE_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+SUBSETTABLE_FONT_EXTENSIONS = (".ttf", ".otf")
+MIN_COMPRESSION_SAVING = 0.05  # Skip variants that save less than 5%
+
+class AssetPipelineStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also optimizes images, subsets fonts and precompresses assets.
+    """
+    # Templates may reference files that are not part of the manifest (e.g. uploaded memes)
+    manifest_strict = False
+
+    def post_process(self, paths, dry_run=False, **options):
+        # Files whose hashed copy already existed were optimized by an earlier run; re-encoding
+        # them would compound the lossy JPEG compression on every deploy
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if processed is True:
+                processed_names.add(name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+
+        for name in sorted(processed_names):
+            hashed_name = self.hashed_files.get(self.hash_key(self.clean_name(name)))
+            if not hashed_name:
+                continue
+            path = self.path(hashed_name)
+            if not os.path.isfile(path):
+                continue
+
+            extension = os.path.splitext(hashed_name)[1].lower()
+            if extension in OPTIMIZABLE_IMAGE_EXTENSIONS:
+                self._optimize_image(path, extension)
+            elif extension in SUBSETTABLE_FONT_EXTENSIONS:
+                self._subset_font(path)
+
+            if extension in COMPRESSIBLE_EXTENSIONS:
+                for compressed_name in self._precompress(path):
+                    yield hashed_name, os.path.relpath(compressed_name, self.location), True
+
+    #-------- Pipeline Stages --------
+
+    @staticmethod
+    def _optimize_image(path:str, extension:str):
+        """
+        Re-encodes an image with optimized settings, keeping the result only if it is smaller.
+        """
+        if Image is None:
+            return
+
+        with open(path, "rb") as file:
+            original = file.read()
+
+        try:
+            image = Image.open(io.BytesIO(original))
+            buffer = io.BytesIO()
+            if extension == ".png":
+                image.save(buffer, format="PNG", optimize=True)
+            else:
+                image.save(buffer, format="JPEG", quality=settings.STATIC_JPEG_QUALITY, optimize=True, progressive=True)
+        except OSError:
+            return  # Leave files Pillow cannot re-encode untouched
+
+        if buffer.tell() < len(original):
+            with open(path, "wb") as file:
+                file.write(buffer.getvalue())
+
+    @staticmethod
+    def _subset_font(path:str):
+        """
+        Strips glyphs outside the configured unicode ranges from a font, in place.
+        """
+        if font_subset is None:
+            return
+
+        subset_options = font_subset.Options()
+        subset_options.layout_features = ["*"]
+        font = font_subset.load_font(path, subset_options)
+        subsetter = font_subset.Subsetter(subset_options)
+        subsetter.populate(unicodes=font_subset.parse_unicodes(settings.STATIC_FONT_SUBSET_UNICODES))
+        subsetter.subset(font)
+        font_subset.save_font(font, path, subset_options)
+
+    @staticmethod
+    def _precompress(path:str):
+        """
+        Writes .gz (and .br if brotli is installed) siblings of a file, skipping those that already
+        exist: a hashed name always has the same content. Returns the written paths.
+        """
+        compressors = [(path + ".gz", lambda content: gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            compressors.append((path + ".br", lambda content: brotli.compress(content, quality=11)))
+        compressors = [(compressed_path, compress) for compressed_path, compress in compressors if not os.path.exists(compressed_path)]
+        if not compressors:
+            return []
+
+        with open(path, "rb") as file:
+            content = file.read()
+
+        written = []
+        for compressed_path, compress in compressors:
+            compressed = compress(content)
+            if len(compressed) <= len(content) * (1 - MIN_COMPRESSION_SAVING):
+                with open(compressed_path, "wb") as file:
+                    file.write(compressed)
+                written.append(compressed_path)
+        return written
@@ -0,0 +1,44 @@
+"""
+Lobby-to-worker assignment for multi-worker mode.
+
+All HTTP requests and sockets of a lobby are routed to the same worker, picked
+by rendezvous hashing of the lobby code, so that lobby's channel groups live in
+a single process. Adding or removing a worker only moves the lobbies it wins
+or loses. See the runworkers command and memeleague.layers.
+"""
+
+from django.conf import settings
+import hashlib, re
+
+# Paths that carry a lobby code, e.g. /lobby/ABC12/, /meme-forge/vote/ABC12/ or /ws/meme_forge/ABC12/
+LOBBY_PATH_PATTERN = re.compile(r"^/(?:ws/[\w-]+|lobby(?:/join|/qr)?|meme-forge/[\w-]+)/(?P<code>[A-Z0-9]+)/")
+LOBBY_GROUP_PATTERN = re.compile(r"^(?:lobby|game|display)_(?P<code>[A-Z0-9]+)$")
+
+def worker_for_lobby(lobby_code:str, worker_count:int) -> int:
+    """
+    Returns the index of the worker a lobby is pinned to.
+    """
+    return max(range(worker_count), key=lambda index: hashlib.md5(f"{index}:{lobby_code}".encode()).digest())
+
+def lobby_code_from_path(path:str):
+    """
+    Returns the lobby code in a request path, or None.
+    """
+    match = LOBBY_PATH_PATTERN.match(path)
+    return match.group("code") if match else None
+
+def lobby_code_from_group(group:str):
+    """
+    Returns the lobby code of a channel group name, or None for groups not tied to a lobby.
+    """
+    match = LOBBY_GROUP_PATTERN.match(group)
+    return match.group("code") if match else None
+
+def owns_lobby(lobby_code:str) -> bool:
+    """
+    Returns true if this process is the worker the lobby is pinned to. Always false outside
+    multi-worker mode, e.g. for a single server or management commands.
+    """
+    if settings.WORKER_INDEX is None or not lobby_code:
+        return False
+    return worker_for_lobby(lobby_code, settings.WORKER_COUNT) == settings.WORKER_INDEX